@@ -0,0 +1,198 @@
+# batch_runner.py
+# 批量运行：账号列表放入共享任务队列，多个 worker 进程（可以分布在多台机器上）各自领取账号执行评教并回写结果
+#
+# 入队:  python batch_runner.py enqueue --accounts accounts.txt --plan plan.json
+# 执行:  python batch_runner.py worker --processes 4            # 本机启动4个worker进程
+#        JOB_QUEUE_URL=redis://10.0.0.2:6379/0 python batch_runner.py worker   # 多台机器共用Redis队列
+# 查看:  python batch_runner.py status --results
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from core.job_runner import run_job
+from core.login import load_captcha_solver
+from utils.job_queue import open_queue
+from utils.logger import log
+from utils.profiler import enable_profiling, finish_profiling
+from utils.session_manager import create_session
+
+
+def read_accounts(path):
+    """读取账号文件，每行 学号,密码"""
+    accounts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and "," in line:
+                account, password = line.strip().split(",", 1)
+                accounts.append((account.strip(), password.strip()))
+    return accounts
+
+
+def enqueue(args):
+    plan = {}
+    if args.plan:
+        with open(args.plan, encoding="utf-8") as f:
+            plan = json.load(f)
+    job_queue = open_queue(args.queue, max_attempts=args.max_attempts)
+    accounts = read_accounts(args.accounts)
+    for account, password in accounts:
+        job_queue.enqueue(account, {"password": password, "plan": plan})
+    log.info(f"已加入 {len(accounts)} 个账号任务，队列状态: {job_queue.stats()}")
+
+
+def _keep_lease(job_queue, job, worker_id, lease_seconds, done, lease_lost):
+    """
+    任务执行期间定期续约；租约失效（已被其他 worker 接管）时设置 lease_lost，让本 worker 停止提交
+
+    完成标记只在提交成功后写入，两个 worker 同时执行同一任务仍可能重复提交，所以必须停下
+    """
+    while not done.wait(lease_seconds / 3):
+        try:
+            renewed = job_queue.renew(job, worker_id, lease_seconds)
+        except Exception as e:
+            log.warning(f"任务 {job.id} 续约出错，稍后重试: {e}")
+            continue
+        if not renewed:
+            log.warning(f"任务 {job.id} 的租约已失效，可能已被其他 worker 接管，停止执行")
+            lease_lost.set()
+            return
+
+
+def process_job(job_queue, job, worker_id, args, captcha_solver):
+    """执行一个账号任务：跳过已完成的课程，每门课程完成后立即写入完成标记"""
+    log.info(f"[{worker_id}] 开始任务 {job.id}: {job.account}（第 {job.attempts} 次）")
+    done = threading.Event()
+    lease_lost = threading.Event()
+    threading.Thread(
+        target=_keep_lease,
+        args=(job_queue, job, worker_id, args.lease, done, lease_lost),
+        name=f"lease-{job.id}",
+        daemon=True,
+    ).start()
+    session = create_session()
+    try:
+        result = run_job(
+            job.payload.get("plan"),
+            workers=args.workers,
+            completed=job_queue.completed_courses(job.account),
+            on_course_done=lambda key: job_queue.mark_course_done(job.account, key),
+            stop=lease_lost,
+            session=session,
+            account=job.account,
+            password=job.payload["password"],
+            captcha_solver=captcha_solver,
+        )
+    except Exception as e:
+        log.error(f"[{worker_id}] 任务 {job.id} 执行异常: {e}")
+        job_queue.fail(job, worker_id, str(e))
+        return
+    finally:
+        done.set()
+        session.close()
+
+    if lease_lost.is_set():
+        # 任务已由接管的 worker 负责，结果以它为准
+        log.warning(f"[{worker_id}] 任务 {job.id} 的租约已失效，已停止，不回写结果")
+        return
+    if result["ok"]:
+        job_queue.complete(job, worker_id, result)
+        log.info(f"[{worker_id}] 任务 {job.id} 完成: {job.account}")
+    else:
+        # 重新投递时已完成的课程会被跳过，只重试失败的部分
+        error = result.get("error") or "部分课程打分失败"
+        job_queue.fail(job, worker_id, error, result=result)
+        log.warning(f"[{worker_id}] 任务 {job.id} 失败: {job.account}，{error}")
+
+
+def worker_loop(args):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    job_queue = open_queue(args.queue, max_attempts=args.max_attempts)
+    captcha_solver = load_captcha_solver()
+    if args.profile:
+        # 每个 worker 进程单独一个报告目录
+        enable_profiling(os.path.join("profiles", worker_id))
+    log.info(f"[{worker_id}] worker 已启动")
+    try:
+        while True:
+            job = job_queue.lease(worker_id, args.lease)
+            if job is None:
+                if args.exit_when_empty:
+                    break
+                time.sleep(args.poll)
+                continue
+            process_job(job_queue, job, worker_id, args, captcha_solver)
+        log.info(f"[{worker_id}] 队列已空，worker 退出")
+    except KeyboardInterrupt:
+        log.info(f"[{worker_id}] worker 已停止，未完成的任务将在租约过期后重新投递")
+    finally:
+        profile_dir = finish_profiling()
+        if profile_dir:
+            log.info(f"[{worker_id}] 性能剖析报告已写入: {profile_dir}")
+
+
+def worker(args):
+    if args.processes <= 1:
+        worker_loop(args)
+        return
+    processes = [
+        multiprocessing.Process(target=worker_loop, args=(args,), name=f"worker-{n}")
+        for n in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def status(args):
+    job_queue = open_queue(args.queue, max_attempts=args.max_attempts)
+    print(json.dumps(job_queue.stats(), ensure_ascii=False))
+    if args.results:
+        for item in job_queue.results():
+            print(json.dumps(item, ensure_ascii=False))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="多账号批量评教（共享任务队列）")
+    parser.add_argument(
+        "--queue",
+        default=None,
+        help="任务队列地址 sqlite:///jobs.db 或 redis://host:6379/0，默认读取 JOB_QUEUE_URL",
+    )
+    parser.add_argument(
+        "--max-attempts", type=int, default=3, help="每个任务最多投递次数"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="把账号文件中的账号加入队列")
+    enqueue_parser.add_argument("--accounts", required=True, help="账号文件，每行 学号,密码")
+    enqueue_parser.add_argument("--plan", help="任务计划JSON文件，字段同常驻模式")
+    enqueue_parser.set_defaults(func=enqueue)
+
+    worker_parser = subparsers.add_parser("worker", help="领取并执行队列中的任务")
+    worker_parser.add_argument("--processes", type=int, default=1, help="本机启动的worker进程数")
+    worker_parser.add_argument("--workers", type=int, default=8, help="每个任务的写阶段线程数")
+    worker_parser.add_argument("--lease", type=int, default=600, help="租约时长（秒）")
+    worker_parser.add_argument("--poll", type=float, default=5, help="队列为空时的轮询间隔（秒）")
+    worker_parser.add_argument(
+        "--exit-when-empty", action="store_true", help="队列为空时退出，而不是继续等待"
+    )
+    worker_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="按阶段剖析性能，每个worker进程输出到 profiles/<worker>/ 目录",
+    )
+    worker_parser.set_defaults(func=worker)
+
+    status_parser = subparsers.add_parser("status", help="查看队列状态")
+    status_parser.add_argument("--results", action="store_true", help="输出每个任务的结果")
+    status_parser.set_defaults(func=status)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    args.func(args)
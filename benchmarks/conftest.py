@@ -0,0 +1,163 @@
+# benchmarks/conftest.py
+# 解析器和请求体生成的基准测试公共设施：固定的样例页面、吞吐量基线的保存与比较
+#
+# 用法（在项目根目录执行，需要 pip install pytest pytest-benchmark）:
+#   python -m pytest benchmarks --save-baseline        # 在当前机器上记录基线到 benchmarks/baselines.json
+#   python -m pytest benchmarks                        # 与基线比较，吞吐量下降超过阈值（默认 25%）时失败
+#   python -m pytest benchmarks --baseline-threshold 0.1
+#   python -m pytest benchmarks --require-baseline     # 没有基线的用例也失败（CI 中使用，避免基线缺失时形同虚设）
+#   python -m pytest benchmarks --benchmark-disable    # 只跑正确性断言，不计时也不比较
+#   python -m pytest benchmarks/test_scale.py --scale-courses 50000   # 用合成页面做更大规模的压力测试
+#
+# 基线与机器有关，换机器后先用 --save-baseline 重新记录
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from synthetic_pages import FIXTURES_DIR, HIDDEN_PARAMS  # noqa: E402, F401
+from utils.logger import log  # noqa: E402
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# 规模: small 为最简页面，typical 接近真实学生（约20门课程、完整的页面框架），
+# large 为聚合后的规模（数百门课程、大量指标）
+SIZES = ["small", "typical", "large"]
+
+# 各样例页面（由 synthetic_pages.py 生成）的预期内容，用于正确性断言
+EXPECTED = {
+    "find": {
+        "small": {"batches": 1},
+        "typical": {"batches": 3},
+        "large": {"batches": 3},
+    },
+    "list": {
+        "small": {"rows": 5, "total_pages": 1},
+        "typical": {"rows": 20, "total_pages": 2},
+        "large": {"rows": 600, "total_pages": 30},
+    },
+    "edit": {
+        "small": {"indicators": 10},
+        "typical": {"indicators": 10},
+        "large": {"indicators": 80},
+    },
+}
+
+
+def load_fixture(kind, size):
+    with open(os.path.join(FIXTURES_DIR, f"{kind}_{size}.html"), encoding="utf-8") as f:
+        return f.read()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("baseline", "吞吐量基线")
+    group.addoption(
+        "--save-baseline",
+        action="store_true",
+        help="把本次各用例的吞吐量记录为基线",
+    )
+    group.addoption(
+        "--baseline-threshold",
+        type=float,
+        default=0.25,
+        help="吞吐量低于基线的比例超过该值时失败 (默认: 0.25)",
+    )
+    group.addoption(
+        "--require-baseline",
+        action="store_true",
+        help="用例没有基线时失败，而不是跳过比较",
+    )
+    group = parser.getgroup("scale", "合成页面压力测试")
+    group.addoption(
+        "--scale-courses",
+        type=int,
+        default=10000,
+        help="列表解析压力测试的课程数 (默认: 10000)",
+    )
+    group.addoption(
+        "--scale-pipeline-courses",
+        type=int,
+        default=500,
+        help="完整流水线压力测试的课程数，每门课程都要获取打分页面并提交两次 (默认: 500)",
+    )
+
+
+def pytest_configure(config):
+    # 日志写文件的开销与解析无关，基准测试中只保留警告以上的日志
+    log.setLevel(logging.WARNING)
+    config._throughput = {}
+    config._missing_baselines = []
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if not config.getoption("--save-baseline") or not config._throughput:
+        return
+    baselines = _load_baselines()
+    baselines.update(config._throughput)
+    with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(baselines.items())), f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    missing = getattr(config, "_missing_baselines", [])
+    if missing:
+        terminalreporter.write_line(
+            f"{len(missing)} 个用例没有基线，未做吞吐量比较；可用 --save-baseline 记录"
+        )
+
+
+def _load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def throughput(benchmark, request):
+    """
+    计时并与基线比较的包装，返回被测函数的结果供正确性断言
+
+    用法:
+        result = throughput(extract_table_to_json, html)
+        result = throughput(func, arg, rounds=3)    # 单次耗时较长的用例固定轮数，不自动校准
+    """
+    config = request.config
+
+    def run(func, *args, rounds=None, **kwargs):
+        if rounds is None:
+            result = benchmark(func, *args, **kwargs)
+        else:
+            result = benchmark.pedantic(func, args, kwargs, rounds=rounds, iterations=1)
+        if benchmark.disabled or benchmark.stats is None:
+            return result
+
+        # 用最快一轮计算吞吐量，受机器上其他负载的干扰最小
+        ops = 1 / benchmark.stats.stats.min
+        name = request.node.name
+        if config.getoption("--save-baseline"):
+            config._throughput[name] = round(ops, 2)
+            return result
+
+        baseline = _load_baselines().get(name)
+        if baseline is None:
+            if config.getoption("--require-baseline"):
+                pytest.fail(f"{name} 没有吞吐量基线，先在该机器上用 --save-baseline 记录")
+            config._missing_baselines.append(name)
+        else:
+            threshold = config.getoption("--baseline-threshold")
+            if ops < baseline * (1 - threshold):
+                pytest.fail(
+                    f"{name} 吞吐量 {ops:.1f} 次/秒，低于基线 {baseline:.1f} 次/秒的 {1 - threshold:.0%}"
+                )
+        return result
+
+    return run
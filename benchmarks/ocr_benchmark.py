@@ -0,0 +1,165 @@
+# benchmarks/ocr_benchmark.py
+# 验证码识别准确率与延迟基准测试
+#
+# 用法（在项目根目录执行）:
+#   python -m benchmarks.ocr_benchmark --corpus captchas/ --max-workers 4
+#   python -m benchmarks.ocr_benchmark --corpus captchas/ --url http://127.0.0.1:9898/ocr
+#
+# 语料目录中每张图片的文件名即标注，如 "a3kd.jpg"、"a3kd_2.jpg"（下划线后的部分会被忽略），
+# 也可以在目录下放一个 labels.txt，每行 "文件名 标注"，优先级高于文件名。
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".gif", ".bmp")
+
+
+def load_corpus(corpus_dir):
+    """
+    读取带标注的验证码语料
+    返回: [(文件名, 图片字节, 标注), ...]
+    """
+    labels = {}
+    labels_path = os.path.join(corpus_dir, "labels.txt")
+    if os.path.exists(labels_path):
+        with open(labels_path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2:
+                    labels[parts[0]] = parts[1]
+
+    samples = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith(IMAGE_SUFFIXES):
+            continue
+        label = labels.get(name) or os.path.splitext(name)[0].split("_")[0]
+        with open(os.path.join(corpus_dir, name), "rb") as f:
+            samples.append((name, f.read(), label))
+    return samples
+
+
+def local_recognizer():
+    """本进程内直接调用 utils.captcha_ocr.get_ocr_res，每轮前清空缓存"""
+    from utils import captcha_ocr
+
+    def recognize(image_bytes):
+        return captcha_ocr.get_ocr_res(image_bytes)
+
+    recognize.reset = captcha_ocr.clear_cache
+    return recognize
+
+
+def http_recognizer(url):
+    """调用 OCR 服务的 /ocr 接口（服务端请用 OCR_CACHE_SIZE=0 启动，避免多轮之间命中缓存）"""
+    import requests
+
+    session = requests.Session()
+
+    def recognize(image_bytes):
+        files = {"file": ("captcha.jpg", image_bytes, "image/jpeg")}
+        response = session.post(url, files=files, timeout=10)
+        response.raise_for_status()
+        return response.json().get("result", "")
+
+    recognize.reset = lambda: None
+    return recognize
+
+
+def _percentile(sorted_values, percent):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def run_round(recognize, samples, workers, case_sensitive=False):
+    """
+    用指定并发数跑一轮语料
+    返回: 本轮统计结果字典
+    """
+    recognize.reset()
+
+    def one(sample):
+        name, image_bytes, label = sample
+        start = time.perf_counter()
+        try:
+            result = recognize(image_bytes)
+        except Exception as e:
+            result = f"<error: {e}>"
+        latency = time.perf_counter() - start
+        if case_sensitive:
+            correct = result == label
+        else:
+            correct = result.lower() == label.lower()
+        return name, label, result, latency, correct
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(one, samples))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[3] for r in results)
+    correct = sum(r[4] for r in results)
+    return {
+        "workers": workers,
+        "accuracy": correct / len(results),
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "throughput": len(results) / elapsed,
+        "errors": [r for r in results if not r[4]],
+    }
+
+
+def print_report(backend, rounds):
+    print(f"\n== {backend} ==")
+    print(f"{'workers':>8} {'accuracy':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'img/s':>8}")
+    for r in rounds:
+        print(
+            f"{r['workers']:>8} {r['accuracy']:>9.2%} {r['p50']*1000:>9.1f} "
+            f"{r['p95']*1000:>9.1f} {r['throughput']:>8.1f}"
+        )
+
+    # 按单次准确率估算登录在 k 次尝试内成功的概率，用于调整 simulate_login 的 max_retries
+    accuracy = rounds[0]["accuracy"]
+    estimates = ", ".join(
+        f"{k}次: {1 - (1 - accuracy) ** k:.2%}" for k in range(1, 6)
+    )
+    print(f"按准确率估算的登录成功率 -> {estimates}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="验证码识别准确率与延迟基准测试")
+    parser.add_argument("--corpus", required=True, help="带标注的验证码图片目录")
+    parser.add_argument("--max-workers", type=int, default=4, help="并发数从1测到该值")
+    parser.add_argument("--url", help="同时测试 OCR 服务接口，如 http://127.0.0.1:9898/ocr")
+    parser.add_argument("--skip-local", action="store_true", help="不测试本进程内识别")
+    parser.add_argument("--case-sensitive", action="store_true", help="区分大小写比较")
+    parser.add_argument("--show-errors", action="store_true", help="列出识别错误的图片")
+    args = parser.parse_args()
+
+    samples = load_corpus(args.corpus)
+    if not samples:
+        print(f"语料目录 {args.corpus} 中没有图片")
+        return
+    print(f"共加载 {len(samples)} 张带标注的验证码")
+
+    backends = []
+    if not args.skip_local:
+        backends.append(("local: utils.captcha_ocr.get_ocr_res", local_recognizer()))
+    if args.url:
+        backends.append((f"http: {args.url}", http_recognizer(args.url)))
+
+    for backend, recognize in backends:
+        # 先识别一张预热，避免首轮包含模型加载的开销
+        recognize(samples[0][1])
+        rounds = [
+            run_round(recognize, samples, workers, args.case_sensitive)
+            for workers in range(1, args.max_workers + 1)
+        ]
+        print_report(backend, rounds)
+        if args.show_errors:
+            for name, label, result, _, _ in rounds[0]["errors"]:
+                print(f"  {name}: 标注 {label}，识别为 {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/ocr_load_test.py
+# OCR 服务压测：多个客户端并发持续请求 /ocr，统计每秒识别的验证码数量
+#
+# 用法（先启动 python ocr_server.py，并建议设置 OCR_CACHE_SIZE=0 避免命中缓存）:
+#   python -m benchmarks.ocr_load_test --images captchas/ --clients 8 --duration 20
+#   python -m benchmarks.ocr_load_test --images captcha.jpg --mode multipart
+import argparse
+import itertools
+import os
+import threading
+import time
+import requests
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".gif", ".bmp")
+
+
+def load_images(path):
+    """读取单张图片或目录下的所有图片"""
+    if os.path.isfile(path):
+        paths = [path]
+    else:
+        paths = [
+            os.path.join(path, name)
+            for name in sorted(os.listdir(path))
+            if name.lower().endswith(IMAGE_SUFFIXES)
+        ]
+    images = []
+    for image_path in paths:
+        with open(image_path, "rb") as f:
+            images.append(f.read())
+    return images
+
+
+def _percentile(sorted_values, percent):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def run_load_test(url, images, clients, duration, mode):
+    """
+    并发压测指定时长
+    返回: (成功延迟列表, 失败次数, 实际耗时)
+    """
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        nonlocal failures
+        # 每个客户端一个会话，复用长连接
+        session = requests.Session()
+        for image_bytes in itertools.islice(itertools.cycle(images), offset, None):
+            if time.perf_counter() >= deadline:
+                break
+            start = time.perf_counter()
+            try:
+                if mode == "raw":
+                    response = session.post(
+                        url,
+                        data=image_bytes,
+                        headers={"Content-Type": "image/jpeg"},
+                        timeout=10,
+                    )
+                else:
+                    files = {"file": ("captcha.jpg", image_bytes, "image/jpeg")}
+                    response = session.post(url, files=files, timeout=10)
+                ok = response.status_code == 200 and "result" in response.json()
+            except Exception:
+                ok = False
+            latency = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(latency)
+                else:
+                    failures += 1
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR 服务压测")
+    parser.add_argument("--url", default="http://127.0.0.1:9898/ocr")
+    parser.add_argument("--images", required=True, help="验证码图片文件或目录")
+    parser.add_argument("--clients", type=int, default=4, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=10, help="压测时长（秒）")
+    parser.add_argument(
+        "--mode",
+        choices=["raw", "multipart"],
+        default="raw",
+        help="raw: 图片直接作为请求体；multipart: 使用 file 字段上传",
+    )
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"{args.images} 中没有图片")
+        return
+
+    latencies, failures, elapsed = run_load_test(
+        args.url, images, args.clients, args.duration, args.mode
+    )
+    latencies.sort()
+    print(f"客户端: {args.clients}，模式: {args.mode}，时长: {elapsed:.1f}s")
+    print(f"成功: {len(latencies)}，失败: {failures}")
+    print(f"吞吐: {len(latencies) / elapsed:.1f} 张/秒")
+    if latencies:
+        print(
+            f"延迟 p50: {_percentile(latencies, 50)*1000:.1f}ms，"
+            f"p95: {_percentile(latencies, 95)*1000:.1f}ms，"
+            f"max: {latencies[-1]*1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
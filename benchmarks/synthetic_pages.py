@@ -0,0 +1,293 @@
+# benchmarks/synthetic_pages.py
+# 合成的强智教务页面：评价批次（xspj_find.do）、分页的评价列表（xspj_list.do）和打分页面（xspj_edit.do）
+# 按课程数、每页条数和指标数生成，用于远超真实规模（1万门课程以上）的解析器和流水线压力测试
+#
+# 用法（在项目根目录执行）:
+#   python -m benchmarks.synthetic_pages fixtures                      # 重新生成 benchmarks/fixtures/ 中的样例页面
+#   python -m benchmarks.synthetic_pages dump --courses 20000 --page-size 50 --indicators 20 --out synthetic/
+#
+# 在代码中:
+#   session = create_session()
+#   site = install_synthetic_site(session, courses=10000, page_size=50)
+#   XspjList(path, session=session, account="a", password="b").get_courses()
+import argparse
+import io
+import math
+import os
+import threading
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_PJ0502ID = "00000000000000000000000000000001"
+XNXQ01ID = "2024-2025-2"
+HIDDEN_PARAMS = {
+    "pj0502id": DEFAULT_PJ0502ID,
+    "pj05id": "A5",
+    "pj02id": "A2",
+    "pj01id": "A1",
+    "pj03id": "A3",
+}
+# 打分页面的等级和原始分数，隐藏的分数按指标数折算，满分100
+GRADES = [("优", 10), ("良", 8), ("中", 6), ("及格", 4), ("差", 2)]
+BATCH_NAMES = ["理论课评价", "实验课评价", "体育课评价"]
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+_CHROME_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8"/>
+<title>学生评价</title>
+<link href="/jsxsd/framework/css/main.css" rel="stylesheet" type="text/css"/>
+<script type="text/javascript" src="/jsxsd/js/jquery-min.js"></script>
+<script type="text/javascript">
+function doSubmit(){ document.getElementById("Form1").submit(); }
+function goPage(n){ document.getElementById("pageIndex").value = n; doSubmit(); }
+</script>
+</head>
+<body>
+<div class="Nsb_top_menu"><ul>%s</ul></div>
+""" % "".join(
+    f'<li><a href="/jsxsd/menu/{i}" target="_self">菜单{i}</a></li>' for i in range(40)
+)
+_CHROME_TAIL = '<div class="Nsb_foot">曲阜师范大学 教务管理系统</div>\n</body>\n</html>\n'
+
+
+def _wrap(content, chrome):
+    """chrome 为 True 时加上真实页面的头部、菜单和页脚，否则只保留最简的 html/body"""
+    if chrome:
+        return _CHROME_HEAD + content + _CHROME_TAIL
+    return f"<html><body>{content}</body></html>"
+
+
+def batch_id(index):
+    return f"{index + 1:032X}"
+
+
+def find_page(open_batches=1, closed_batches=0, chrome=True):
+    """
+    评价批次页面：open_batches 个带"进入评价"链接的开放批次，后面跟 closed_batches 个已结束的历史批次
+    """
+    rows = []
+    for i in range(open_batches):
+        rows.append(
+            f"<tr><td>{closed_batches + i + 1}</td><td>{XNXQ01ID}</td><td>{BATCH_NAMES[i % 3]}</td>"
+            f"<td>2025-06-01 00:00</td><td>2025-06-30 00:00</td>"
+            f'<td><a href="/jsxsd/xspj/xspj_list.do?pj0502id={batch_id(i)}&amp;pj01id=&amp;xnxq01id={XNXQ01ID}" title="点击进入评价">进入评价</a></td></tr>'
+        )
+    for i in range(closed_batches):
+        rows.append(
+            f"<tr><td>{i + 1}</td><td>20{10 + i % 14}-20{11 + i % 14}-{i % 2 + 1}</td><td>历史评价{i}</td>"
+            f"<td>2020-01-01 00:00</td><td>2020-01-15 00:00</td><td>已结束</td></tr>"
+        )
+    table = (
+        '<table id="dataList" class="Nsb_r_list Nsb_table"><tr><th>序号</th><th>学年学期</th>'
+        "<th>评价分类</th><th>开始时间</th><th>结束时间</th><th>操作</th></tr>"
+        + "\n".join(rows)
+        + "</table>"
+    )
+    return _wrap(table, chrome)
+
+
+def course_href(index, pj0502id=DEFAULT_PJ0502ID):
+    return (
+        f"/jsxsd/xspj/xspj_edit.do?xnxq01id={XNXQ01ID}&amp;pj0502id={pj0502id}&amp;pj01id="
+        f"&amp;jx02id=J{index:06d}&amp;jg0101id=T{index:06d}&amp;jx0404id=K{index:06d}"
+    )
+
+
+def total_pages(courses, page_size):
+    return max(1, math.ceil(courses / page_size))
+
+
+def list_page(courses, page_size=20, page_index=1, chrome=True, submitted=False):
+    """
+    评价列表的第 page_index 页（dataList 表格 + 共N页 分页信息 + 翻页表单的隐藏参数）
+
+    参数:
+        courses: 课程总数
+        page_size: 每页条数
+        page_index: 页码，从1开始
+        submitted: 是否生成已提交的状态（总评分、已评、是否提交列）
+    """
+    start = (page_index - 1) * page_size
+    rows = "\n".join(
+        f"<tr><td>{i + 1}</td><td>C{i:06d}</td><td>课程{i}</td><td>教师{i}</td><td>理论课</td>"
+        f"<td>{'89.99' if submitted else ''}</td><td>{'是' if submitted else '否'}</td>"
+        f"<td>{'是' if submitted else '否'}</td>"
+        f'<td><a href="{course_href(i)}" >评价</a></td></tr>'
+        for i in range(start, min(start + page_size, courses))
+    )
+    hidden = HIDDEN_PARAMS
+    form = f'''<form id="Form1" name="Form1" method="post" action="/jsxsd/xspj/xspj_list.do">
+<input type="hidden" name="pj0502id" id="pj0502id" value="{hidden["pj0502id"]}"/>
+<input type="hidden" name="pj05id" id="pj05id" value="{hidden["pj05id"]}"/>
+<input type="hidden" name="pj02id" id="pj02id" value="{hidden["pj02id"]}"/>
+<input type="hidden" value="{hidden["pj01id"]}" name="pj01id" id="pj01id"/>
+<input type="hidden" name="pj03id" value="{hidden["pj03id"]}"/>
+<input type="hidden" name="pageIndex" id="pageIndex" value="{page_index}"/>
+<select name="xnxq01id"><option value="2024-2025-1">2024-2025-1</option><option value="{XNXQ01ID}" selected>{XNXQ01ID}</option></select>
+<table id="dataList" class="Nsb_r_list Nsb_table"><tr><th>序号</th><th>课程编号</th><th>课程名称</th><th>授课教师</th><th>评教类别</th><th>总评分</th><th>已评</th><th>是否提交</th><th>操作</th></tr>
+{rows}
+</table>
+<div class="pagination">共{total_pages(courses, page_size)}页 <a href="javascript:goPage({page_index + 1})">下一页</a></div>
+</form>
+'''
+    return _wrap(form, chrome)
+
+
+def edit_page(indicators=10, course_index=0, chrome=True):
+    """打分页面：Form1 表单、每个指标一行（pj06xh 隐藏字段 + zbtd 单元格中的等级单选框和分数）"""
+    weight = 100 / indicators / 10
+    rows = []
+    for i in range(1, indicators + 1):
+        cells = "".join(
+            f'<input type="radio" name="pj0601id_{i}" value="OPT{i}_{j}"/> {grade}({score})'
+            f'<input type="hidden" name="pj0601fz_{i}_OPT{i}_{j}" value="{score * weight:.2f}"/>'
+            for j, (grade, score) in enumerate(GRADES)
+        )
+        rows.append(
+            f'<tr><td>{i}<input type="hidden" name="pj06xh" value="{i}"/></td>'
+            f'<td>评价指标{i}：教师授课内容充实，重点突出</td><td name="zbtd">{cells}</td></tr>'
+        )
+    form = f'''<form id="Form1" name="Form1" method="post" action="/jsxsd/xspj/xspj_save.do">
+<input type="hidden" name="pj0502id" value="{DEFAULT_PJ0502ID}"/>
+<input type="hidden" name="jx02id" value="J{course_index:06d}"/>
+<input type="hidden" name="jg0101id" value="T{course_index:06d}"/>
+<input type="hidden" name="jx0404id" value="K{course_index:06d}"/>
+<input type="hidden" name="xnxq01id" value="{XNXQ01ID}"/>
+<input type="hidden" name="issubmit" value="0"/>
+<table class="Nsb_r_list">
+{chr(10).join(rows)}
+</table>
+</form>
+'''
+    return _wrap(form, chrome)
+
+
+SAVE_RESPONSE = "<html><script>alert('保存成功');window.close();</script></html>"
+
+
+class SyntheticSiteAdapter(BaseAdapter):
+    """
+    用合成页面响应评教相关的请求，不访问网络，挂载到会话上即可驱动 XspjFind / XspjList / XspjSave 和流水线
+
+    翻页按请求体中的 pageIndex 返回对应页；打分页面按链接中的 jx0404id 生成；
+    保存接口和文字评价接口都返回"保存成功"，列表中的提交状态不随保存变化
+    """
+
+    def __init__(self, courses, page_size=20, indicators=10, open_batches=1, chrome=True):
+        super().__init__()
+        self.courses = courses
+        self.page_size = page_size
+        self.indicators = indicators
+        self.open_batches = open_batches
+        self.chrome = chrome
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def _page_for(self, request):
+        parts = urlsplit(request.url)
+        path = parts.path
+        with self._lock:
+            self.requests[path.rsplit("/", 1)[-1]] += 1
+
+        if path.endswith("xspj_find.do"):
+            return find_page(self.open_batches, chrome=self.chrome)
+        if path.endswith("xspj_list.do"):
+            body = request.body or ""
+            if isinstance(body, bytes):
+                body = body.decode("utf-8")
+            page_index = int(parse_qs(body).get("pageIndex", ["1"])[0])
+            return list_page(self.courses, self.page_size, page_index, self.chrome)
+        if path.endswith("xspj_edit.do"):
+            jx0404id = parse_qs(parts.query.replace("&amp;", "&")).get("jx0404id", ["K0"])[0]
+            return edit_page(self.indicators, int(jx0404id[1:]), self.chrome)
+        if path.endswith(("xspj_save.do", "toSavepj03wjpj.do")):
+            return SAVE_RESPONSE
+        return None
+
+    def send(self, request, **kwargs):
+        page = self._page_for(request)
+        response = Response()
+        response.status_code = 200 if page is not None else 404
+        response.url = request.url
+        response.headers = CaseInsensitiveDict({"Content-Type": "text/html;charset=utf-8"})
+        response.encoding = "utf-8"
+        # 响应体放在 raw 中，stream=True 的请求按块读取，与真实连接一样流式解析
+        response.raw = io.BytesIO((page or "").encode("utf-8"))
+        response.reason = "OK" if page is not None else "Not Found"
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def install_synthetic_site(session, courses, page_size=20, indicators=10, **kwargs):
+    """为会话挂载合成页面适配器，返回适配器（可查看各接口的请求次数）"""
+    adapter = SyntheticSiteAdapter(courses, page_size, indicators, **kwargs)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return adapter
+
+
+# 基准测试的样例页面: 文件名 -> 生成函数
+FIXTURES = {
+    "find_small.html": lambda: find_page(1, 0),
+    "find_typical.html": lambda: find_page(3, 8),
+    "find_large.html": lambda: find_page(3, 400),
+    "list_small.html": lambda: list_page(5, page_size=5, chrome=False),
+    "list_typical.html": lambda: list_page(40, page_size=20),
+    "list_large.html": lambda: list_page(18000, page_size=600),
+    "edit_small.html": lambda: edit_page(10, chrome=False),
+    "edit_typical.html": lambda: edit_page(10),
+    "edit_large.html": lambda: edit_page(80),
+}
+
+
+def write_fixtures(directory=FIXTURES_DIR):
+    os.makedirs(directory, exist_ok=True)
+    for name, build in FIXTURES.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(build())
+    print(f"已生成 {len(FIXTURES)} 个样例页面: {directory}")
+
+
+def dump(args):
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "xspj_find.html"), "w", encoding="utf-8") as f:
+        f.write(find_page(args.batches))
+    pages = total_pages(args.courses, args.page_size)
+    for page_index in range(1, pages + 1):
+        with open(
+            os.path.join(args.out, f"xspj_list_{page_index}.html"), "w", encoding="utf-8"
+        ) as f:
+            f.write(list_page(args.courses, args.page_size, page_index))
+    with open(os.path.join(args.out, "xspj_edit.html"), "w", encoding="utf-8") as f:
+        f.write(edit_page(args.indicators))
+    print(f"已生成 {args.courses} 门课程的 {pages} 页评价列表: {args.out}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="生成合成的评教页面")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("fixtures", help="重新生成 benchmarks/fixtures/ 中的样例页面")
+    dump_parser = subparsers.add_parser("dump", help="把指定规模的页面写入目录")
+    dump_parser.add_argument("--courses", type=int, default=10000)
+    dump_parser.add_argument("--page-size", type=int, default=50)
+    dump_parser.add_argument("--indicators", type=int, default=10)
+    dump_parser.add_argument("--batches", type=int, default=1)
+    dump_parser.add_argument("--out", default="synthetic")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "fixtures":
+        write_fixtures()
+    else:
+        dump(args)
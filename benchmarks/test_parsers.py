@@ -0,0 +1,141 @@
+# benchmarks/test_parsers.py
+# 评价批次、评价列表和打分页面的解析以及请求体生成的基准测试，每个用例同时断言输出正确
+import json
+
+import pytest
+from conftest import EXPECTED, HIDDEN_PARAMS, SIZES, load_fixture
+from core.xspj_find import XspjFind
+from core.xspj_list import XspjList, extract_table_to_json, parse_list_page
+from core.xspj_save import XspjSave, parse_evaluation_form
+from utils.session_manager import create_session
+
+LOGIN_KWARGS = {"account": "bench", "password": "bench"}
+
+
+@pytest.fixture(scope="module")
+def session():
+    return create_session()
+
+
+@pytest.fixture
+def xspj_find(session):
+    return XspjFind(session=session, **LOGIN_KWARGS)
+
+
+@pytest.fixture
+def xspj_list(session):
+    return XspjList("?pj0502id=00000000000000000000000000000001", session=session, **LOGIN_KWARGS)
+
+
+@pytest.fixture
+def xspj_save(session):
+    return XspjSave("/jsxsd/xspj/xspj_edit.do", session=session, **LOGIN_KWARGS)
+
+
+def use_indicator_count(xspj_save, count):
+    """策略的等级列表按页面指标数扩展（大规模样例的指标数超过真实的10个）"""
+    for strategy in xspj_save.scoring_strategies.values():
+        grades = strategy["grades"]
+        strategy["grades"] = (grades * (count // len(grades) + 1))[:count]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_extract_xspj_id(throughput, xspj_find, size):
+    html = load_fixture("find", size)
+    path = throughput(xspj_find.extract_xspj_id, html)
+    assert path == (
+        "?pj0502id=00000000000000000000000000000001&amp;pj01id=&amp;xnxq01id=2024-2025-2"
+    )
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_extract_xspj_batches(throughput, xspj_find, size):
+    html = load_fixture("find", size)
+    batches = throughput(xspj_find.extract_xspj_batches, html)
+    assert len(batches) == EXPECTED["find"][size]["batches"]
+    assert batches[0].pj0502id == "00000000000000000000000000000001"
+    assert batches[0].xnxq01id == "2024-2025-2"
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_extract_hidden_params(throughput, xspj_find, size):
+    html = load_fixture("list", size)
+    params = throughput(xspj_find.extract_hidden_params, html)
+    assert params == HIDDEN_PARAMS
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_extract_table_to_json(throughput, size):
+    html = load_fixture("list", size)
+    rows = json.loads(throughput(extract_table_to_json, html))
+    expected = EXPECTED["list"][size]["rows"]
+    assert len(rows) == expected
+    assert rows[0]["课程编号"] == "C000000"
+    assert rows[-1]["授课教师"] == f"教师{expected - 1}"
+    assert rows[-1]["操作"]["href"].endswith(f"jx0404id=K{expected - 1:06d}")
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_parse_list_page(throughput, size):
+    content = load_fixture("list", size).encode("utf-8")
+    rows, total_pages, form_data, found_table = throughput(parse_list_page, content)
+    assert found_table
+    assert len(rows) == EXPECTED["list"][size]["rows"]
+    assert total_pages == EXPECTED["list"][size]["total_pages"]
+    assert form_data["pj0502id"] == HIDDEN_PARAMS["pj0502id"]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_extract_total_pages(throughput, xspj_list, size):
+    html = load_fixture("list", size)
+    total_pages = throughput(xspj_list._extract_total_pages, html)
+    assert total_pages == EXPECTED["list"][size]["total_pages"]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_extract_form_data(throughput, xspj_list, size):
+    html = load_fixture("list", size)
+    form_data = throughput(xspj_list._extract_form_data, html)
+    assert form_data["pj0502id"] == HIDDEN_PARAMS["pj0502id"]
+    assert form_data["pj01id"] == HIDDEN_PARAMS["pj01id"]
+    assert form_data["pageIndex"] == "1"
+    assert form_data["xnxq01id"] == "2024-2025-2"
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_parse_evaluation_form(throughput, size):
+    html = load_fixture("edit", size)
+    schema = throughput(parse_evaluation_form, html)
+    count = EXPECTED["edit"][size]["indicators"]
+    assert len(schema["indicator_order"]) == count
+    assert schema["indicators"]["1"]["优"]["id"] == "OPT1_0"
+    assert set(schema["indicators"][str(count)]) == {"优", "良", "中", "及格", "差"}
+
+
+@pytest.mark.parametrize("scenario", ["scenario_98", "scenario_89"])
+@pytest.mark.parametrize("size", SIZES)
+def test_extract_evaluation_payload(throughput, xspj_save, size, scenario):
+    html = load_fixture("edit", size)
+    count = EXPECTED["edit"][size]["indicators"]
+    use_indicator_count(xspj_save, count)
+    payload = throughput(xspj_save.extract_evaluation_payload, html, scenario)
+
+    assert "error" not in payload
+    assert payload["issubmit"] == "1"
+    assert payload["pj06xh"] == [str(i) for i in range(1, count + 1)]
+    grades = xspj_save.scoring_strategies[scenario]["grades"]
+    grade_index = {"优": 0, "良": 1, "中": 2, "及格": 3, "差": 4}
+    for i, grade in enumerate(grades, start=1):
+        assert payload[f"pj0601id_{i}"] == f"OPT{i}_{grade_index[grade]}"
+    # 每个指标的所有等级分数都要带上
+    assert sum(key.startswith("pj0601fz_") for key in payload) == count * 5
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_build_payload(throughput, xspj_save, size):
+    schema = parse_evaluation_form(load_fixture("edit", size))
+    count = EXPECTED["edit"][size]["indicators"]
+    use_indicator_count(xspj_save, count)
+    payload = throughput(xspj_save.build_payload, schema, "scenario_98")
+    assert "error" not in payload
+    assert len(payload["pj06xh"]) == count
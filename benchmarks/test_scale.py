@@ -0,0 +1,104 @@
+# benchmarks/test_scale.py
+# 远超真实规模的压力测试：合成的上万门课程的评价列表和完整流水线，检查吞吐量和内存占用
+import tracemalloc
+
+import pytest
+from core.pipeline import EvaluationPipeline
+from core.xspj_list import CourseRecord, XspjList, parse_list_page
+from synthetic_pages import install_synthetic_site, list_page
+from utils import rate_limiter
+from utils.session_manager import create_session
+
+XSPJ_PATH = "?pj0502id=00000000000000000000000000000001&pj01id=&xnxq01id=2024-2025-2"
+PAGE_SIZE = 50
+
+
+def synthetic_kwargs(courses, account, **site_kwargs):
+    session = create_session()
+    site = install_synthetic_site(session, courses, page_size=PAGE_SIZE, **site_kwargs)
+    return site, {"session": session, "account": account, "password": "bench"}
+
+
+def stream_count(login_kwargs):
+    """流式遍历评价列表，只计数不保留记录"""
+    count = 0
+    for _ in XspjList(XSPJ_PATH, **login_kwargs).iter_courses():
+        count += 1
+    return count
+
+
+def stream_peak(courses):
+    _, login_kwargs = synthetic_kwargs(courses, "scale-memory")
+    tracemalloc.start()
+    try:
+        count = stream_count(login_kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert count == courses
+    return peak
+
+
+@pytest.fixture
+def scale_courses(request):
+    return request.config.getoption("--scale-courses")
+
+
+def test_parse_list_page_scale(throughput, scale_courses):
+    """单页上万行（学校调大每页条数时的极端情况）"""
+    content = list_page(scale_courses, page_size=scale_courses).encode("utf-8")
+    rows, total_pages, form_data, found_table = throughput(parse_list_page, content, rounds=3)
+    assert found_table
+    assert len(rows) == scale_courses
+    assert total_pages == 1
+    last = CourseRecord(*rows[-1])
+    assert last.course_id == f"C{scale_courses - 1:06d}"
+    assert last.href.endswith(f"jx0404id=K{scale_courses - 1:06d}")
+
+
+def test_stream_list_scale(throughput, scale_courses):
+    """逐页流式获取上万门课程，每页都经过会话请求和流式解析"""
+    site, login_kwargs = synthetic_kwargs(scale_courses, "scale-list")
+    count = throughput(stream_count, login_kwargs, rounds=3)
+    assert count == scale_courses
+    pages = -(-scale_courses // PAGE_SIZE)
+    assert site.requests["xspj_list.do"] % pages == 0
+
+
+def test_stream_list_memory(scale_courses):
+    """
+    流式解析的内存峰值只取决于单页大小，与课程总数无关
+    课程数增加到16倍时峰值增长不应超过3倍（解析器缓存等少量增长），一次性读入所有页面时会随课程数线性增长
+    """
+    stream_peak(PAGE_SIZE)  # 预热，排除首次调用时的导入和缓存分配
+    small = stream_peak(max(PAGE_SIZE, scale_courses // 16))
+    large = stream_peak(scale_courses)
+    assert large < small * 3, f"峰值 {small / 1024:.0f} KiB -> {large / 1024:.0f} KiB"
+
+
+@pytest.fixture
+def unthrottled(monkeypatch):
+    """压力测试的目标是本机的解析和调度，不需要保护服务器，把写接口的限流器放开"""
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    for endpoint in ("xspj_save.do", "toSavepj03wjpj.do"):
+        rate_limiter._limiters[(endpoint, "scale-pipeline")] = rate_limiter.AdaptiveLimiter(
+            endpoint, initial_rate=1e6, max_rate=1e6, initial_concurrency=8
+        )
+
+
+def test_pipeline_scale(throughput, unthrottled, request):
+    """完整流水线：列表、打分页面、清除限制和重新打分，每门课程两次提交"""
+    courses = request.config.getoption("--scale-pipeline-courses")
+    site, login_kwargs = synthetic_kwargs(courses, "scale-pipeline", chrome=False)
+
+    def run():
+        pipeline = EvaluationPipeline(
+            XSPJ_PATH, show_progress=False, login_kwargs=login_kwargs, verify=False
+        )
+        return pipeline.run()
+
+    result = throughput(run, rounds=1)
+    assert len(result.courses) == courses
+    assert all(r.ok for r in result.rescore_results)
+    assert site.requests["xspj_edit.do"] >= courses
+    assert site.requests["xspj_save.do"] >= courses * 2
@@ -0,0 +1,98 @@
+# core/dry_run.py
+# 试运行：只执行只读步骤（获取列表、获取打分页面、生成请求体），校验后输出报告，不提交任何POST
+from core.xspj_save import XspjSave, parse_form_page
+from utils.logger import log
+from utils.parse_pool import run_parse
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+
+def check_course(index, course, scenario):
+    """
+    获取单门课程的打分页面，生成清除限制和目标策略两份请求体，并按原始页面和策略校验
+
+    返回: 该课程的检查结果字典
+    """
+    result = {
+        "index": index,
+        "课程名称": course.name,
+        "授课教师": course.teacher,
+        "scenario": scenario,
+        "fetch_time": 0.0,
+        "parse_time": 0.0,
+        "mismatches": [],
+    }
+    try:
+        xspj_save = XspjSave(course.href)
+
+        start = time.perf_counter()
+        response = xspj_save.get_xspj_save_response()
+        content = response.content
+        result["fetch_time"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        form_schema = run_parse(parse_form_page, content, response.encoding)
+        html_content = content.decode(response.encoding or "utf-8", errors="replace")
+        for payload_scenario in ("scenario_clear", scenario):
+            payload = xspj_save.build_payload(form_schema, payload_scenario)
+            for mismatch in xspj_save.validate_payload(
+                payload, html_content, payload_scenario
+            ):
+                result["mismatches"].append(f"[{payload_scenario}] {mismatch}")
+        result["parse_time"] = time.perf_counter() - start
+    except Exception as e:
+        result["mismatches"].append(f"检查时发生异常: {e}")
+    return result
+
+
+def run_dry_run(courses, high_score_indices, max_workers=8):
+    """
+    并发检查所有课程的请求体，不发送任何写请求
+
+    参数:
+        courses: 评价列表（CourseRecord 列表）
+        high_score_indices: 使用高分策略的课程下标
+        max_workers: 并发获取打分页面的线程数
+    返回: 是否全部校验通过
+    """
+    log.info(f"试运行: 并发检查 {len(courses)} 门课程的请求体 (线程数: {max_workers})")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                check_course,
+                i,
+                course,
+                "scenario_98" if i in high_score_indices else "scenario_89",
+            )
+            for i, course in enumerate(courses)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if result["mismatches"]]
+
+    log.info("\n" + "=" * 80)
+    log.info("试运行报告")
+    log.info("=" * 80)
+    for result in results:
+        status = "通过" if not result["mismatches"] else "不一致"
+        log.info(
+            f"{result['index']+1:2d}. {result['课程名称']} - {result['授课教师']}，策略:{result['scenario']}，"
+            f"获取:{result['fetch_time']*1000:.0f}ms，解析:{result['parse_time']*1000:.0f}ms，结果:{status}"
+        )
+        for mismatch in result["mismatches"]:
+            log.warning(f"    {mismatch}")
+
+    fetch_times = sorted(result["fetch_time"] for result in results)
+    log.info("-" * 80)
+    log.info(f"总耗时: {elapsed:.2f}s，课程数: {len(results)}，不一致: {len(failed)}")
+    if fetch_times:
+        log.info(
+            f"页面获取耗时 平均:{sum(fetch_times)/len(fetch_times)*1000:.0f}ms，"
+            f"最大:{fetch_times[-1]*1000:.0f}ms"
+        )
+    log.info("=" * 80)
+
+    return not failed
@@ -0,0 +1,209 @@
+# core/job_runner.py
+# 非交互地执行一次完整评教（登录 → 获取所有批次 → 各批次文字评价和流水线打分），供常驻服务和批量运行使用
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core.login import LoginManager
+from core.pipeline import EvaluationPipeline
+from core.toSavepj03wjpj import ToSavepj03wjpj
+from core.xspj_find import XspjFind
+from utils.logger import log, with_event_context
+from utils.profiler import profile_stage
+
+
+def plan_high_score_indices(courses, high_score=None):
+    """
+    按计划选出使用高分策略的课程，遵守不超过40%的限制
+
+    参数:
+        courses: 课程列表
+        high_score: 从1开始的课程序号列表，None 表示默认对前几个课程使用高分
+    返回: 从0开始的课程下标列表
+    """
+    max_90_count = math.ceil(len(courses) * 0.4)
+    if high_score is None:
+        return list(range(max_90_count))
+
+    indices = []
+    for num in high_score:
+        if 1 <= int(num) <= len(courses) and int(num) - 1 not in indices:
+            indices.append(int(num) - 1)
+        else:
+            log.warning(f"序号 {num} 超出范围或重复，已忽略")
+    if len(indices) > max_90_count:
+        log.warning(
+            f"选择数量 ({len(indices)}) 超过限制 ({max_90_count})，只取前 {max_90_count} 个"
+        )
+        indices = indices[:max_90_count]
+    return indices
+
+
+def run_batch(
+    batch,
+    plan,
+    login_kwargs,
+    workers=8,
+    completed=None,
+    on_course_done=None,
+    stop=None,
+):
+    """
+    处理单个评价批次：隐藏参数 → 文字评价 → 流水线打分
+
+    completed / on_course_done / stop 见 EvaluationPipeline
+    返回: 该批次的结果字典
+    """
+    result = {
+        "batch": batch.label,
+        "pj0502id": batch.pj0502id,
+        "xnxq01id": batch.xnxq01id,
+        "ok": False,
+        "courses": 0,
+    }
+    # 按批次单独指定的计划优先，如 {"batches": {"<pj0502id>": {"high_score": [1, 2]}}}
+    batch_plan = {**plan, **plan.get("batches", {}).get(batch.pj0502id, {})}
+
+    with profile_stage("hidden_params"):
+        hidden_params = XspjFind(**login_kwargs).get_hidden_params(batch.path)
+    pipeline = EvaluationPipeline(
+        batch.path,
+        gate=lambda courses: plan_high_score_indices(
+            courses, batch_plan.get("high_score")
+        ),
+        write_workers=workers,
+        show_progress=False,
+        login_kwargs=login_kwargs,
+        completed=completed,
+        on_course_done=on_course_done,
+        verify=batch_plan.get("verify", True),
+        stop=stop,
+    )
+    # 先启动读阶段，与文字评价的提交重叠
+    pipeline.start()
+
+    wjpj_key = f"wjpj|{batch.pj0502id}"
+    if batch_plan.get("wjpj", True):
+        if completed and wjpj_key in completed:
+            result["wjpj"] = "skipped"
+            log.info(f"[{batch.label}] 文字评价此前已提交，跳过")
+        elif stop is not None and stop.is_set():
+            result["wjpj"] = "cancelled"
+        elif hidden_params:
+            with profile_stage("wjpj"):
+                wjpj_result = ToSavepj03wjpj(hidden_params, **login_kwargs).save_do()
+            result["wjpj"] = wjpj_result.outcome.value
+            if wjpj_result.ok and on_course_done is not None:
+                on_course_done(wjpj_key)
+        else:
+            result["wjpj"] = "skipped"
+            log.warning(f"[{batch.label}] 无法获取隐藏参数，文字评价无法提交，将跳过")
+
+    pipeline_result = pipeline.run()
+    result["courses"] = len(pipeline_result.courses)
+    if pipeline_result.cancelled:
+        result["cancelled"] = True
+    result["high_score_courses"] = len(pipeline_result.high_score_indices)
+    result["skipped"] = sum(task.skipped for task in pipeline.tasks)
+    result["clear_success"] = sum(
+        bool(r and r.ok) for r in pipeline_result.clear_results
+    )
+    result["rescore_success"] = sum(
+        bool(r and r.ok) for r in pipeline_result.rescore_results
+    )
+    result["failures"] = [
+        {
+            "index": i + 1,
+            "course": course.name,
+            "teacher": course.teacher,
+            "outcome": rescore.outcome.value if rescore else "missing",
+            "message": rescore.message if rescore else "",
+        }
+        for i, (course, rescore) in enumerate(
+            zip(pipeline_result.courses, pipeline_result.rescore_results)
+        )
+        if not (rescore and rescore.ok)
+    ]
+    if pipeline_result.verify_mismatches is not None:
+        result["verify_mismatches"] = len(pipeline_result.verify_mismatches)
+        result["failures"].extend(
+            {
+                "index": mismatch.index + 1,
+                "course": mismatch.course.name,
+                "teacher": mismatch.course.teacher,
+                "outcome": "verify_mismatch",
+                "message": f"{mismatch.reason}，期望:{mismatch.expected}，实际:{mismatch.actual}",
+            }
+            for mismatch in pipeline_result.verify_mismatches
+        )
+    result["ok"] = not result["failures"]
+    return result
+
+
+def run_job(
+    plan=None,
+    login_manager=None,
+    workers=8,
+    completed=None,
+    on_course_done=None,
+    stop=None,
+    **login_kwargs,
+):
+    """
+    执行一次评教任务，所有开放中的评价批次在同一次登录中并发处理
+
+    参数:
+        plan: 任务计划字典，可选字段:
+            high_score: 使用高分策略的课程序号（从1开始），默认前 40%，对每个批次分别生效
+            wjpj: 是否提交文字评价，默认 True
+            verify: 提交后是否重新获取列表核对结果，默认 True
+            batches: 按 pj0502id 单独指定的批次计划，字段同上
+        login_manager: 已登录的 LoginManager，未传入时用 login_kwargs 新建并登录
+        workers: 每个批次写阶段的线程数
+        completed: 已完成课程的标识集合，这些课程跳过（任务重新投递时使用）
+        on_course_done: 课程重新打分成功（或批次文字评价提交成功）后调用，参数为完成标识
+        stop: threading.Event，被设置后各批次不再开始新的提交
+        login_kwargs: 传给 LoginManager 的 session / account / password / captcha_solver
+    返回: 结果字典，batches 为各批次的结果
+    """
+    plan = plan or {}
+    start = time.perf_counter()
+    result = {"ok": False, "courses": 0, "batches": []}
+
+    if login_manager is None:
+        login_manager = LoginManager(**login_kwargs)
+        with profile_stage("login"):
+            logged_in = login_manager.simulate_login()
+        if not logged_in:
+            result["error"] = "登录失败"
+            return result
+    login_kwargs = login_manager.login_kwargs()
+
+    with profile_stage("find"):
+        batches = XspjFind(**login_kwargs).get_xspj_batches()
+    if not batches:
+        result["error"] = "无法获取评价路径"
+        return result
+
+    with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+        result["batches"] = list(
+            executor.map(
+                with_event_context(
+                    lambda batch: run_batch(
+                        batch, plan, login_kwargs, workers, completed, on_course_done, stop
+                    )
+                ),
+                batches,
+            )
+        )
+
+    for key in (
+        "courses",
+        "high_score_courses",
+        "skipped",
+        "clear_success",
+        "rescore_success",
+    ):
+        result[key] = sum(batch.get(key, 0) for batch in result["batches"])
+    result["ok"] = all(batch["ok"] for batch in result["batches"])
+    result["duration"] = round(time.perf_counter() - start, 3)
+    return result
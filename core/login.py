@@ -4,12 +4,50 @@ import os
 import logging
 import datetime
 from dotenv import load_dotenv
+from utils.http_cassette import install_from_env
 from utils.session_manager import get_session
 import time
 import base64
 import requests
 import subprocess
-from utils.logger import log
+from utils.logger import flush_logs, log, prompt
+
+# OCR服务地址，以及复用连接的独立会话（不带教务系统的Cookie）
+# .env 中留空时使用默认地址，否则会向空地址发请求，识别被静默跳过
+OCR_SERVER_URL = os.getenv("OCR_SERVER_URL", "").strip() or "http://127.0.0.1:9898/ocr"
+_ocr_session = requests.Session()
+install_from_env(_ocr_session)
+
+
+def recognize_with_server(image_content):
+    """
+    请求OCR服务识别验证码
+
+    返回: 识别结果，服务返回错误时为 None；连接失败时抛出异常
+    """
+    # 直接以图片作为请求体上传，省去multipart编码；设置短超时，避免阻塞太久
+    ocr_resp = _ocr_session.post(
+        OCR_SERVER_URL,
+        data=image_content,
+        headers={"Content-Type": "image/jpeg"},
+        timeout=2,
+    )
+    if ocr_resp.status_code == 200:
+        return ocr_resp.json().get("result")
+    return None
+
+
+def load_captcha_solver():
+    """优先在进程内加载OCR模型（常驻内存），未安装 ddddocr 时改用OCR服务"""
+    try:
+        from utils.captcha_ocr import get_ocr_res, warm_up
+
+        warm_up()
+        log.info("已在进程内加载验证码识别模型")
+        return get_ocr_res
+    except ImportError:
+        log.warning("未安装 ddddocr，验证码将交给OCR服务识别")
+        return recognize_with_server
 
 
 # --- 登录管理类 ---
@@ -18,15 +56,34 @@ class LoginManager:
     专门负责处理登录态的类
     """
 
-    def __init__(self):
+    def __init__(self, session=None, account=None, password=None, captcha_solver=None):
         """
         初始化LoginManager
+
+        参数（均可选，常驻模式下为每个账号注入，默认使用全局会话和 .env 中的账号）:
+            session: 使用的会话，默认 get_session() 返回的全局会话
+            account, password: 账号密码
+            captcha_solver: 验证码识别函数，参数为图片字节，返回识别结果；
+                设置后不再请求OCR服务器，识别失败也不会转为手动输入
         """
         load_dotenv()
-        self.session = get_session()
-        self.user_account, self.user_password = self._get_user_config()
+        self.session = session if session is not None else get_session()
+        if account and password:
+            self.user_account, self.user_password = account, password
+        else:
+            self.user_account, self.user_password = self._get_user_config()
+        self.captcha_solver = captcha_solver
         self.base_url = "http://zhjw.qfnu.edu.cn"
 
+    def login_kwargs(self):
+        """构造其他 core 类时沿用本实例的会话和账号"""
+        return {
+            "session": self.session,
+            "account": self.user_account,
+            "password": self.user_password,
+            "captcha_solver": self.captcha_solver,
+        }
+
     def _get_user_config(self):
         """
         获取用户配置
@@ -41,9 +98,10 @@ class LoginManager:
             return account, password
 
         log.warning("未找到账号密码配置，请手动输入")
+        flush_logs()
         print("请输入教务系统账号和密码:")
-        account = input("账号: ").strip()
-        password = input("密码: ").strip()
+        account = prompt("账号: ").strip()
+        password = prompt("密码: ").strip()
 
         # 将输入的账号密码保存到环境变量中，避免后续重复输入
         os.environ["USER_ACCOUNT"] = account
@@ -63,20 +121,20 @@ class LoginManager:
             response.raise_for_status()  # 如果请求失败则抛出HTTPError
             image_content = response.content
 
+            if self.captcha_solver is not None:
+                # 非交互模式（常驻服务），识别失败时返回 None 由调用方重试
+                try:
+                    return self.captcha_solver(image_content) or None
+                except Exception as e:
+                    log.warning(f"验证码识别出错: {e}")
+                    return None
+
             # 1. 优先尝试OCR服务器
             try:
-                ocr_server_url = "http://127.0.0.1:9898/ocr"
-                # 准备文件上传
-                files = {"file": ("captcha.jpg", image_content, "image/jpeg")}
-                # 设置短超时，避免阻塞太久
-                ocr_resp = requests.post(ocr_server_url, files=files, timeout=2)
-
-                if ocr_resp.status_code == 200:
-                    res_json = ocr_resp.json()
-                    if "result" in res_json:
-                        ocr_result = res_json["result"]
-                        log.info(f"OCR服务器识别成功: {ocr_result}")
-                        return ocr_result
+                ocr_result = recognize_with_server(image_content)
+                if ocr_result:
+                    log.info(f"OCR服务器识别成功: {ocr_result}")
+                    return ocr_result
             except Exception as e:
                 log.warning(f"OCR服务器连接失败或识别出错: {e}，转为手动输入模式")
 
@@ -99,7 +157,7 @@ class LoginManager:
                 log.warning(f"自动打开图片失败，请手动查看目录下 {captcha_path}: {e}")
 
             # 获取用户输入
-            user_input = input("请输入验证码(查看弹出的图片): ").strip()
+            user_input = prompt("请输入验证码(查看弹出的图片): ").strip()
             return user_input
 
         except Exception as e:
@@ -141,6 +199,20 @@ class LoginManager:
     def simulate_login(self, max_retries=3):
         """
         模拟登录全过程
+        登录成功后为会话注册自动重新登录，运行中掉线时会透明地重新登录并重放请求
+        参数: max_retries - 最大重试次数
+        返回: 是否登录成功
+        """
+        # 登录流程本身会访问登录页，不能触发会话守护
+        with self.session.unguarded():
+            success = self._simulate_login(max_retries)
+        if success:
+            self.session.set_relogin_handler(self.simulate_login)
+        return success
+
+    def _simulate_login(self, max_retries):
+        """
+        执行登录的各个步骤
         参数: max_retries - 最大重试次数
         返回: 是否登录成功
         """
@@ -155,7 +227,7 @@ class LoginManager:
 
         # 2. 生成加密字符串
         encoded = self._generate_encoded_string()
-        log.debug(f"encoded: {encoded}")
+        log.debug("encoded: %s", encoded)
 
         # 3. 循环尝试登录
         for attempt in range(max_retries):
@@ -165,12 +237,12 @@ class LoginManager:
                 log.warning(f"获取验证码失败，稍后重试... (第 {attempt + 1} 次)")
                 time.sleep(1)
                 continue
-            log.debug(f"识别出的验证码: {random_code}")
+            log.debug("识别出的验证码: %s", random_code)
 
             try:
                 # 发起登录请求
                 response = self._login_request(random_code, encoded)
-                log.debug(f"登录响应状态码: {response.status_code}")
+                log.debug("登录响应状态码: %s", response.status_code)
 
                 if response.status_code == 200:
                     if "验证码错误" in response.text:
@@ -203,7 +275,10 @@ class LoginManager:
         """
         try:
             main_page_url = f"{self.base_url}/jsxsd/framework/xsMain.jsp"
-            response = self.session.get(main_page_url, timeout=5, allow_redirects=False)
+            with self.session.unguarded():
+                response = self.session.get(
+                    main_page_url, timeout=5, allow_redirects=False
+                )
             # 正常登录状态下访问主页是200，如果session失效会被重定向到登录页(302)
             if response.status_code == 200 and "用户登录" not in response.text:
                 log.info("会话有效，当前处于登录状态。")
@@ -0,0 +1,487 @@
+# core/pipeline.py
+# 评教流水线：列表分页 → 课程记录 → 获取/解析打分页面 → 清除限制 → 重新打分
+# 各阶段之间用有界队列连接，每个阶段有自己的线程数，翻页、获取打分页面和提交互相重叠
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from core.xspj_list import CourseRecord, XspjList, course_key
+from core.xspj_save import XspjSave, parse_form_page
+from core.xspj_verify import XspjVerify
+from utils.latency import record_latency
+from utils.logger import log, log_event, with_event_context
+from utils.parse_pool import run_parse
+from utils.profiler import profile_stage
+from utils.progress import ProgressReporter
+from utils.response_parser import SaveOutcome, SaveResult
+
+# 队列结束标记
+_DONE = object()
+
+
+def default_high_score_indices(courses):
+    """默认策略：前 40% 的课程使用高分"""
+    return list(range(math.ceil(len(courses) * 0.4)))
+
+
+@dataclass
+class CourseTask:
+    """一门课程在流水线中的状态"""
+
+    index: int
+    course: CourseRecord
+    xspj_save: XspjSave | None = None
+    form_schema: dict | None = None
+    scenario: str | None = None
+    clear_result: SaveResult | None = None
+    rescore_result: SaveResult | None = None
+    skipped: bool = False
+
+
+@dataclass
+class PipelineResult:
+    """流水线的运行结果"""
+
+    courses: list = field(default_factory=list)
+    high_score_indices: list = field(default_factory=list)
+    clear_results: list = field(default_factory=list)
+    rescore_results: list = field(default_factory=list)
+    cancelled: bool = False
+    # 核对后仍不一致的课程（VerifyMismatch），None 表示未核对或列表获取失败
+    verify_mismatches: list | None = None
+
+
+class _Stage:
+    """
+    流水线中的一个阶段：若干线程从 inbox 取任务处理，处理结果放入 outbox
+
+    上游放入结束标记后，最后一个退出的线程把结束标记继续传给下游
+    """
+
+    def __init__(self, name, workers, handle, inbox, outbox=None):
+        self.name = name
+        self.workers = workers
+        self.handle = handle
+        self.inbox = inbox
+        self.outbox = outbox
+        self.done = threading.Event()
+        self.processed = 0
+        self._alive = workers
+        self._lock = threading.Lock()
+        self._start_time = None
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        for n in range(self.workers):
+            threading.Thread(
+                target=with_event_context(self._work),
+                name=f"{self.name}-{n}",
+                daemon=True,
+            ).start()
+
+    def _work(self):
+        try:
+            self._drain()
+        finally:
+            with self._lock:
+                self._alive -= 1
+                last = self._alive == 0
+            if last:
+                log_event(
+                    "stage",
+                    stage=self.name,
+                    duration=round(time.perf_counter() - self._start_time, 4),
+                    items=self.processed,
+                    outcome="success",
+                )
+                if self.outbox is not None:
+                    self.outbox.put(_DONE)
+                self.done.set()
+
+    def _drain(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                # 放回结束标记，让同阶段的其他线程也能退出
+                self.inbox.put(_DONE)
+                break
+            try:
+                # 只剖析处理任务的时间，不含等待上游和闸门确认的时间
+                with profile_stage(self.name):
+                    result = self.handle(item)
+            except Exception as e:
+                log.error(f"流水线阶段 {self.name} 处理任务时发生异常: {e}")
+                result = item
+            with self._lock:
+                self.processed += 1
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+
+class EvaluationPipeline:
+    """
+    分阶段的评教流水线
+
+    列表阶段边翻页边产出课程，打分页面的获取和解析随即开始；
+    写阶段（清除限制、重新打分）要等 gate 确认后才开始，每门课程清除限制后立即重新打分。
+    打分页面在等待确认期间预取，用于清除限制的提交；清除限制会改变服务器端的评价记录，
+    重新打分前再获取一次打分页面，用提交后的页面生成请求体（与逐门课程的原流程一致）。
+    """
+
+    def __init__(
+        self,
+        xspj_path,
+        gate=None,
+        fetch_workers=4,
+        write_workers=8,
+        queue_size=32,
+        show_progress=True,
+        login_kwargs=None,
+        completed=None,
+        on_course_done=None,
+        verify=True,
+        verify_workers=4,
+        stop=None,
+    ):
+        """
+        参数:
+            xspj_path: 评价列表路径
+            gate: 写阶段开始前调用的函数，参数为完整的课程列表，
+                返回使用高分策略的课程下标列表，返回 None 表示取消；
+                默认对前 40% 的课程使用高分
+            fetch_workers: 获取打分页面的线程数
+            write_workers: 清除限制、重新打分各自的线程数，实际写并发由限流器控制
+            queue_size: 阶段之间队列的容量
+            show_progress: 提交期间是否在终端刷新进度行
+            login_kwargs: 构造 XspjList / XspjSave 时传入的会话和账号（常驻模式多账号使用），
+                默认使用全局会话
+            completed: 已完成课程的标识集合（见 course_key），这些课程不再获取打分页面和提交，
+                任务被重新投递时避免重复提交
+            on_course_done: 课程重新打分成功后调用，参数为课程标识
+            verify: 提交完成后重新获取一次列表，核对提交状态和总评分，只对不一致的课程重试
+            verify_workers: 核对时并发获取列表页面的线程数
+            stop: threading.Event，被设置后不再开始新的提交（如批量运行中租约被其他 worker 接管），
+                结果的 cancelled 为 True
+        """
+        self.xspj_path = xspj_path
+        self.gate = gate or default_high_score_indices
+        self.fetch_workers = fetch_workers
+        self.write_workers = write_workers
+        self.show_progress = show_progress
+        self.login_kwargs = login_kwargs or {}
+        self.completed = completed or set()
+        self.on_course_done = on_course_done
+        self.verify = verify
+        self.verify_workers = verify_workers
+        self.stop = stop
+        self.tasks = []
+        self.high_score_indices = set()
+        self.list_done = threading.Event()
+        self._cancelled = False
+        self._deferred_lock = threading.Lock()
+        self._deferred = []
+        self._started = False
+
+        self._form_queue = queue.Queue(maxsize=queue_size)
+        # 闸门打开前解析好的课程都在这里等待，不能限制长度，否则列表阶段会被阻塞而无法进入闸门
+        self._clear_queue = queue.Queue()
+        self._rescore_queue = queue.Queue(maxsize=queue_size)
+
+        self._form_stage = _Stage(
+            "form", fetch_workers, self._fetch_form, self._form_queue, self._clear_queue
+        )
+        self._clear_stage = _Stage(
+            "clear",
+            write_workers,
+            self._clear,
+            self._clear_queue,
+            self._rescore_queue,
+        )
+        self._rescore_stage = _Stage(
+            "rescore", write_workers, self._rescore, self._rescore_queue
+        )
+
+    def start(self):
+        """
+        启动读阶段（列表、打分页面），写阶段在 run() 中经过闸门后启动
+
+        可以在交互提示之前提前调用，列表和打分页面在用户操作期间后台预取
+        """
+        if not self._started:
+            self._started = True
+            threading.Thread(
+                target=with_event_context(self._produce_list), name="list", daemon=True
+            ).start()
+            self._form_stage.start()
+
+    def run(self):
+        """运行整个流水线，阻塞直到所有课程处理完毕，返回 PipelineResult"""
+        self.start()
+        self.list_done.wait()
+        courses = [task.course for task in self.tasks]
+        result = PipelineResult(courses=courses)
+        if not courses:
+            return result
+
+        prefetched = self.prefetched()
+        if prefetched < len(courses):
+            log.info(
+                f"打分页面已预取 {prefetched}/{len(courses)}，其余在后台继续获取"
+            )
+        else:
+            log.info(f"打分页面已全部预取 ({prefetched}门)，确认后只需提交")
+
+        high_score_indices = self.gate(courses)
+        if high_score_indices is None or self.cancelled:
+            self._cancelled = True
+            result.cancelled = True
+            return result
+        self.high_score_indices = set(high_score_indices)
+        result.high_score_indices = list(high_score_indices)
+
+        log.info("\n开始执行自动评教...")
+        reporter = ProgressReporter(self.progress)
+        if self.show_progress:
+            reporter.start()
+        try:
+            self._clear_stage.start()
+            self._rescore_stage.start()
+            self._rescore_stage.done.wait()
+
+            if self._deferred and not self.cancelled:
+                # 高分策略在其他课程清除限制前被拒绝（超过40%限制），全部清除完成后重试
+                log.info(f"重试 {len(self._deferred)} 门因比例限制被拒绝的高分课程...")
+                with ThreadPoolExecutor(max_workers=self.write_workers) as executor:
+                    list(
+                        executor.map(with_event_context(self._rescore_now), self._deferred)
+                    )
+        finally:
+            reporter.stop()
+
+        if self.verify and not self.cancelled:
+            result.verify_mismatches = self._verify_and_retry()
+
+        result.cancelled = self.cancelled
+        if result.cancelled:
+            log.warning("流水线已停止，未完成的课程没有提交")
+        result.clear_results = [task.clear_result for task in self.tasks]
+        result.rescore_results = [task.rescore_result for task in self.tasks]
+        return result
+
+    def _verify_and_retry(self):
+        """重新获取一次列表核对提交结果，只对不一致的课程重新打分，重试后再核对一次"""
+        verifier = XspjVerify(self.xspj_path, **self.login_kwargs)
+        start = time.perf_counter()
+        with profile_stage("verify"):
+            mismatches = verifier.verify(self.tasks, self.verify_workers)
+        if mismatches:
+            retry = [self.tasks[mismatch.index] for mismatch in mismatches]
+            log.info(f"对 {len(retry)} 门核对不一致的课程重新打分...")
+            with ThreadPoolExecutor(max_workers=self.write_workers) as executor:
+                list(executor.map(with_event_context(self._retry_mismatch), retry))
+            with profile_stage("verify"):
+                mismatches = verifier.verify(self.tasks, self.verify_workers)
+        log_event(
+            "stage",
+            stage="verify",
+            duration=round(time.perf_counter() - start, 4),
+            mismatches=None if mismatches is None else len(mismatches),
+            outcome="success" if mismatches == [] else "mismatch",
+        )
+        return mismatches
+
+    def _retry_mismatch(self, task):
+        """核对不一致的课程按原策略重新打分（打分页面在 _rescore_now 中重新获取，此前跳过的课程也一样）"""
+        task.skipped = False
+        if task.scenario is None:
+            task.scenario = (
+                "scenario_98"
+                if task.index in self.high_score_indices
+                else "scenario_89"
+            )
+        self._rescore_now(task)
+
+    @property
+    def cancelled(self):
+        """闸门处取消，或外部设置了 stop"""
+        return self._cancelled or (self.stop is not None and self.stop.is_set())
+
+    def prefetched(self):
+        """已获取并解析打分页面的课程数（含此前已完成、无需获取的课程）"""
+        return sum(
+            task.form_schema is not None or task.skipped for task in self.tasks
+        )
+
+    def progress(self):
+        """返回 (已完成重新打分的课程数, 课程总数)"""
+        done = sum(task.rescore_result is not None for task in self.tasks)
+        return done, len(self.tasks)
+
+    def _produce_list(self):
+        """列表阶段：流式翻页，每解析出一行就交给下游获取打分页面"""
+        start = time.perf_counter()
+        outcome = "success"
+        try:
+            with profile_stage("list"):
+                for course in XspjList(self.xspj_path, **self.login_kwargs).iter_courses():
+                    task = CourseTask(
+                        index=len(self.tasks),
+                        course=course,
+                        skipped=course_key(course) in self.completed,
+                    )
+                    self.tasks.append(task)
+                    self._form_queue.put(task)
+        except Exception as e:
+            outcome = "error"
+            log.error(f"获取评价列表时发生异常: {e}")
+        finally:
+            self._form_queue.put(_DONE)
+            log.info(f"获取评价列表完成，共有{len(self.tasks)}条数据")
+            log_event(
+                "stage",
+                stage="list",
+                duration=round(time.perf_counter() - start, 4),
+                courses=len(self.tasks),
+                outcome=outcome,
+            )
+            self.list_done.set()
+
+    def _fetch_form(self, task):
+        """预取阶段：获取并解析单门课程的打分页面"""
+        if self.cancelled:
+            return None
+        if task.skipped:
+            return task
+        self._load_form(task)
+        log.debug("已解析打分页面: %s - %s", task.course.name, task.course.teacher)
+        return task
+
+    def _load_form(self, task):
+        """获取并解析单门课程的打分页面，结果存入 task.form_schema"""
+        if task.xspj_save is None:
+            task.xspj_save = XspjSave(task.course.href, **self.login_kwargs)
+        response = task.xspj_save.get_xspj_save_response()
+        start = time.perf_counter()
+        # 启用解析进程池时在子进程中解析，只传回表单结构字典
+        task.form_schema = run_parse(
+            parse_form_page, response.content, response.encoding
+        )
+        record_latency("parse:form", time.perf_counter() - start)
+
+    def _build_and_save(self, task, scenario):
+        """按策略生成请求体并提交，请求体生成失败时不提交"""
+        if task.xspj_save is None or task.form_schema is None:
+            return SaveResult(SaveOutcome.VALIDATION_ERROR, "打分页面获取失败")
+        payload = task.xspj_save.build_payload(task.form_schema, scenario)
+        if "error" in payload:
+            return SaveResult(SaveOutcome.VALIDATION_ERROR, payload["error"])
+        if self.cancelled:
+            return SaveResult(SaveOutcome.SERVER_ERROR, "流水线已停止，未提交")
+        try:
+            return task.xspj_save.save_do(payload)
+        except Exception as e:
+            return SaveResult(SaveOutcome.SERVER_ERROR, f"提交时发生异常: {e}")
+
+    def _clear(self, task):
+        """用89分策略预打分，清除单门课程的系统限制"""
+        if self.cancelled:
+            return None
+        course = task.course
+        if task.skipped:
+            task.clear_result = SaveResult(SaveOutcome.SUCCESS, "此前已完成，跳过")
+            return task
+        start = time.perf_counter()
+        task.clear_result = self._build_and_save(task, "scenario_clear")
+        log_event(
+            "course",
+            stage="clear",
+            course=course.name,
+            teacher=course.teacher,
+            strategy="scenario_clear",
+            duration=round(time.perf_counter() - start, 4),
+            outcome=task.clear_result.outcome.value,
+            message=task.clear_result.message,
+        )
+
+        if task.clear_result.ok:
+            log.info(
+                f"清除限制成功，序号:{task.index+1:2d}，课程:{course.name}，老师:{course.teacher}"
+            )
+        else:
+            log.warning(
+                f"清除限制可能失败({task.clear_result.outcome.value})，序号:{task.index+1:2d}，课程:{course.name}，老师:{course.teacher}，返回:{task.clear_result.message}"
+            )
+        return task
+
+    def _rescore(self, task):
+        """按选定策略重新打分，高分被拒绝时推迟到所有课程清除限制之后重试"""
+        if self.cancelled:
+            return None
+        if task.skipped:
+            task.rescore_result = SaveResult(SaveOutcome.SUCCESS, "此前已完成，跳过")
+            log.info(
+                f"此前已完成，跳过，序号:{task.index+1:2d}，课程:{task.course.name}，老师:{task.course.teacher}"
+            )
+            return None
+        task.scenario = (
+            "scenario_98" if task.index in self.high_score_indices else "scenario_89"
+        )
+        self._rescore_now(task, allow_defer=True)
+        return None
+
+    def _rescore_now(self, task, allow_defer=False):
+        if self.cancelled:
+            return
+        course = task.course
+        start = time.perf_counter()
+        try:
+            # 用清除限制之后的打分页面生成请求体
+            self._load_form(task)
+        except Exception as e:
+            result = SaveResult(SaveOutcome.SERVER_ERROR, f"重新获取打分页面失败: {e}")
+        else:
+            result = self._build_and_save(task, task.scenario)
+
+        # 被40%比例限制拒绝时，可能只是其他课程还没清除限制；即使此刻所有清除都已完成，
+        # 服务器判断时看到的也可能是清除前的状态，所以一律推迟，清除阶段全部结束后再重试一次
+        if (
+            allow_defer
+            and task.scenario == "scenario_98"
+            and result.outcome is SaveOutcome.VALIDATION_ERROR
+        ):
+            log.info(
+                f"高分策略暂时被拒绝，等待其他课程清除限制后重试，序号:{task.index+1:2d}，课程:{course.name}，返回:{result.message}"
+            )
+            with self._deferred_lock:
+                self._deferred.append(task)
+            return
+
+        task.rescore_result = result
+        strategy_desc = (
+            "高分策略(98分)" if task.scenario == "scenario_98" else "标准策略(89分)"
+        )
+        log_event(
+            "course",
+            stage="rescore",
+            course=course.name,
+            teacher=course.teacher,
+            strategy=task.scenario,
+            duration=round(time.perf_counter() - start, 4),
+            outcome=result.outcome.value,
+            message=result.message,
+        )
+        if result.ok:
+            if self.on_course_done is not None:
+                try:
+                    self.on_course_done(course_key(course))
+                except Exception as e:
+                    log.warning(f"记录课程完成标记失败: {e}")
+            log.info(
+                f"保存打分结果成功，序号:{task.index+1:2d}，课程:{course.name}，老师:{course.teacher}，策略:{strategy_desc}，返回结果:{result.message}"
+            )
+        else:
+            log.error(
+                f"保存打分结果失败({result.outcome.value})，序号:{task.index+1:2d}，课程:{course.name}，老师:{course.teacher}，策略:{strategy_desc}，返回结果:{result.message}"
+            )
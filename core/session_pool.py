@@ -0,0 +1,237 @@
+# core/session_pool.py
+# 预登录会话池：每个账号保持若干个已登录的会话，后台心跳保活，任务执行时直接借出，不再等待验证码登录
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from core.login import LoginManager
+from utils.logger import log
+from utils.session_manager import create_session
+
+
+class _AccountSessions:
+    """单个账号的会话：空闲队列、已创建数量和最近一次检查时间"""
+
+    def __init__(self, password):
+        self.password = password
+        self.idle = deque()
+        self.total = 0
+        self.checked_at = {}
+        self.cond = threading.Condition()
+
+
+class SessionPool:
+    """
+    按账号管理已登录的 LoginManager
+
+    用法:
+        pool = SessionPool(size=2, captcha_solver=...)
+        pool.start()
+        pool.register(account, password)      # 后台预先登录
+        with pool.lease(account) as manager:
+            XspjFind(**manager.login_kwargs()).get_xspj_path()
+    """
+
+    def __init__(self, size=2, heartbeat_interval=300, captcha_solver=None):
+        """
+        参数:
+            size: 每个账号最多保持的会话数
+            heartbeat_interval: 空闲会话的检查间隔（秒），访问主页可以刷新服务器端的会话过期时间
+            captcha_solver: 登录时使用的验证码识别函数
+        """
+        self.size = size
+        self.heartbeat_interval = heartbeat_interval
+        self.captcha_solver = captcha_solver
+        self._accounts = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _get(self, account, password=None):
+        """获取账号的会话记录，首次出现时用传入的密码注册；已注册账号的密码不在这里修改"""
+        with self._lock:
+            sessions = self._accounts.get(account)
+            if sessions is None:
+                if password is None:
+                    raise KeyError(f"账号 {account} 未注册到会话池")
+                sessions = self._accounts[account] = _AccountSessions(password)
+            return sessions
+
+    def _login(self, account, password):
+        """新建会话并登录，失败返回 None"""
+        manager = LoginManager(
+            session=create_session(),
+            account=account,
+            password=password,
+            captcha_solver=self.captcha_solver,
+        )
+        if manager.simulate_login():
+            return manager
+        return None
+
+    def _login_with_new_password(self, account, sessions, password):
+        """
+        用与登记不同的密码当场登录，成功后才替换登记的密码，并丢弃用旧密码登录的空闲会话
+        返回: 新登录的 LoginManager（已计入借出），失败返回 None
+        """
+        manager = self._login(account, password)
+        if manager is None:
+            log.warning(f"账号 {account} 的密码与会话池中登记的不一致，且用新密码登录失败")
+            return None
+        with sessions.cond:
+            sessions.password = password
+            while sessions.idle:
+                self._evict(sessions, sessions.idle.popleft())
+            sessions.total += 1
+            sessions.checked_at[id(manager)] = time.monotonic()
+            sessions.cond.notify_all()
+        log.info(f"账号 {account} 已用新密码登录，替换会话池中登记的密码")
+        return manager
+
+    def register(self, account, password, warm=True):
+        """注册账号；warm 为 True 时在后台补足该账号的会话"""
+        sessions = self._get(account, password)
+        if password != sessions.password:
+            # 已注册的账号换了密码：验证新密码登录成功后才替换
+            manager = self._login_with_new_password(account, sessions, password)
+            if manager is not None:
+                self.checkin(manager)
+        if warm:
+            threading.Thread(
+                target=self._fill, args=(account,), name=f"pool-fill-{account}", daemon=True
+            ).start()
+
+    def _fill(self, account):
+        """补足账号的会话数"""
+        sessions = self._get(account)
+        while not self._stop.is_set():
+            with sessions.cond:
+                if sessions.total >= self.size:
+                    return
+                sessions.total += 1
+            manager = self._login(account, sessions.password)
+            with sessions.cond:
+                if manager is None:
+                    sessions.total -= 1
+                    sessions.cond.notify()
+                    log.warning(f"会话池预登录失败: {account}")
+                    return
+                sessions.idle.append(manager)
+                sessions.checked_at[id(manager)] = time.monotonic()
+                sessions.cond.notify()
+
+    def checkout(self, account, password=None, timeout=None):
+        """
+        借出一个已登录的会话，池中没有空闲会话且未达到上限时当场登录
+
+        password 与登记的密码不同时不借出已有会话，而是用该密码当场登录，成功后替换登记的密码
+
+        返回: LoginManager，登录失败或等待超时时返回 None
+        """
+        sessions = self._get(account, password)
+        if password is not None and password != sessions.password:
+            return self._login_with_new_password(account, sessions, password)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with sessions.cond:
+            while not sessions.idle:
+                if sessions.total < self.size:
+                    sessions.total += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                sessions.cond.wait(remaining)
+            else:
+                return sessions.idle.popleft()
+
+        manager = self._login(account, sessions.password)
+        with sessions.cond:
+            if manager is None:
+                sessions.total -= 1
+                sessions.cond.notify()
+            else:
+                sessions.checked_at[id(manager)] = time.monotonic()
+        return manager
+
+    def checkin(self, manager, healthy=True):
+        """归还会话；healthy 为 False 或借出期间登记的密码已更换时直接丢弃，由心跳线程补足"""
+        sessions = self._get(manager.user_account)
+        with sessions.cond:
+            if healthy and manager.user_password == sessions.password:
+                sessions.idle.append(manager)
+            else:
+                self._evict(sessions, manager)
+            sessions.cond.notify()
+
+    def _evict(self, sessions, manager):
+        sessions.total -= 1
+        sessions.checked_at.pop(id(manager), None)
+        manager.session.close()
+
+    @contextmanager
+    def lease(self, account, password=None, timeout=None):
+        """借出会话的上下文管理器，退出时自动归还"""
+        manager = self.checkout(account, password, timeout)
+        if manager is None:
+            raise RuntimeError(f"无法获取已登录的会话: {account}")
+        try:
+            yield manager
+        finally:
+            self.checkin(manager)
+
+    def heartbeat(self):
+        """检查所有空闲会话：到期的访问主页保活，失效的重新登录，登录失败的移出会话池，最后补足数量"""
+        with self._lock:
+            accounts = list(self._accounts.items())
+        now = time.monotonic()
+        for account, sessions in accounts:
+            with sessions.cond:
+                due = [
+                    manager
+                    for manager in sessions.idle
+                    if now - sessions.checked_at.get(id(manager), 0)
+                    >= self.heartbeat_interval
+                ]
+                # 检查期间从空闲队列中取出，避免被借出
+                for manager in due:
+                    sessions.idle.remove(manager)
+
+            for manager in due:
+                alive = manager.check_login_status() or manager.simulate_login()
+                with sessions.cond:
+                    if alive:
+                        sessions.checked_at[id(manager)] = time.monotonic()
+                        sessions.idle.append(manager)
+                    else:
+                        log.warning(f"会话已失效且重新登录失败，移出会话池: {account}")
+                        self._evict(sessions, manager)
+                    sessions.cond.notify()
+
+            self._fill(account)
+
+    def _run(self):
+        # 检查频率比过期间隔高一些，每个会话在到期后尽快被检查到
+        while not self._stop.wait(max(1, self.heartbeat_interval / 4)):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                log.error(f"会话池心跳出错: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="session-pool-heartbeat", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        with self._lock:
+            accounts = list(self._accounts.items())
+        return {
+            account: {"idle": len(sessions.idle), "total": sessions.total}
+            for account, sessions in accounts
+        }
@@ -1,21 +1,30 @@
 from core.login import LoginManager
 from core.xspj_find import XspjFind
 from utils.logger import log
+from utils.rate_limiter import get_limiter, submit_with_limiter
 
 
 # 保存评教
 class ToSavepj03wjpj(LoginManager):
-    def __init__(self, hidden_params: dict):
-        super().__init__()
+    def __init__(self, hidden_params: dict, **kwargs):
+        super().__init__(**kwargs)
         self.url = "http://zhjw.qfnu.edu.cn/jsxsd/xspj/toSavepj03wjpj.do"
         self.hidden_params = hidden_params
 
     def save_do(self):
+        """
+        提交文字评价
+
+        Returns:
+            SaveResult: 解析后的保存结果
+        """
         payload = self.hidden_params
         payload["jynr"] = "A."
         payload["pageIndex"] = "1"
-        response = self.session.post(self.url, data=payload)
-        return response.text
+        limiter = get_limiter("toSavepj03wjpj.do", self.user_account)
+        return submit_with_limiter(
+            limiter, lambda: self.session.post(self.url, data=payload, timeout=10)
+        )
 
 
 if __name__ == "__main__":
@@ -35,4 +44,4 @@ if __name__ == "__main__":
         log.error("无法获取隐藏参数")
         exit(0)
     toSavepj03wjpj = ToSavepj03wjpj(hidden_params)
-    log.info(toSavepj03wjpj.save_do())
+    log.info(toSavepj03wjpj.save_do().message)
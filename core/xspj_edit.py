@@ -4,12 +4,11 @@ from utils.logger import log
 from core.login import LoginManager
 from core.xspj_find import XspjFind
 from core.xspj_list import XspjList
-import json
 
 
 class XspjEdit(LoginManager):
-    def __init__(self, xspj_path):
-        super().__init__()
+    def __init__(self, xspj_path, **kwargs):
+        super().__init__(**kwargs)
         self.url = f"http://zhjw.qfnu.edu.cn{xspj_path}"
 
     def get_xspj_edit(self):
@@ -27,9 +26,9 @@ if __name__ == "__main__":
 
     xspj_find = XspjFind()
     xspj_path = xspj_find.get_xspj_path()
-    xspj_list = json.loads(XspjList(xspj_path).get_xspj_list())
+    xspj_list = XspjList(xspj_path).get_courses()
     log.info(
-        f"获取评价列表成功，共有{len(xspj_list)}条数据,分别有：{[item['授课教师'] for item in xspj_list]}"
+        f"获取评价列表成功，共有{len(xspj_list)}条数据,分别有：{[course.teacher for course in xspj_list]}"
     )
-    for item in xspj_list:
-        xspj_edit = XspjEdit(item["操作"]["href"]).get_xspj_edit()
+    for course in xspj_list:
+        xspj_edit = XspjEdit(course.href).get_xspj_edit()
@@ -1,13 +1,35 @@
 # core/xspj_find.py
 # 获取学生评价批次页面的参数路径
 import re
+import html
+from dataclasses import dataclass
+from urllib.parse import parse_qs, urlsplit
 from utils.logger import log
 from core.login import LoginManager
 
+# 评价批次页面上每个开放批次的"进入评价"链接
+BATCH_LINK_PATTERN = re.compile(
+    r'<a href="/jsxsd/xspj/xspj_list.do(.*?)" title="点击进入评价">进入评价</a>'
+)
+
+
+@dataclass(frozen=True)
+class EvaluationBatch:
+    """一个开放中的评价批次（理论课、实验课、体育课等）"""
+
+    path: str  # xspj_list.do 后面的参数路径
+    pj0502id: str = ""
+    xnxq01id: str = ""
+    name: str = ""
+
+    @property
+    def label(self):
+        return self.name or self.pj0502id or self.path
+
 
 class XspjFind(LoginManager):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
         self.url = "http://zhjw.qfnu.edu.cn/jsxsd/xspj/xspj_find.do"
 
     def get_xspj_path(self):
@@ -16,19 +38,68 @@ class XspjFind(LoginManager):
         """
         response = self.session.get(self.url)
         xspj_path = self.extract_xspj_id(response.text)
-        log.debug(f"本次评价批次的参数路径: {xspj_path}")
+        log.debug("本次评价批次的参数路径: %s", xspj_path)
         log.info("获取评价批次参数路径成功")
         return xspj_path
 
+    def get_xspj_batches(self):
+        """
+        获取所有开放中的评价批次
+        返回: EvaluationBatch 列表
+        """
+        response = self.session.get(self.url)
+        batches = self.extract_xspj_batches(response.text)
+        for batch in batches:
+            log.debug("评价批次: %s %s", batch.label, batch.path)
+        log.info(f"获取评价批次成功，共{len(batches)}个开放中的批次")
+        return batches
+
+    def extract_xspj_batches(self, response_text):
+        """
+        从评价批次页面提取所有"进入评价"链接，按页面顺序返回（去重）
+        """
+        batches = []
+        seen = set()
+        for match in BATCH_LINK_PATTERN.finditer(response_text):
+            path = match.group(1)
+            if path in seen:
+                continue
+            seen.add(path)
+
+            query = parse_qs(urlsplit(html.unescape(path)).query)
+            batches.append(
+                EvaluationBatch(
+                    path=path,
+                    pj0502id=query.get("pj0502id", [""])[0],
+                    xnxq01id=query.get("xnxq01id", [""])[0],
+                    name=self._batch_row_name(response_text, match),
+                )
+            )
+
+        if not batches:
+            log.error("未找到评价URL")
+        return batches
+
+    def _batch_row_name(self, response_text, match):
+        """取链接所在表格行的其他单元格文本作为批次名称，如 2024-2025-2 理论课评价"""
+        row_start = response_text.rfind("<tr", 0, match.start())
+        row_end = response_text.find("</tr>", match.end())
+        if row_start == -1 or row_end == -1:
+            return ""
+        cells = re.findall(
+            r"<td[^>]*>(.*?)</td>", response_text[row_start:row_end], re.S
+        )
+        texts = [re.sub(r"<[^>]+>|&nbsp;", " ", cell).strip() for cell in cells]
+        return " ".join(
+            " ".join(text.split()) for text in texts if text and text != "进入评价"
+        )
+
     def extract_xspj_id(self, response_text):
         """
         从响应文本中提取本次评价批次的ID和相关参数
         """
         # 提取完整的评价URL
-        pattern = (
-            r'<a href="/jsxsd/xspj/xspj_list.do(.*?)" title="点击进入评价">进入评价</a>'
-        )
-        match = re.search(pattern, response_text)
+        match = BATCH_LINK_PATTERN.search(response_text)
         if match:
             return match.group(1)
         else:
@@ -49,7 +120,7 @@ class XspjFind(LoginManager):
         pj0502id_match = re.search(pj0502id_pattern, response_text)
         if pj0502id_match:
             params["pj0502id"] = pj0502id_match.group(1)
-            log.debug(f"提取到pj0502id: {params['pj0502id']}")
+            log.debug("提取到pj0502id: %s", params["pj0502id"])
         else:
             log.error("未找到pj0502id")
 
@@ -60,7 +131,7 @@ class XspjFind(LoginManager):
         pj05id_match = re.search(pj05id_pattern, response_text)
         if pj05id_match:
             params["pj05id"] = pj05id_match.group(1)
-            log.debug(f"提取到pj05id: {params['pj05id']}")
+            log.debug("提取到pj05id: %s", params["pj05id"])
         else:
             log.error("未找到pj05id")
 
@@ -71,7 +142,7 @@ class XspjFind(LoginManager):
         pj02id_match = re.search(pj02id_pattern, response_text)
         if pj02id_match:
             params["pj02id"] = pj02id_match.group(1)
-            log.debug(f"提取到pj02id: {params['pj02id']}")
+            log.debug("提取到pj02id: %s", params["pj02id"])
         else:
             log.error("未找到pj02id")
 
@@ -82,7 +153,7 @@ class XspjFind(LoginManager):
         pj01id_match = re.search(pj01id_pattern, response_text)
         if pj01id_match:
             params["pj01id"] = pj01id_match.group(1)
-            log.debug(f"提取到pj01id: {params['pj01id']}")
+            log.debug("提取到pj01id: %s", params["pj01id"])
         else:
             log.error("未找到pj01id")
 
@@ -91,7 +162,7 @@ class XspjFind(LoginManager):
         pj03id_match = re.search(pj03id_pattern, response_text)
         if pj03id_match:
             params["pj03id"] = pj03id_match.group(1)
-            log.debug(f"提取到pj03id: {params['pj03id']}")
+            log.debug("提取到pj03id: %s", params["pj03id"])
         else:
             log.error("未找到pj03id")
 
@@ -110,7 +181,7 @@ class XspjFind(LoginManager):
         if xspj_path:
             # 构建评价列表页面URL
             list_url = f"http://zhjw.qfnu.edu.cn/jsxsd/xspj/xspj_list.do{xspj_path}"
-            log.debug(f"正在访问评价列表页面: {list_url}")
+            log.debug("正在访问评价列表页面: %s", list_url)
 
             # 请求评价列表页面
             list_response = self.session.get(list_url)
@@ -3,62 +3,241 @@
 from utils.logger import log
 from core.login import LoginManager
 from core.xspj_find import XspjFind
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple, dataclass
 import json
 import re
 from bs4 import BeautifulSoup
+from lxml import etree
+from utils.parse_pool import parse_pool_enabled, run_parse
+from utils import latency
+import time
+
+
+@dataclass(slots=True)
+class CourseRecord:
+    """评价列表中的一门课程（一行）"""
+
+    index: str | None = None  # 序号
+    course_id: str | None = None  # 课程编号
+    name: str | None = None  # 课程名称
+    teacher: str | None = None  # 授课教师
+    category: str | None = None  # 评教类别
+    total_score: str | None = None  # 总评分
+    evaluated: str | None = None  # 已评
+    submitted: str | None = None  # 是否提交
+    action: str | None = None  # 操作列的链接文字
+    href: str | None = None  # 操作列的链接（打分页面路径）
+    extra: dict | None = None  # HEADER_FIELDS 之外的列 {表头: 文本}，没有时为 None
+
+    def to_dict(self):
+        """
+        转换为以表头为键的字典，与 extract_table_to_json 的输出格式一致
+        （未知的列排在已知列之后，而不是按页面上的列顺序）
+        """
+        row = {}
+        for header, field_name in HEADER_FIELDS.items():
+            if header == "操作":
+                row[header] = (
+                    {"text": self.action, "href": self.href}
+                    if self.href is not None
+                    else None
+                )
+            else:
+                row[header] = getattr(self, field_name)
+        if self.extra:
+            row.update(self.extra)
+        return row
+
+
+def course_key(course):
+    """课程的唯一标识（打分页面链接中包含批次、课程和教师），用于完成标记和核对"""
+    return course.href or f"{course.course_id}|{course.teacher}"
+
+
+# 表头 -> CourseRecord 字段
+HEADER_FIELDS = {
+    "序号": "index",
+    "课程编号": "course_id",
+    "课程名称": "name",
+    "授课教师": "teacher",
+    "评教类别": "category",
+    "总评分": "total_score",
+    "已评": "evaluated",
+    "是否提交": "submitted",
+    "操作": "href",
+}
 
 
 class XspjList(LoginManager):
     """传入的内容形如?pj0502id=90FC36409E9645E7973F752FCD15D88A&pj01id=&xnxq01id=2024-2025-2"""
 
-    def __init__(self, xspj_path):
-        super().__init__()
+    def __init__(self, xspj_path, **kwargs):
+        super().__init__(**kwargs)
         self.url = f"http://zhjw.qfnu.edu.cn/jsxsd/xspj/xspj_list.do{xspj_path}"
         self.xspj_path = xspj_path
 
-    def get_xspj_list(self):
-        """获取所有页面的评价列表数据"""
-        all_data = []
-        page_index = 1
+    def get_courses(self):
+        """获取所有页面的评价列表，返回 CourseRecord 列表"""
+        all_courses = list(self.iter_courses())
+        log.info(f"获取评价列表成功，总共{len(all_courses)}条数据")
+        return all_courses
 
-        # 获取第一页数据
-        response = self.session.post(self.url)
-        first_page_data = extract_table_to_json(response.text)
+    def iter_courses(self, chunk_size=8192):
+        """
+        流式获取所有页面的评价列表，边下载边解析，逐个产出 CourseRecord
 
-        if isinstance(first_page_data, str):
-            first_page_list = json.loads(first_page_data)
-        else:
-            first_page_list = first_page_data
+        第一页解析完后才能拿到总页数和翻页用的表单数据，后续页面同样流式解析。
+        启用解析进程池时改为整页下载后交给子进程解析。
+        """
+        if parse_pool_enabled():
+            yield from self._iter_courses_in_pool()
+            return
+
+        page_index = 1
+        target, count = yield from self._stream_page(chunk_size)
+        if not target.found_table:
+            log.error("获取第一页数据失败: 未找到ID为'dataList'的表格")
+            return
+        log.info(f"获取第{page_index}页数据成功，本页{count}条数据")
+
+        total_pages = target.total_pages
+        log.info(f"检测到总共{total_pages}页数据")
 
-        # 检查是否有错误
-        if isinstance(first_page_list, dict) and "error" in first_page_list:
-            log.error(f"获取第一页数据失败: {first_page_list['error']}")
-            return json.dumps(first_page_list, ensure_ascii=False, indent=4)
+        for page_index in range(2, total_pages + 1):
+            try:
+                page_target, count = yield from self._stream_page(
+                    chunk_size,
+                    data=self._build_page_body(page_index, target.form_data),
+                    headers=self._page_headers(),
+                )
+            except Exception as e:
+                log.error(f"获取第{page_index}页数据时发生异常: {str(e)}")
+                continue
+
+            if page_target.found_table:
+                log.info(f"获取第{page_index}页数据成功，本页{count}条数据")
+            else:
+                log.warning(f"获取第{page_index}页数据失败")
+
+    def _stream_page(self, chunk_size, **kwargs):
+        """
+        流式请求并解析一页评价列表，逐个产出 CourseRecord，结束时返回 (ListPageTarget, 行数)
+
+        流式请求在响应头阶段只能根据跳转判断会话是否失效，会话过期后服务器直接返回登录页（状态码200）时
+        要读完页面才能发现：此时没有产出任何行，重新登录后重新请求这一页
+        """
+        for attempt in range(2):
+            generation = getattr(self.session, "login_generation", None)
+            target = ListPageTarget()
+            start = time.perf_counter()
+            # 产出的记录交给调用方处理期间（如流水线队列已满）不算作请求耗时
+            suspended = 0.0
+            response = self.session.post(self.url, stream=True, **kwargs)
+            count = 0
+            try:
+                for course in iter_course_records(
+                    response.iter_content(chunk_size), response.encoding, target
+                ):
+                    count += 1
+                    yielded_at = time.perf_counter()
+                    yield course
+                    suspended += time.perf_counter() - yielded_at
+            finally:
+                response.close()
+            # 读完并解析整页的耗时，与非流式请求的接口耗时可比
+            latency.record_latency(
+                latency.endpoint_name(self.url), time.perf_counter() - start - suspended
+            )
 
-        all_data.extend(first_page_list)
-        log.info(f"获取第{page_index}页数据成功，本页{len(first_page_list)}条数据")
+            if target.found_table or attempt or not target.is_login_page:
+                break
+            log.warning("评价列表返回了登录页，会话已失效")
+            relogin = getattr(self.session, "relogin", None)
+            if relogin is None or not relogin(generation):
+                break
+            log.info("重新登录成功，重新获取该页评价列表")
+        return target, count
+
+    def _iter_courses_in_pool(self):
+        """整页下载，在解析进程中解析，子进程只返回精简的行元组"""
+        response = self.session.post(self.url)
+        rows, total_pages, form_data, found_table = run_parse(
+            parse_list_page, response.content, response.encoding
+        )
+        if not found_table:
+            log.error("获取第一页数据失败: 未找到ID为'dataList'的表格")
+            return
+        log.info(f"获取第1页数据成功，本页{len(rows)}条数据")
+        for row in rows:
+            yield CourseRecord(*row)
 
-        # 解析总页数
-        total_pages = self._extract_total_pages(response.text)
         log.info(f"检测到总共{total_pages}页数据")
+        for page_index in range(2, total_pages + 1):
+            try:
+                response = self.session.post(
+                    self.url,
+                    data=self._build_page_body(page_index, form_data),
+                    headers=self._page_headers(),
+                )
+                rows, _, _, found_table = run_parse(
+                    parse_list_page, response.content, response.encoding
+                )
+            except Exception as e:
+                log.error(f"获取第{page_index}页数据时发生异常: {str(e)}")
+                continue
+
+            if found_table:
+                log.info(f"获取第{page_index}页数据成功，本页{len(rows)}条数据")
+                for row in rows:
+                    yield CourseRecord(*row)
+            else:
+                log.warning(f"获取第{page_index}页数据失败")
+
+    def get_courses_parallel(self, workers=4):
+        """
+        整页获取评价列表，第一页拿到总页数后其余页面并发获取，按页码顺序返回 CourseRecord 列表
 
-        # 如果有多页，继续获取后续页面
+        用于提交完成后的一次性核对，不需要边下载边处理
+        """
+        response = self.session.post(self.url)
+        rows, total_pages, form_data, found_table = run_parse(
+            parse_list_page, response.content, response.encoding
+        )
+        if not found_table:
+            log.error("获取第一页数据失败: 未找到ID为'dataList'的表格")
+            return None
+
+        def fetch_page(page_index):
+            try:
+                response = self.session.post(
+                    self.url,
+                    data=self._build_page_body(page_index, form_data),
+                    headers=self._page_headers(),
+                )
+                page_rows, _, _, page_found = run_parse(
+                    parse_list_page, response.content, response.encoding
+                )
+            except Exception as e:
+                log.error(f"获取第{page_index}页数据时发生异常: {str(e)}")
+                return []
+            if not page_found:
+                log.warning(f"获取第{page_index}页数据失败")
+            return page_rows
+
+        pages = [rows]
         if total_pages > 1:
-            # 解析第一页的表单数据，用于后续POST请求
-            form_data = self._extract_form_data(response.text)
-
-            for page_index in range(2, total_pages + 1):
-                page_data = self._get_page_data(page_index, form_data)
-                if page_data:
-                    all_data.extend(page_data)
-                    log.info(
-                        f"获取第{page_index}页数据成功，本页{len(page_data)}条数据"
-                    )
-                else:
-                    log.warning(f"获取第{page_index}页数据失败")
+            with ThreadPoolExecutor(max_workers=min(workers, total_pages - 1)) as executor:
+                pages.extend(executor.map(fetch_page, range(2, total_pages + 1)))
+        return [CourseRecord(*row) for page_rows in pages for row in page_rows]
 
-        log.info(f"获取评价列表成功，总共{len(all_data)}条数据")
-        return json.dumps(all_data, indent=4, ensure_ascii=False)
+    def get_xspj_list(self):
+        """获取所有页面的评价列表数据，返回以表头为键的JSON字符串"""
+        return json.dumps(
+            [course.to_dict() for course in self.get_courses()],
+            indent=4,
+            ensure_ascii=False,
+        )
 
     def _extract_total_pages(self, html_content):
         """从HTML中提取总页数"""
@@ -76,7 +255,7 @@ class XspjList(LoginManager):
             match = re.search(pattern, html_content)
             if match:
                 total_pages = int(match.group(1))
-                log.debug(f"从页面解析到总页数: {total_pages}")
+                log.debug("从页面解析到总页数: %d", total_pages)
                 return total_pages
 
         # 如果找不到分页信息，检查是否有"下一页"按钮来判断是否有多页
@@ -129,11 +308,11 @@ class XspjList(LoginManager):
                         if first_option and hasattr(first_option, "get"):
                             form_data[name] = first_option.get("value", "")  # type: ignore
 
-        log.debug(f"提取到的表单数据: {form_data}")
+        log.debug("提取到的表单数据: %s", form_data)
         return form_data
 
-    def _get_page_data(self, page_index, base_form_data):
-        """获取指定页的数据"""
+    def _build_page_body(self, page_index, base_form_data):
+        """构造翻页POST请求体"""
         # 复制基础表单数据
         form_data = base_form_data.copy()
         form_data["pageIndex"] = str(page_index)
@@ -147,35 +326,222 @@ class XspjList(LoginManager):
             else:
                 post_data.append(f"{key}={value}")
 
-        post_data_string = "&".join(post_data)
+        return "&".join(post_data)
 
-        try:
-            headers = {
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Referer": self.url,
-                "Origin": "http://zhjw.qfnu.edu.cn",
-            }
+    def _page_headers(self):
+        return {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Referer": self.url,
+            "Origin": "http://zhjw.qfnu.edu.cn",
+        }
+
+def build_field_map(headers):
+    """
+    根据表头构建 单元格下标 -> CourseRecord 字段 的映射，每个表格只需构建一次
+
+    返回: [(下标, 字段名), ...]，不认识的表头不在其中（由 ListPageTarget 放入 CourseRecord.extra）
+    """
+    return [
+        (i, HEADER_FIELDS[header])
+        for i, header in enumerate(headers)
+        if header in HEADER_FIELDS
+    ]
 
-            response = self.session.post(
-                self.url, data=post_data_string, headers=headers
-            )
 
-            page_data_json = extract_table_to_json(response.text)
-            if isinstance(page_data_json, str):
-                page_data = json.loads(page_data_json)
+class ListPageTarget:
+    """
+    lxml 解析器的 target 回调：不构建DOM，边解析边把 dataList 表格的行转换为 CourseRecord
+
+    同时收集翻页需要的总页数和表单数据（与 _extract_total_pages / _extract_form_data 一致）
+    """
+
+    TOTAL_PAGES_PATTERNS = [
+        re.compile(r"共(\d+)页"),
+        re.compile(r"第\s*\d+\s*/\s*(\d+)\s*页"),
+        re.compile(r"页次：\d+/(\d+)"),
+    ]
+
+    def __init__(self):
+        self.found_table = False
+        self.form_data = {}
+        self._records = []
+        self._texts = []  # 表格外的文本，用于查找总页数
+        self._table_depth = 0  # dataList 表格的嵌套深度，0 表示不在表格内
+        self._headers = []
+        self._field_map = None
+        self._extra_map = None
+        self._cells = None  # 当前行的单元格
+        self._cell = None  # 当前单元格: {"texts": [...], "link": {...} | None}
+        self._link = None  # 当前链接: {"texts": [...], "href": ...}
+        self._select = None  # 当前 select: [name, 已选值, 第一个值]
+        self._first_row = True
+
+    def start(self, tag, attrib):
+        if tag == "input":
+            self._add_input(attrib.get("name"), attrib.get("value", ""))
+        elif tag == "select":
+            self._select = [attrib.get("name"), None, None]
+        elif tag == "option" and self._select is not None:
+            value = attrib.get("value", "")
+            if self._select[2] is None:
+                self._select[2] = value
+            if "selected" in attrib and self._select[1] is None:
+                self._select[1] = value
+
+        if tag == "table":
+            if self._table_depth:
+                self._table_depth += 1
+            elif attrib.get("id") == "dataList" and not self.found_table:
+                self.found_table = True
+                self._table_depth = 1
+            return
+        if not self._table_depth:
+            return
+
+        # 单元格里嵌套的表格只算作该单元格的内容，其中的行和单元格不处理
+        if tag == "tr" and self._table_depth == 1:
+            self._cells = []
+        elif tag == "th" and self._table_depth == 1:
+            self._cell = {"texts": [], "link": None}
+        elif tag == "td" and self._table_depth == 1 and self._cells is not None:
+            self._cell = {"texts": [], "link": None}
+        elif tag == "a" and self._cell is not None and self._cell["link"] is None:
+            self._link = {"texts": [], "href": attrib.get("href")}
+
+    def end(self, tag):
+        if tag == "select" and self._select is not None:
+            name, selected, first = self._select
+            if name and (selected is not None or first is not None):
+                self.form_data[name] = selected if selected is not None else first
+            self._select = None
+
+        if not self._table_depth:
+            return
+        if tag == "table":
+            self._table_depth -= 1
+        elif tag == "a" and self._link is not None:
+            self._cell["link"] = self._link
+            self._link = None
+        elif self._table_depth > 1:
+            return
+        elif tag == "th" and self._cell is not None:
+            self._headers.append("".join(self._cell["texts"]))
+            self._cell = None
+        elif tag == "td" and self._cell is not None:
+            self._cells.append(self._cell)
+            self._cell = None
+        elif tag == "tr" and self._cells is not None:
+            # 第一个 tr 是表头行，跳过
+            if self._first_row:
+                self._first_row = False
+            else:
+                self._records.append(self._build_record(self._cells))
+            self._cells = None
+
+    def data(self, data):
+        if self._cell is not None:
+            text = data.strip()
+            if text:
+                self._cell["texts"].append(text)
+                if self._link is not None:
+                    self._link["texts"].append(text)
+        elif not self._table_depth:
+            self._texts.append(data)
+
+    def close(self):
+        return None
+
+    def _add_input(self, name, value):
+        # 处理多个同名字段的情况（如多个pj01id）
+        if not name:
+            return
+        if name in self.form_data:
+            if not isinstance(self.form_data[name], list):
+                self.form_data[name] = [self.form_data[name]]
+            self.form_data[name].append(value)
+        else:
+            self.form_data[name] = value
+
+    def _build_record(self, cells):
+        if self._field_map is None:
+            self._field_map = build_field_map(self._headers)
+            self._extra_map = [
+                (i, header)
+                for i, header in enumerate(self._headers)
+                if header not in HEADER_FIELDS
+            ]
+        record = CourseRecord()
+        for i, field_name in self._field_map:
+            if i >= len(cells):
+                continue
+            cell = cells[i]
+            if field_name == "href":
+                link = cell["link"]
+                if link:
+                    record.action = "".join(link["texts"])
+                    record.href = link["href"]
             else:
-                page_data = page_data_json
+                setattr(record, field_name, "".join(cell["texts"]))
+        if self._extra_map:
+            record.extra = {
+                header: "".join(cells[i]["texts"])
+                for i, header in self._extra_map
+                if i < len(cells)
+            }
+        return record
+
+    def drain(self):
+        """取出目前为止已经解析完成的行"""
+        records, self._records = self._records, []
+        return records
+
+    @property
+    def is_login_page(self):
+        """页面是登录页（会话已失效）：有验证码输入框或"用户登录"字样"""
+        return "RANDOMCODE" in self.form_data or "用户登录" in "".join(self._texts)
+
+    @property
+    def total_pages(self):
+        text = "".join(self._texts)
+        for pattern in self.TOTAL_PAGES_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                return int(match.group(1))
+        return 1
 
-            # 检查是否有错误
-            if isinstance(page_data, dict) and "error" in page_data:
-                log.error(f"获取第{page_index}页数据失败: {page_data['error']}")
-                return None
 
-            return page_data
+def iter_course_records(chunks, encoding=None, target=None):
+    """
+    增量解析评价列表页面，每收到一块数据就产出其中已经完整的课程行
 
-        except Exception as e:
-            log.error(f"获取第{page_index}页数据时发生异常: {str(e)}")
-            return None
+    参数:
+        chunks: 页面内容的字节块迭代器（如 response.iter_content()）
+        encoding: 页面编码，默认 utf-8
+        target: ListPageTarget，解析结束后可从中读取总页数和表单数据
+    返回: CourseRecord 生成器
+    """
+    if target is None:
+        target = ListPageTarget()
+    parser = etree.HTMLParser(target=target, encoding=encoding or "utf-8")
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from target.drain()
+    parser.close()
+    yield from target.drain()
+
+
+def parse_list_page(content, encoding=None):
+    """
+    解析一整页评价列表，供解析进程池调用（参数和返回值都可以 pickle）
+
+    参数:
+        content: 页面的原始字节
+        encoding: 页面编码，默认 utf-8
+    返回: (行元组列表, 总页数, 翻页表单数据, 是否找到表格)，行元组可用 CourseRecord(*row) 还原
+    """
+    target = ListPageTarget()
+    rows = [astuple(record) for record in iter_course_records([content], encoding, target)]
+    return rows, target.total_pages, target.form_data, target.found_table
 
 
 def extract_table_to_json(html_content):
@@ -236,7 +602,7 @@ def extract_table_to_json(html_content):
 
     # 将数据列表转换为格式化的JSON字符串
     # ensure_ascii=False 确保中文字符能正确显示
-    log.debug(f"提取表格信息成功，返回结果: {all_rows_data}")
+    log.debug("提取表格信息成功，返回结果: %s", all_rows_data)
     log.info("提取表格信息成功")
     return json.dumps(all_rows_data, indent=4, ensure_ascii=False)
 
@@ -252,7 +618,7 @@ if __name__ == "__main__":
     xspj_path = xspj_find.get_xspj_path()
     # 获取评价列表
     xspj_list = XspjList(xspj_path)
-    xspj_list_json = json.loads(xspj_list.get_xspj_list())
+    courses = xspj_list.get_courses()
     log.info(
-        f"获取评价列表成功，共有{len(xspj_list_json)}条数据，任课老师有：{[item['授课教师'] for item in xspj_list_json]}"
+        f"获取评价列表成功，共有{len(courses)}条数据，任课老师有：{[course.teacher for course in courses]}"
     )
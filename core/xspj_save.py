@@ -1,13 +1,155 @@
 # core/xspj_save.py
 # 保存打分结果
 from core.login import LoginManager
+from utils.rate_limiter import get_limiter, submit_with_limiter
+from utils.response_parser import SaveOutcome, SaveResult
 from bs4 import BeautifulSoup
+from collections import Counter
+import html
 import re
 
 
+def parse_evaluation_form(html_content: str):
+    """
+    从评教详情页的HTML中解析表单结构（固定参数、指标顺序及各指标的等级选项）。
+
+    Args:
+        html_content (str): 评教详情页面的完整HTML文本。
+
+    Returns:
+        dict: 表单结构，形如
+            {
+                "static_params": {name: value, ...},
+                "indicator_order": [pj06xh, ...],
+                "indicators": {pj06xh: {等级: {"id": ..., "score": ...}}},
+            }
+            如果解析失败，则返回一个包含错误信息的字典。
+    """
+    try:
+        soup = BeautifulSoup(html_content, "html.parser")
+
+        # 1. 提取固定的表单参数
+        form = soup.find("form", {"id": "Form1"})
+        if not form:
+            return {"error": "未在HTML中找到ID为 'Form1' 的表单。"}
+
+        static_params = {}
+        # 提取所有隐藏input的值
+        for input_tag in form.find_all("input", {"type": "hidden"}):  # type: ignore
+            name = input_tag.get("name")  # type: ignore
+            value = input_tag.get("value", "")  # type: ignore
+            if name and name != "pj06xh":  # pj06xh是动态指标，单独处理
+                static_params[name] = value
+
+        # 2. 提取所有动态评教指标及其选项
+        evaluation_data = {}
+        indicator_order = []  # 保持页面上的指标顺序
+
+        # 查找所有包含评价指标的表格行 (tr)
+        indicator_rows = form.select('tr:has(input[name="pj06xh"])')  # type: ignore
+
+        for row in indicator_rows:
+            # 获取指标序号
+            indicator_input = row.find("input", {"name": "pj06xh"})
+            if not indicator_input:
+                continue
+
+            indicator_id = indicator_input["value"]  # type: ignore
+            indicator_order.append(indicator_id)
+            evaluation_data[indicator_id] = {}
+
+            # 找到包含所有radio按钮的单元格(td)
+            options_cell = row.find("td", {"name": "zbtd"})
+            if not options_cell:
+                continue
+
+            # 提取每个等级（优、良、中...）的ID和分数
+            for radio in options_cell.find_all("input", {"type": "radio"}):  # type: ignore
+                option_id = radio["value"]  # type: ignore
+                # 等级文本和分数在radio按钮后面的文本节点和隐藏input中
+                option_text_node = radio.next_sibling  # type: ignore
+                score_input = radio.find_next_sibling("input", {"type": "hidden"})  # type: ignore
+
+                if option_text_node and score_input:
+                    # 从" 优(10)"中提取"优"
+                    grade_match = re.search(r"(\w+)\(", option_text_node.strip())  # type: ignore
+                    if grade_match:
+                        grade = grade_match.group(1).strip()
+                        score = score_input["value"]  # type: ignore
+                        evaluation_data[indicator_id][grade] = {
+                            "id": option_id,
+                            "score": score,
+                        }
+
+        if not evaluation_data or not indicator_order:
+            return {"error": "未能从HTML中解析出评教指标。"}
+
+        return {
+            "static_params": static_params,
+            "indicator_order": indicator_order,
+            "indicators": evaluation_data,
+        }
+
+    except Exception as e:
+        return {"error": f"处理HTML时发生未知错误: {e}"}
+
+
+def parse_form_page(content: bytes, encoding: str | None = None):
+    """
+    从打分页面的原始响应字节解析表单结构，供解析进程池调用（参数和返回值都可以 pickle）。
+
+    Args:
+        content (bytes): 响应体。
+        encoding (str | None): 页面编码，默认 utf-8。
+
+    Returns:
+        dict: 同 parse_evaluation_form。
+    """
+    return parse_evaluation_form(content.decode(encoding or "utf-8", errors="replace"))
+
+
+_FORM_PATTERN = re.compile(r"<form\b[^>]*\bid=[\"']?Form1\b.*?</form>", re.S | re.I)
+_INPUT_PATTERN = re.compile(r"<input\b([^>]*)>([^<]*)", re.I)
+_ATTR_PATTERN = re.compile(r"([\w-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>/]+))")
+
+
+def _scan_form_inputs(html_content: str):
+    """
+    不经过 BeautifulSoup，直接用正则扫描 Form1 中的 input 标签，供校验请求体时作为独立的期望值。
+
+    Returns:
+        tuple | None: (隐藏参数 {name: value}（不含 pj06xh）, pj06xh 列表,
+            单选项 {name: {value: 等级}})；找不到表单时返回 None。
+    """
+    form = _FORM_PATTERN.search(html_content)
+    if not form:
+        return None
+
+    hidden, indicator_order, radios = {}, [], {}
+    for attr_text, text_after in _INPUT_PATTERN.findall(form.group(0)):
+        attrs = {
+            key.lower(): html.unescape(double or single or bare)
+            for key, double, single, bare in _ATTR_PATTERN.findall(attr_text)
+        }
+        name, value = attrs.get("name"), attrs.get("value", "")
+        if not name:
+            continue
+        input_type = attrs.get("type", "").lower()
+        if input_type == "hidden":
+            if name == "pj06xh":
+                indicator_order.append(value)
+            else:
+                hidden[name] = value
+        elif input_type == "radio":
+            # 等级写在单选框后面的文本里，如 " 优(10)"
+            grade = re.search(r"(\w+)\(", text_after)
+            radios.setdefault(name, {})[value] = grade.group(1) if grade else text_after.strip()
+    return hidden, indicator_order, radios
+
+
 class XspjSave(LoginManager):
-    def __init__(self, xspj_path: str):
-        super().__init__()
+    def __init__(self, xspj_path: str, **kwargs):
+        super().__init__(**kwargs)
         self.url = f"http://zhjw.qfnu.edu.cn{xspj_path}"
         self.save_do_url = f"http://zhjw.qfnu.edu.cn/jsxsd/xspj/xspj_save.do"
 
@@ -49,23 +191,31 @@ class XspjSave(LoginManager):
             },
         }
 
+    def get_xspj_save_response(self):
+        """获取打分页面的原始响应，由调用方决定在哪里解析"""
+        return self.session.get(self.url)
+
     def get_xspj_save_html(self):
-        response = self.session.get(self.url)
+        response = self.get_xspj_save_response()
         return response.text
 
-    def extract_evaluation_payload(
-        self, html_content: str, scenario: str = "scenario_98"
-    ):
+    def parse_evaluation_form(self, html_content: str):
         """
-        从评教详情页的HTML中解析数据，并根据指定的打分策略生成请求体。
+        从评教详情页的HTML中解析表单结构，见模块函数 parse_evaluation_form。
+        """
+        return parse_evaluation_form(html_content)
+
+    def build_payload(self, form_schema: dict, scenario: str = "scenario_98"):
+        """
+        根据解析好的表单结构和指定的打分策略生成请求体。
 
         Args:
-            html_content (str): 评教详情页面的完整HTML文本。
+            form_schema (dict): parse_evaluation_form 的返回值。
             scenario (str): 打分策略，可选值: "scenario_98", "scenario_89"
 
         Returns:
             dict[str, str]: POST请求的数据字典。
-                如果解析失败，则返回一个包含错误信息的字典。
+                如果生成失败，则返回一个包含错误信息的字典。
         """
         # 验证传入的scenario参数
         if scenario not in self.scoring_strategies:
@@ -73,106 +223,139 @@ class XspjSave(LoginManager):
                 "error": f"无效的打分策略: {scenario}。可用策略: {list(self.scoring_strategies.keys())}"
             }
 
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
-
-            # 1. 提取固定的表单参数
-            form = soup.find("form", {"id": "Form1"})
-            if not form:
-                return {"error": "未在HTML中找到ID为 'Form1' 的表单。"}
-
-            static_params = {}
-            # 提取所有隐藏input的值
-            for input_tag in form.find_all("input", {"type": "hidden"}):  # type: ignore
-                name = input_tag.get("name")  # type: ignore
-                value = input_tag.get("value", "")  # type: ignore
-                if name and name != "pj06xh":  # pj06xh是动态指标，单独处理
-                    static_params[name] = value
-
-            # 2. 提取所有动态评教指标及其选项
-            evaluation_data = {}
-            indicator_order = []  # 保持页面上的指标顺序
-
-            # 查找所有包含评价指标的表格行 (tr)
-            indicator_rows = form.select('tr:has(input[name="pj06xh"])')  # type: ignore
-
-            for row in indicator_rows:
-                # 获取指标序号
-                indicator_input = row.find("input", {"name": "pj06xh"})
-                if not indicator_input:
-                    continue
-
-                indicator_id = indicator_input["value"]  # type: ignore
-                indicator_order.append(indicator_id)
-                evaluation_data[indicator_id] = {}
-
-                # 找到包含所有radio按钮的单元格(td)
-                options_cell = row.find("td", {"name": "zbtd"})
-                if not options_cell:
-                    continue
-
-                # 提取每个等级（优、良、中...）的ID和分数
-                for radio in options_cell.find_all("input", {"type": "radio"}):  # type: ignore
-                    option_id = radio["value"]  # type: ignore
-                    # 等级文本和分数在radio按钮后面的文本节点和隐藏input中
-                    option_text_node = radio.next_sibling  # type: ignore
-                    score_input = radio.find_next_sibling("input", {"type": "hidden"})  # type: ignore
-
-                    if option_text_node and score_input:
-                        # 从" 优(10)"中提取"优"
-                        grade_match = re.search(r"(\w+)\(", option_text_node.strip())  # type: ignore
-                        if grade_match:
-                            grade = grade_match.group(1).strip()
-                            score = score_input["value"]  # type: ignore
-                            evaluation_data[indicator_id][grade] = {
-                                "id": option_id,
-                                "score": score,
-                            }
-
-            if not evaluation_data or not indicator_order:
-                return {"error": "未能从HTML中解析出评教指标。"}
-
-            # 3. 根据选定的策略生成请求体
-            selected_strategy = self.scoring_strategies[scenario]
-            grades = selected_strategy["grades"]
-
-            # 验证打分列表长度
-            if len(grades) != len(indicator_order):
+        if "error" in form_schema:
+            return {"error": form_schema["error"]}
+
+        indicator_order = form_schema["indicator_order"]
+        evaluation_data = form_schema["indicators"]
+
+        # 根据选定的策略生成请求体
+        selected_strategy = self.scoring_strategies[scenario]
+        grades = selected_strategy["grades"]
+
+        # 验证打分列表长度
+        if len(grades) != len(indicator_order):
+            return {
+                "error": f"打分策略 '{scenario}' 的等级列表长度 ({len(grades)}) 与页面指标数量 ({len(indicator_order)}) 不匹配。"
+            }
+
+        payload = form_schema["static_params"].copy()
+        payload["issubmit"] = "1"  # 0是保存，1是提交
+
+        for i, indicator_id in enumerate(indicator_order):
+            selected_grade = grades[i]
+            indicator_info = evaluation_data[indicator_id]
+
+            if selected_grade not in indicator_info:
                 return {
-                    "error": f"打分策略 '{scenario}' 的等级列表长度 ({len(grades)}) 与页面指标数量 ({len(indicator_order)}) 不匹配。"
+                    "error": f"指标 {indicator_id} 没有名为 '{selected_grade}' 的等级。可用等级: {list(indicator_info.keys())}"
                 }
 
-            payload = static_params.copy()
-            payload["issubmit"] = "1"  # 0是保存，1是提交
+            # a. 添加所选等级的ID
+            payload[f"pj0601id_{indicator_id}"] = indicator_info[selected_grade]["id"]
+
+            # b. 添加该指标下所有等级的分数ID（无论是否选中）
+            for grade, values in indicator_info.items():
+                score_key = f"pj0601fz_{indicator_id}_{values['id']}"
+                payload[score_key] = values["score"]
+
+        # c. 最后，将所有pj06xh指标序号添加进去
+        # 对于重名键 "pj06xh"，我们需要特殊处理
+        # 将指标序号列表作为一个字符串数组传递
+        payload["pj06xh"] = list(indicator_order)
+
+        return payload
 
-            for i, indicator_id in enumerate(indicator_order):
-                selected_grade = grades[i]
-                indicator_info = evaluation_data[indicator_id]
+    def extract_evaluation_payload(
+        self, html_content: str, scenario: str = "scenario_98"
+    ):
+        """
+        从评教详情页的HTML中解析数据，并根据指定的打分策略生成请求体。
+
+        Args:
+            html_content (str): 评教详情页面的完整HTML文本。
+            scenario (str): 打分策略，可选值: "scenario_98", "scenario_89"
 
-                if selected_grade not in indicator_info:
-                    return {
-                        "error": f"指标 {indicator_id} 没有名为 '{selected_grade}' 的等级。可用等级: {list(indicator_info.keys())}"
-                    }
+        Returns:
+            dict[str, str]: POST请求的数据字典。
+                如果解析失败，则返回一个包含错误信息的字典。
+        """
+        # 验证传入的scenario参数
+        if scenario not in self.scoring_strategies:
+            return {
+                "error": f"无效的打分策略: {scenario}。可用策略: {list(self.scoring_strategies.keys())}"
+            }
 
-                # a. 添加所选等级的ID
-                payload[f"pj0601id_{indicator_id}"] = indicator_info[selected_grade][
-                    "id"
-                ]
+        form_schema = self.parse_evaluation_form(html_content)
+        return self.build_payload(form_schema, scenario)
 
-                # b. 添加该指标下所有等级的分数ID（无论是否选中）
-                for grade, values in indicator_info.items():
-                    score_key = f"pj0601fz_{indicator_id}_{values['id']}"
-                    payload[score_key] = values["score"]
+    def validate_payload(self, payload: dict, html_content: str, scenario: str):
+        """
+        按原始页面和打分策略校验请求体，不发送任何请求。
 
-            # c. 最后，将所有pj06xh指标序号添加进去
-            # 对于重名键 "pj06xh"，我们需要特殊处理
-            # 将指标序号列表作为一个字符串数组传递
-            payload["pj06xh"] = indicator_order
+        期望值不经过 parse_evaluation_form，而是用正则直接扫描页面中的 input 标签得到，
+        等级则按所选策略的等级列表逐项核对，因此表单解析或请求体生成出错时都能发现。
 
-            return payload
+        Args:
+            payload (dict): build_payload 生成的请求体。
+            html_content (str): 打分页面的完整HTML文本。
+            scenario (str): 生成请求体时使用的打分策略。
 
-        except Exception as e:
-            return {"error": f"处理HTML时发生未知错误: {e}"}
+        Returns:
+            list[str]: 不一致项的描述列表，为空表示校验通过。
+        """
+        if "error" in payload:
+            return [f"请求体生成失败: {payload['error']}"]
+
+        form = _scan_form_inputs(html_content)
+        if form is None:
+            return ["页面中没有找到ID为 'Form1' 的表单"]
+        hidden, indicator_order, radios = form
+        mismatches = []
+
+        # 1. 页面上的隐藏参数（包括各等级的分数字段）必须原样带上，issubmit 由脚本改为提交
+        for name, value in hidden.items():
+            if name == "issubmit":
+                if payload.get(name) not in ("0", "1"):
+                    mismatches.append(f"issubmit 取值异常: {payload.get(name)}")
+            elif payload.get(name) != value:
+                mismatches.append(f"隐藏参数 {name} 缺失或与页面不一致")
+
+        # 2. 指标序号的数量和顺序与页面一致，且每个指标都有一组单选项
+        if list(payload.get("pj06xh") or []) != indicator_order:
+            mismatches.append(
+                f"pj06xh 与页面不一致: 页面 {len(indicator_order)} 个指标，"
+                f"请求体 {len(payload.get('pj06xh') or [])} 个"
+            )
+        if len(radios) != len(indicator_order):
+            mismatches.append(
+                f"页面有 {len(indicator_order)} 个指标序号，但有 {len(radios)} 组等级单选项"
+            )
+
+        # 3. 每组单选项选中的值必须是页面上的选项，选中的等级与策略逐项一致
+        expected_grades = self.scoring_strategies[scenario]["grades"]
+        selected_grades = []
+        for name, options in radios.items():
+            value = payload.get(name)
+            if value not in options:
+                mismatches.append(f"{name} 选中的值 {value} 不是页面上的选项")
+                selected_grades.append(None)
+                continue
+            selected_grades.append(options[value])
+        for i, (selected, expected) in enumerate(zip(selected_grades, expected_grades)):
+            if selected is not None and selected != expected:
+                mismatches.append(f"第 {i + 1} 个指标选中 {selected}，策略要求 {expected}")
+        if None not in selected_grades and Counter(selected_grades) != Counter(expected_grades):
+            mismatches.append(
+                f"各等级数量 {dict(Counter(selected_grades))} 与策略 {dict(Counter(expected_grades))} 不一致"
+            )
+
+        # 4. 不应出现页面之外的字段
+        for key in payload:
+            if key not in hidden and key not in radios and key not in ("issubmit", "pj06xh"):
+                mismatches.append(f"请求体包含页面中不存在的字段: {key}")
+
+        return mismatches
 
     def save_do(self, payload: dict):
         """
@@ -182,17 +365,20 @@ class XspjSave(LoginManager):
             payload (dict): 包含评教数据的字典
 
         Returns:
-            str: 服务器响应文本
+            SaveResult: 解析后的保存结果
         """
-        response = self.session.post(self.save_do_url, data=payload)
-        return response.text
+        limiter = get_limiter("xspj_save.do", self.user_account)
+        return submit_with_limiter(
+            limiter,
+            lambda: self.session.post(self.save_do_url, data=payload, timeout=10),
+        )
 
     def clear_restrictions_with_89(self):
         """
         先用89分策略打分来清除系统限制
 
         Returns:
-            str: 服务器响应文本
+            SaveResult: 解析后的保存结果
         """
         try:
             # 获取评教页面HTML
@@ -202,14 +388,15 @@ class XspjSave(LoginManager):
             payload = self.extract_evaluation_payload(html_content, "scenario_clear")
 
             if "error" in payload:
-                return f"清除限制失败: {payload['error']}"
+                return SaveResult(
+                    SaveOutcome.VALIDATION_ERROR, f"清除限制失败: {payload['error']}"
+                )
 
             # 先提交（issubmit=1）而不是保存
             payload["issubmit"] = "1"
 
             # 发送请求
-            response = self.save_do(payload)
-            return response
+            return self.save_do(payload)
 
         except Exception as e:
-            return f"清除限制时发生异常: {e}"
+            return SaveResult(SaveOutcome.SERVER_ERROR, f"清除限制时发生异常: {e}")
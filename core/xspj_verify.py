@@ -0,0 +1,117 @@
+# core/xspj_verify.py
+# 提交完成后的核对：重新获取一次评价列表，逐门比对是否已提交以及总评分是否与所选策略一致
+from dataclasses import dataclass
+from core.xspj_list import XspjList, course_key
+from utils.logger import log
+
+# 列表中的总评分保留两位小数，允许的误差
+SCORE_TOLERANCE = 0.05
+
+
+@dataclass
+class VerifyMismatch:
+    """核对不一致的课程"""
+
+    index: int
+    course: object
+    reason: str
+    expected: float | None = None
+    actual: str | None = None
+
+
+def expected_total(form_schema, grades):
+    """
+    按打分页面的各等级分数和策略的等级列表计算应得总分
+
+    返回: 总分，表单结构或等级不匹配时返回 None
+    """
+    if not form_schema or "error" in form_schema:
+        return None
+    if len(grades) != len(form_schema["indicator_order"]):
+        return None
+    total = 0.0
+    for grade, indicator_id in zip(grades, form_schema["indicator_order"]):
+        option = form_schema["indicators"][indicator_id].get(grade)
+        if option is None:
+            return None
+        try:
+            total += float(option["score"])
+        except (TypeError, ValueError):
+            return None
+    return round(total, 2)
+
+
+def diff_courses(tasks, refreshed):
+    """
+    比对流水线中的课程和重新获取的列表
+
+    参数:
+        tasks: CourseTask 列表
+        refreshed: 重新获取的 CourseRecord 列表
+    返回: VerifyMismatch 列表
+    """
+    by_key = {course_key(course): course for course in refreshed}
+    # 提交后操作列的链接可能变化，按课程编号和教师兜底匹配
+    by_teacher = {(course.course_id, course.teacher): course for course in refreshed}
+    mismatches = []
+    for task in tasks:
+        course = by_key.get(course_key(task.course)) or by_teacher.get(
+            (task.course.course_id, task.course.teacher)
+        )
+        if course is None:
+            mismatches.append(VerifyMismatch(task.index, task.course, "列表中未找到该课程"))
+            continue
+        if (course.submitted or "").strip() != "是":
+            mismatches.append(
+                VerifyMismatch(task.index, course, "未提交", actual=course.submitted)
+            )
+            continue
+        if task.skipped or task.xspj_save is None or task.scenario is None:
+            # 此前已完成的课程没有获取打分页面，只核对提交状态
+            continue
+
+        grades = task.xspj_save.scoring_strategies[task.scenario]["grades"]
+        expected = expected_total(task.form_schema, grades)
+        if expected is None:
+            continue
+        try:
+            actual = float(course.total_score)
+        except (TypeError, ValueError):
+            mismatches.append(
+                VerifyMismatch(
+                    task.index, course, "总评分为空", expected, course.total_score
+                )
+            )
+            continue
+        if abs(actual - expected) > SCORE_TOLERANCE:
+            mismatches.append(
+                VerifyMismatch(
+                    task.index, course, "总评分不一致", expected, course.total_score
+                )
+            )
+    return mismatches
+
+
+class XspjVerify(XspjList):
+    """重新获取评价列表并核对提交结果"""
+
+    def verify(self, tasks, workers=4):
+        """
+        参数:
+            tasks: CourseTask 列表
+            workers: 并发获取列表页面的线程数
+        返回: VerifyMismatch 列表，列表获取失败时返回 None
+        """
+        refreshed = self.get_courses_parallel(workers)
+        if refreshed is None:
+            log.warning("核对失败: 无法重新获取评价列表")
+            return None
+        mismatches = diff_courses(tasks, refreshed)
+        if mismatches:
+            for mismatch in mismatches:
+                log.warning(
+                    f"核对不一致，序号:{mismatch.index+1:2d}，课程:{mismatch.course.name}，老师:{mismatch.course.teacher}，原因:{mismatch.reason}，期望:{mismatch.expected}，实际:{mismatch.actual}"
+                )
+        else:
+            log.info(f"核对完成: {len(tasks)} 门课程的提交状态和总评分均与预期一致")
+        return mismatches
@@ -0,0 +1,196 @@
+# daemon.py
+# 常驻模式：进程内保持各账号已登录的会话池、OCR模型和解析进程池，通过本地HTTP接口接收评教任务
+#
+# 启动:  python daemon.py --port 9899
+# 提交:  curl -X POST http://127.0.0.1:9899/jobs -d '{"account": "...", "password": "...", "plan": {"high_score": [1, 3]}}'
+# 查询:  curl http://127.0.0.1:9899/jobs/<id>
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core.job_runner import run_job
+from core.login import load_captcha_solver
+from core.session_pool import SessionPool
+from utils.logger import event_context, log
+from utils.parse_pool import init_parse_pool
+
+
+class JobManager:
+    """
+    保存任务状态，任务执行时从会话池借出已登录的会话
+
+    同一账号的任务串行执行（共用限流器，且40%限制按账号计算），不同账号的任务并发执行
+    已结束的任务保留 finished_ttl 秒供查询，最多保留 max_finished 个，超出后先移除最早结束的
+    """
+
+    def __init__(
+        self, pool, max_jobs=4, workers=8, finished_ttl=3600, max_finished=1000
+    ):
+        self.pool = pool
+        self.workers = workers
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        self.jobs = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs)
+        self._lock = threading.Lock()
+        self._account_locks = {}
+
+    def submit(self, account, password, plan):
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "account": account,
+            "plan": plan,
+            "status": "queued",
+            "submitted_at": time.time(),
+        }
+        with self._lock:
+            self._evict_finished()
+            self.jobs[job_id] = job
+            account_lock = self._account_locks.setdefault(account, threading.Lock())
+        self._executor.submit(self._run, job, password, account_lock)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict_finished()
+            return self.jobs.get(job_id)
+
+    def _evict_finished(self):
+        """移除过期和超出数量的已结束任务（调用方持有 self._lock）"""
+        now = time.time()
+        finished = sorted(
+            (job for job in self.jobs.values() if "finished_at" in job),
+            key=lambda job: job["finished_at"],
+        )
+        excess = len(finished) - self.max_finished
+        for i, job in enumerate(finished):
+            if i < excess or now - job["finished_at"] > self.finished_ttl:
+                del self.jobs[job["id"]]
+
+    def _run(self, job, password, account_lock):
+        with account_lock, event_context(account=job["account"], job=job["id"]):
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            try:
+                manager = self.pool.checkout(job["account"], password)
+                if manager is None:
+                    job["result"] = {"ok": False, "error": "登录失败"}
+                else:
+                    try:
+                        job["result"] = run_job(
+                            job["plan"], login_manager=manager, workers=self.workers
+                        )
+                    finally:
+                        self.pool.checkin(manager)
+                job["status"] = "done"
+            except Exception as e:
+                log.error(f"任务 {job['id']} 执行异常: {e}")
+                job["status"] = "failed"
+                job["error"] = str(e)
+            job["finished_at"] = time.time()
+
+    def status(self):
+        return {
+            "sessions": self.pool.status(),
+            "jobs": {
+                state: sum(job["status"] == state for job in list(self.jobs.values()))
+                for state in ("queued", "running", "done", "failed")
+            },
+        }
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    manager = None
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            self._send_json(400, {"error": "Invalid JSON"})
+            return
+        if not data.get("account") or not data.get("password"):
+            self._send_json(400, {"error": "account and password are required"})
+            return
+        job = self.manager.submit(data["account"], data["password"], data.get("plan") or {})
+        self._send_json(202, {"id": job["id"], "status": job["status"]})
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, {"status": "ok", **self.manager.status()})
+        elif path.startswith("/jobs/"):
+            job = self.manager.get(path[len("/jobs/") :])
+            if job is None:
+                self._send_json(404, {"error": "Job not found"})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def log_message(self, format, *args):
+        log.debug("daemon: " + format, *args)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="自动评教常驻服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9899)
+    parser.add_argument("--max-jobs", type=int, default=4, help="同时执行的任务数")
+    parser.add_argument("--workers", type=int, default=8, help="每个任务的写阶段线程数")
+    parser.add_argument(
+        "--parse-workers", type=int, default=None, help="HTML解析进程数，0 表示不启用"
+    )
+    parser.add_argument("--pool-size", type=int, default=1, help="每个账号保持的已登录会话数")
+    parser.add_argument(
+        "--heartbeat", type=int, default=300, help="空闲会话的保活检查间隔（秒）"
+    )
+    parser.add_argument(
+        "--job-ttl", type=int, default=3600, help="已结束任务的结果保留秒数"
+    )
+    parser.add_argument(
+        "--accounts",
+        help="启动时预先登录的账号文件，每行 学号,密码",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    init_parse_pool(args.parse_workers)
+    pool = SessionPool(
+        size=args.pool_size,
+        heartbeat_interval=args.heartbeat,
+        captcha_solver=load_captcha_solver(),
+    ).start()
+    if args.accounts:
+        # 提前登录，任务到达时不再等待验证码
+        with open(args.accounts, encoding="utf-8") as f:
+            for line in f:
+                if line.strip() and "," in line:
+                    account, password = line.strip().split(",", 1)
+                    pool.register(account.strip(), password.strip())
+    JobRequestHandler.manager = JobManager(
+        pool, max_jobs=args.max_jobs, workers=args.workers, finished_ttl=args.job_ttl
+    )
+    server = ThreadingHTTPServer((args.host, args.port), JobRequestHandler)
+    log.info(f"常驻服务已启动 http://{args.host}:{args.port} (POST /jobs, GET /jobs/<id>)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("常驻服务已停止")
@@ -1,11 +1,23 @@
 from core.login import LoginManager
 from core.xspj_find import XspjFind
 from core.xspj_list import XspjList
-from core.xspj_save import XspjSave
 from core.toSavepj03wjpj import ToSavepj03wjpj
-from utils.logger import log
-import json
-import re
+from core.dry_run import run_dry_run
+from core.pipeline import EvaluationPipeline
+from utils.latency import format_summary, snapshot_all
+from utils.parse_pool import init_parse_pool, shutdown_parse_pool
+from utils.profiler import enable_profiling, finish_profiling, profile_stage, profiled
+from utils.logger import (
+    enable_event_log,
+    log,
+    prompt,
+    set_event_context,
+    stage_event,
+    write_run_report,
+)
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import threading
 import time
 import math
 import subprocess
@@ -28,13 +40,192 @@ def print_welcome_info():
     log.info("\n\n")
 
 
+def choose_high_score_courses(courses):
+    """
+    流水线写阶段之前的交互闸门：展示课程列表，让用户选择使用高分策略的课程并确认
+
+    返回: 使用高分策略的课程下标列表，取消执行时返回 None
+    """
+    # 限制条件: 评价分数大于等于90, 比例不高于全部评价课程的百分之40
+    # 允许大于等于90的个数（向上取整）
+    max_90_count = math.ceil(len(courses) * 0.4)
+
+    log.info("\n" + "=" * 80)
+    log.info("课程评教列表")
+    log.info("=" * 80)
+    log.info(f"总课程数: {len(courses)}")
+    log.info(f"允许评价分数≥90的课程数量: {max_90_count} (40%限制)")
+    log.info("-" * 80)
+
+    # 为每个课程-老师组合分配序号并显示
+    for i, course in enumerate(courses, 1):
+        log.info(f"{i:2d}. 课程: {course.name:<20} 老师: {course.teacher}")
+
+    log.info("=" * 80)
+    log.info(f"请选择 {max_90_count} 个课程使用高分策略(98分)")
+    log.info("输入序号，用空格分隔 (例如: 1 3 5 7)")
+    log.info("留空则随机选择前几个课程使用高分策略")
+
+    # 获取用户输入
+    user_input = prompt("请输入选择的序号: ").strip()
+
+    # 处理用户选择
+    high_score_indices = []
+    if user_input:
+        try:
+            # 解析用户输入的序号
+            selected_numbers = [int(x) for x in user_input.split()]
+            # 验证序号有效性
+            for num in selected_numbers:
+                if 1 <= num <= len(courses):
+                    high_score_indices.append(num - 1)  # 转换为0基索引
+                else:
+                    log.warning(f"序号 {num} 超出范围，已忽略")
+
+            # 检查选择数量是否超限
+            if len(high_score_indices) > max_90_count:
+                log.warning(
+                    f"选择数量 ({len(high_score_indices)}) 超过限制 ({max_90_count})，只取前 {max_90_count} 个"
+                )
+                high_score_indices = high_score_indices[:max_90_count]
+            elif len(high_score_indices) < max_90_count:
+                log.info(
+                    f"选择数量 ({len(high_score_indices)}) 少于允许数量 ({max_90_count})"
+                )
+                # 询问是否要自动补充
+                auto_fill = prompt("是否自动补充剩余名额? (y/n): ").strip().lower()
+                if auto_fill == "y":
+                    # 从未选择的课程中补充
+                    remaining_indices = [
+                        i
+                        for i in range(len(courses))
+                        if i not in high_score_indices
+                    ]
+                    need_count = max_90_count - len(high_score_indices)
+                    high_score_indices.extend(remaining_indices[:need_count])
+                    log.info(f"已自动补充 {need_count} 个课程使用高分策略")
+
+        except ValueError:
+            log.error("输入格式错误，将使用默认策略（前几个课程使用高分）")
+            high_score_indices = list(range(max_90_count))
+    else:
+        # 用户未输入，默认选择前几个
+        high_score_indices = list(range(max_90_count))
+        log.info(f"未输入选择，默认对前 {max_90_count} 个课程使用高分策略")
+
+    log.info("\n" + "-" * 80)
+    log.info("最终策略分配:")
+    log.info("高分策略(98分):")
+    for idx in high_score_indices:
+        course = courses[idx]
+        log.info(f"  {idx+1:2d}. {course.name} - {course.teacher}")
+
+    log.info("标准策略(89分):")
+    for i, course in enumerate(courses):
+        if i not in high_score_indices:
+            log.info(f"  {i+1:2d}. {course.name} - {course.teacher}")
+    log.info("-" * 80)
+
+    # 确认执行
+    confirm = prompt("\n确认执行评教? (y/n): ").strip().lower()
+    if confirm != "y":
+        log.info("已取消执行")
+        return None
+
+    return high_score_indices
+
+
+def make_batch_gate(batch, lock, show_batch):
+    """多个批次共用交互提示，同一时间只进行一个批次的选择"""
+
+    def gate(courses):
+        with lock:
+            if show_batch:
+                log.info("\n" + "#" * 80)
+                log.info(f"评价批次: {batch.label}")
+            return choose_high_score_courses(courses)
+
+    return gate
+
+
+def submit_wjpj(batch, hidden_params):
+    """提交单个批次最下面的文字评价（默认是A）"""
+    if not hidden_params:
+        log.warning(
+            f"[{batch.label}] 无法获取隐藏参数，最下面的文字评价无法提交，将跳过，请手动提交"
+        )
+        return None
+
+    log.info(f"[{batch.label}] 开始提交文字评价")
+    result = ToSavepj03wjpj(hidden_params).save_do()
+    if result.ok:
+        log.info(f"[{batch.label}] 文字评价提交成功，返回结果:{result.message}")
+    else:
+        log.error(
+            f"[{batch.label}] 文字评价提交失败({result.outcome.value})，返回结果:{result.message}"
+        )
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="曲阜师范大学自动评教脚本")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="试运行：只获取列表和打分页面并校验请求体，不提交任何评价",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="并发线程数上限，写请求的实际并发由自适应限流器控制 (默认: 8)",
+    )
+    parser.add_argument(
+        "--events",
+        action="store_true",
+        help="记录结构化JSON事件日志，并在结束时输出运行报告 (也可设置 LOG_EVENTS=1)",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=None,
+        help="HTML解析进程数，多账号并发时绕开GIL，0 表示在线程中解析 (默认读取 PARSE_WORKERS，未设置为 0)",
+    )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="提交完成后不重新获取列表核对提交状态和总评分",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="按阶段剖析性能，输出 cProfile 统计、内存分配和折叠调用栈到 profiles/ 目录",
+    )
+    parser.add_argument(
+        "--no-progress",
+        action="store_true",
+        help="提交期间不在终端刷新进度行",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    # 运行报告的汇总信息，随流程逐步补充
+    run_summary = {}
     try:
+        args = parse_args()
+        if args.events:
+            enable_event_log()
+        run_summary["dry_run"] = args.dry_run
+        if args.profile:
+            enable_profiling()
+        if init_parse_pool(args.parse_workers):
+            log.info("已启用多进程HTML解析")
         print_welcome_info()
 
         pjcode = "曲奇教务666"
 
-        user_input = input(
+        user_input = prompt(
             "请关注微信公众号【曲奇教务】，发送“一键评教”获取验证码后输入继续\n"
         )
 
@@ -44,197 +235,133 @@ if __name__ == "__main__":
 
         # 初始登录
         login_manager = LoginManager()
-        if not login_manager.simulate_login():
+        set_event_context(account=login_manager.user_account)
+        with stage_event("login") as event, profile_stage("login"):
+            logged_in = login_manager.simulate_login()
+            event["outcome"] = "success" if logged_in else "failure"
+        if not logged_in:
             log.error("程序启动失败，无法完成初始登录。")
             exit(0)
 
-        # 获取评价批次ID
+        # 获取所有开放中的评价批次（理论课、实验课、体育课等）
         xspj_find = XspjFind()
-        xspj_path = xspj_find.get_xspj_path()
-        if xspj_path:
-            hidden_params = xspj_find.get_hidden_params(xspj_path)
-        else:
+        with stage_event("find") as event, profile_stage("find"):
+            batches = xspj_find.get_xspj_batches()
+            event["batches"] = len(batches)
+        if not batches:
             log.error("无法获取评价路径，无法继续获取隐藏参数")
             exit(0)
+        run_summary["batches"] = len(batches)
+        for batch in batches:
+            log.info(f"评价批次: {batch.label}")
 
-        input("按回车开始提交文字评价...")
-        if hidden_params:
-            log.info("开始提交文字评价")
-            time.sleep(1)
-            # 先填最下面的文字评价，默认是A
-            toSavepj03wjpj = ToSavepj03wjpj(hidden_params)
-            toSavepj03wjpj_response = toSavepj03wjpj.save_do()
-            # 提取alert内的内容
-            alert_content = re.search(r"alert\('(.*)'\)", toSavepj03wjpj_response)
-            if alert_content:
-                toSavepj03wjpj_response = alert_content.group(1)
-            else:
-                toSavepj03wjpj_response = "未找到alert内容"
-            if "保存成功" in toSavepj03wjpj_response:
-                log.info(f"文字评价提交成功，返回结果:{toSavepj03wjpj_response}")
-            else:
-                log.error(f"文字评价提交失败，返回结果:{toSavepj03wjpj_response}")
-            log.info("文字评价提交完成")
-        else:
-            log.warning(
-                "无法获取隐藏参数，最下面的文字评价无法提交，将跳过，请手动提交"
+        # 各批次的隐藏参数并发获取
+        with stage_event("hidden_params") as event, ThreadPoolExecutor(
+            max_workers=len(batches)
+        ) as executor:
+            hidden_params_list = list(
+                executor.map(
+                    profiled(
+                        "hidden_params",
+                        lambda batch: xspj_find.get_hidden_params(batch.path),
+                    ),
+                    batches,
+                )
             )
+            event["outcome"] = "success" if all(hidden_params_list) else "failure"
 
-        input("按回车开始获取评价列表...")
-        # 获取评价列表
-        xspj_list = XspjList(xspj_path)
-        xspj_list_json = json.loads(xspj_list.get_xspj_list())
-        log.info(f"共有{len(xspj_list_json)}条数据")
-
-        # 限制条件: 评价分数大于等于90, 比例不高于全部评价课程的百分之40
-        # 允许大于等于90的个数（向上取整）
-        max_90_count = math.ceil(len(xspj_list_json) * 0.4)
-
-        log.info("\n" + "=" * 80)
-        log.info("课程评教列表")
-        log.info("=" * 80)
-        log.info(f"总课程数: {len(xspj_list_json)}")
-        log.info(f"允许评价分数≥90的课程数量: {max_90_count} (40%限制)")
-        log.info("-" * 80)
-
-        # 为每个课程-老师组合分配序号并显示
-        for i, item in enumerate(xspj_list_json, 1):
-            log.info(f"{i:2d}. 课程: {item['课程名称']:<20} 老师: {item['授课教师']}")
-
-        log.info("=" * 80)
-        log.info(f"请选择 {max_90_count} 个课程使用高分策略(98分)")
-        log.info("输入序号，用空格分隔 (例如: 1 3 5 7)")
-        log.info("留空则随机选择前几个课程使用高分策略")
-
-        # 获取用户输入
-        user_input = input("请输入选择的序号: ").strip()
-
-        # 处理用户选择
-        high_score_indices = []
-        if user_input:
-            try:
-                # 解析用户输入的序号
-                selected_numbers = [int(x) for x in user_input.split()]
-                # 验证序号有效性
-                for num in selected_numbers:
-                    if 1 <= num <= len(xspj_list_json):
-                        high_score_indices.append(num - 1)  # 转换为0基索引
-                    else:
-                        log.warning(f"序号 {num} 超出范围，已忽略")
-
-                # 检查选择数量是否超限
-                if len(high_score_indices) > max_90_count:
-                    log.warning(
-                        f"选择数量 ({len(high_score_indices)}) 超过限制 ({max_90_count})，只取前 {max_90_count} 个"
-                    )
-                    high_score_indices = high_score_indices[:max_90_count]
-                elif len(high_score_indices) < max_90_count:
-                    log.info(
-                        f"选择数量 ({len(high_score_indices)}) 少于允许数量 ({max_90_count})"
-                    )
-                    # 询问是否要自动补充
-                    auto_fill = input("是否自动补充剩余名额? (y/n): ").strip().lower()
-                    if auto_fill == "y":
-                        # 从未选择的课程中补充
-                        remaining_indices = [
-                            i
-                            for i in range(len(xspj_list_json))
-                            if i not in high_score_indices
-                        ]
-                        need_count = max_90_count - len(high_score_indices)
-                        high_score_indices.extend(remaining_indices[:need_count])
-                        log.info(f"已自动补充 {need_count} 个课程使用高分策略")
-
-            except ValueError:
-                log.error("输入格式错误，将使用默认策略（前几个课程使用高分）")
-                high_score_indices = list(range(max_90_count))
-        else:
-            # 用户未输入，默认选择前几个
-            high_score_indices = list(range(max_90_count))
-            log.info(f"未输入选择，默认对前 {max_90_count} 个课程使用高分策略")
-
-        log.info("\n" + "-" * 80)
-        log.info("最终策略分配:")
-        log.info("高分策略(98分):")
-        for idx in high_score_indices:
-            item = xspj_list_json[idx]
-            log.info(f"  {idx+1:2d}. {item['课程名称']} - {item['授课教师']}")
-
-        log.info("标准策略(89分):")
-        for i, item in enumerate(xspj_list_json):
-            if i not in high_score_indices:
-                log.info(f"  {i+1:2d}. {item['课程名称']} - {item['授课教师']}")
-        log.info("-" * 80)
-
-        # 确认执行
-        confirm = input("\n确认执行评教? (y/n): ").strip().lower()
-        if confirm != "y":
-            log.info("已取消执行")
-            exit(0)
-
-        # 开始执行评教
-        log.info("\n开始执行自动评教...")
-
-        # 首先对所有课程进行89分预打分以清除限制
-        log.info("步骤1: 先用89分策略清除系统限制...")
-        for i, item in enumerate(xspj_list_json):
-            xspj_save = XspjSave(item["操作"]["href"])
-            clear_response = xspj_save.clear_restrictions_with_89()
+        if args.dry_run:
+            log.info("试运行模式: 不会提交文字评价和打分结果")
+            passed = True
+            run_summary["courses"] = 0
+            for batch, hidden_params in zip(batches, hidden_params_list):
+                log.info(f"试运行评价批次: {batch.label}")
+                if not hidden_params:
+                    log.warning("无法获取隐藏参数，正式运行时文字评价将无法提交")
 
-            # 提取alert内的内容
-            alert_content = re.search(r"alert\('(.*)'\)", clear_response)
-            if alert_content:
-                clear_response_text = alert_content.group(1)
-            else:
-                clear_response_text = "未找到alert内容"
-
-            if "保存成功" in clear_response_text:
+                start = time.perf_counter()
+                with stage_event("list") as event, profile_stage("list"):
+                    courses = XspjList(batch.path).get_courses()
+                    event["courses"] = len(courses)
                 log.info(
-                    f"清除限制成功，序号:{i+1:2d}，课程:{item['课程名称']}，老师:{item['授课教师']}"
+                    f"获取评价列表耗时 {time.perf_counter() - start:.2f}s，共有{len(courses)}条数据"
                 )
+                run_summary["courses"] += len(courses)
+
+                # 试运行不做交互选择，按默认策略对前几个课程使用高分
+                max_90_count = math.ceil(len(courses) * 0.4)
+                with stage_event("dry_run") as event:
+                    batch_passed = run_dry_run(
+                        courses, list(range(max_90_count)), max_workers=args.workers
+                    )
+                    event["outcome"] = "success" if batch_passed else "mismatch"
+                passed = passed and batch_passed
+            run_summary["dry_run_passed"] = passed
+            if passed:
+                log.info("试运行完成: 所有请求体均通过校验")
             else:
-                log.warning(
-                    f"清除限制可能失败，序号:{i+1:2d}，课程:{item['课程名称']}，老师:{item['授课教师']}，返回:{clear_response_text}"
-                )
+                log.error("试运行完成: 存在校验不通过的请求体，请查看上方报告")
+            exit(0)
 
-        log.info("步骤1完成: 所有课程已用89分策略预打分")
-        log.info("\n步骤2: 开始按照选定策略重新打分...")
+        # 列表翻页、打分页面获取与提交在流水线中重叠进行，选择策略后才开始提交；
+        # 读阶段现在就启动，在下面的交互提示和文字评价提交期间后台预取。
+        # 多个批次的选择依次进行，前一个批次确认后即开始提交，同时进行下一个批次的选择
+        gate_lock = threading.Lock()
+        pipelines = [
+            EvaluationPipeline(
+                batch.path,
+                gate=make_batch_gate(batch, gate_lock, len(batches) > 1),
+                write_workers=args.workers,
+                # 多个批次同时提交时，进度行会和其他批次的选择提示混在一起
+                show_progress=not args.no_progress and len(batches) == 1,
+                verify=not args.no_verify,
+            )
+            for batch in batches
+        ]
+        for pipeline in pipelines:
+            pipeline.start()
 
-        for i, item in enumerate(xspj_list_json):
-            # 根据是否在高分列表中选择策略
-            if i in high_score_indices:
-                selected_scenario = "scenario_98"
-                strategy_desc = "高分策略(98分)"
-            else:
-                selected_scenario = "scenario_89"
-                strategy_desc = "标准策略(89分)"
-
-            # 保存打分结果
-            xspj_save = XspjSave(item["操作"]["href"])
-            xspj_save_html = xspj_save.get_xspj_save_html()
-            # 传入选择的打分策略
-            xspj_save_payload = xspj_save.extract_evaluation_payload(
-                xspj_save_html, selected_scenario
+        prompt("按回车开始提交文字评价...")
+        with stage_event("wjpj") as event, ThreadPoolExecutor(
+            max_workers=len(batches)
+        ) as executor:
+            wjpj_results = list(
+                executor.map(profiled("wjpj", submit_wjpj), batches, hidden_params_list)
             )
-            xspj_save_response = xspj_save.save_do(xspj_save_payload)
-            # 提取alert内的内容
-            alert_content = re.search(r"alert\('(.*)'\)", xspj_save_response)
-            if alert_content:
-                xspj_save_response = alert_content.group(1)
-            else:
-                xspj_save_response = "未找到alert内容"
-            if "保存成功" in xspj_save_response:
-                log.info(
-                    f"保存打分结果成功，序号:{i+1:2d}，课程:{item['课程名称']}，老师:{item['授课教师']}，策略:{strategy_desc}，返回结果:{xspj_save_response}"
-                )
-            else:
-                log.error(
-                    f"保存打分结果失败，序号:{i+1:2d}，课程:{item['课程名称']}，老师:{item['授课教师']}，策略:{strategy_desc}，返回结果:{xspj_save_response}"
-                )
+            event["outcome"] = (
+                "success" if all(r and r.ok for r in wjpj_results) else "failure"
+            )
+
+        with ThreadPoolExecutor(max_workers=len(pipelines)) as executor:
+            results = list(executor.map(lambda pipeline: pipeline.run(), pipelines))
+
+        finished = [result for result in results if not result.cancelled]
+        total_courses = sum(len(result.courses) for result in finished)
+        high_score_courses = sum(len(result.high_score_indices) for result in finished)
+        run_summary["courses"] = total_courses
+        if not finished:
+            exit(0)
 
-        log.info(f"\n评教完成！共处理 {len(xspj_list_json)} 门课程")
-        log.info(f"高分策略: {len(high_score_indices)} 门课程")
-        log.info(f"标准策略: {len(xspj_list_json) - len(high_score_indices)} 门课程")
+        log.info(f"\n评教完成！共处理 {len(finished)} 个批次，{total_courses} 门课程")
+        log.info(f"高分策略: {high_score_courses} 门课程")
+        log.info(f"标准策略: {total_courses - high_score_courses} 门课程")
+        run_summary["high_score_courses"] = high_score_courses
+        run_summary["clear_success"] = sum(
+            bool(r and r.ok) for result in finished for r in result.clear_results
+        )
+        run_summary["rescore_success"] = sum(
+            bool(r and r.ok) for result in finished for r in result.rescore_results
+        )
+        if not args.no_verify:
+            verified = [r for r in finished if r.verify_mismatches is not None]
+            mismatches = sum(len(r.verify_mismatches) for r in verified)
+            run_summary["verify_mismatches"] = mismatches
+            if len(verified) < len(finished):
+                log.warning("部分批次无法重新获取评价列表，未完成核对")
+            elif mismatches:
+                log.warning(f"核对后仍有 {mismatches} 门课程与预期不一致，请登录教务系统检查")
+            else:
+                log.info("核对通过: 所有课程的提交状态和总评分均与预期一致")
 
     except KeyboardInterrupt:
         log.info("用户主动退出程序 (Ctrl+C)")
@@ -242,3 +369,20 @@ if __name__ == "__main__":
         log.info("程序正常退出")
     except Exception as e:
         log.error(f"程序运行出现异常: {e}")
+    finally:
+        # 各接口耗时和本地解析耗时，用于判断瓶颈在服务器还是本地
+        latency_lines = format_summary()
+        if latency_lines:
+            log.info("-" * 80)
+            log.info("接口耗时统计:")
+            for line in latency_lines:
+                log.info(f"  {line}")
+            run_summary["latency"] = snapshot_all()
+        profile_dir = finish_profiling()
+        if profile_dir:
+            log.info(f"性能剖析报告已写入: {profile_dir}")
+            run_summary["profile"] = profile_dir
+        report_path = write_run_report(**run_summary)
+        if report_path:
+            log.info(f"运行报告已写入: {report_path}")
+        shutdown_parse_pool()
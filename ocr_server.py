@@ -1,34 +1,130 @@
-import ddddocr
+import os
+import argparse
 from flask import Flask, request, jsonify
+from werkzeug.exceptions import HTTPException
+from utils.captcha_ocr import get_ocr_res as recognize, warm_up
 
 app = Flask(__name__)
-# 初始化OCR，禁用广告输出
-ocr = ddddocr.DdddOcr(show_ad=False)
+# 限制请求体大小，验证码图片只有几KB（OCR_MAX_CONTENT_LENGTH，单位字节，默认1MB）
+# .env 中留空时使用默认值
+app.config["MAX_CONTENT_LENGTH"] = int(
+    os.getenv("OCR_MAX_CONTENT_LENGTH", "").strip() or 1024 * 1024
+)
+
+# 可直接作为原始请求体上传的图片类型
+RAW_BODY_MIMETYPES = ("application/octet-stream",)
+
+
+def _read_image():
+    """
+    读取上传的图片，支持两种方式:
+    1. multipart/form-data 的 file 字段
+    2. 请求体直接是图片（Content-Type 为 image/* 或 application/octet-stream），省去multipart编码
+    返回: (图片字节, 错误信息)
+    """
+    if request.mimetype.startswith("image/") or request.mimetype in RAW_BODY_MIMETYPES:
+        image_bytes = request.get_data(cache=False)
+        if not image_bytes:
+            return None, "Empty body"
+        return image_bytes, None
+
+    if "file" not in request.files:
+        return None, "No file part"
+
+    file = request.files["file"]
+    if file.filename == "":
+        return None, "No selected file"
+
+    # 读取图片内容
+    return file.read(), None
 
 
 @app.route("/ocr", methods=["POST"])
 def get_ocr_res():
     try:
-        if "file" not in request.files:
-            return jsonify({"error": "No file part"}), 400
+        image_bytes, error = _read_image()
+        if error:
+            return jsonify({"error": error}), 400
 
-        file = request.files["file"]
-        if file.filename == "":
-            return jsonify({"error": "No selected file"}), 400
-
-        # 读取图片内容
-        image_bytes = file.read()
-
-        # 识别
-        res = ocr.classification(image_bytes)
+        # 预处理后识别，重复的验证码直接命中缓存
+        res = recognize(image_bytes)
         return jsonify({"result": str(res)})
 
+    except HTTPException:
+        # 请求体超限等由对应的错误处理函数返回
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": "Request body too large"}), 413
+
+
+def run_gunicorn(host, port, workers, threads, keepalive):
+    """用 gunicorn 多进程运行（Linux / macOS）"""
+    from gunicorn.app.base import BaseApplication
+
+    class OcrApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("keepalive", keepalive)
+            # master 进程不加载模型，每个worker在fork之后各自加载并预热
+            self.cfg.set("post_worker_init", lambda worker: warm_up())
+
+        def load(self):
+            return app
+
+    OcrApplication().run()
+
+
+def run_waitress(host, port, threads):
+    """用 waitress 多线程运行（Windows 下没有 gunicorn；waitress 的长连接没有单独的保持时间设置）"""
+    from waitress import serve
+
+    warm_up()
+    serve(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        max_request_body_size=app.config["MAX_CONTENT_LENGTH"],
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="验证码识别 OCR 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9898)
+    parser.add_argument(
+        "--server",
+        choices=["auto", "gunicorn", "waitress", "dev"],
+        default="auto",
+        help="auto: Windows 用 waitress，其他系统用 gunicorn；dev: Flask 自带的开发服务器",
+    )
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn 进程数")
+    parser.add_argument("--threads", type=int, default=4, help="每个进程的线程数")
+    parser.add_argument("--keepalive", type=int, default=30, help="长连接保持秒数（仅 gunicorn）")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    print("启动 OCR 服务 (Flask)...")
-    print("请确保已安装依赖: pip install ddddocr flask")
-    # 监听本地 9898 端口
-    app.run(host="127.0.0.1", port=9898)
+    args = parse_args()
+    server = args.server
+    if server == "auto":
+        server = "waitress" if os.name == "nt" else "gunicorn"
+
+    print(f"启动 OCR 服务 ({server}) http://{args.host}:{args.port}/ocr ...")
+    print('请确保已安装依赖: pip install ".[ocr-server]"（ddddocr、flask，以及 gunicorn 或 Windows 下的 waitress）')
+    if server == "gunicorn":
+        run_gunicorn(args.host, args.port, args.workers, args.threads, args.keepalive)
+    elif server == "waitress":
+        run_waitress(args.host, args.port, args.threads)
+    else:
+        warm_up()
+        # 监听本地 9898 端口
+        app.run(host=args.host, port=args.port)
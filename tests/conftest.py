@@ -0,0 +1,11 @@
+# tests/conftest.py
+# 单元测试的公共设施：把项目根目录加入导入路径
+#
+# 用法（在项目根目录执行，需要 pip install pytest）:
+#   python -m pytest tests
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
@@ -0,0 +1,109 @@
+# tests/test_job_queue.py
+# SQLite 任务队列的多进程领取、租约过期重新投递，以及租约被接管后 worker 停止执行
+import multiprocessing
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+from utils.job_queue import SqliteJobQueue, open_queue
+
+
+def drain_queue(path, worker_id):
+    """子进程中运行的 worker：领取任务直到队列为空，每个任务写一个完成标记"""
+    job_queue = SqliteJobQueue(path)
+    while True:
+        job = job_queue.lease(worker_id, lease_seconds=60)
+        if job is None:
+            return
+        job_queue.mark_course_done(job.account, f"course-{job.id}")
+        job_queue.complete(job, worker_id, {"ok": True, "worker": worker_id})
+
+
+def test_workers_in_separate_processes_take_each_job_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    job_queue = SqliteJobQueue(path)
+    accounts = [f"2020{i:04d}" for i in range(40)]
+    for account in accounts:
+        job_queue.enqueue(account, {"password": "x"})
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=drain_queue, args=(path, f"worker-{n}")) for n in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+    assert job_queue.stats() == {"done": len(accounts)}
+    results = job_queue.results()
+    # 没有任务被领取两次
+    assert all(item["attempts"] == 1 for item in results)
+    for item in results:
+        assert job_queue.completed_courses(item["account"]) == {f"course-{item['id']}"}
+
+
+def test_expired_lease_is_redelivered_and_old_owner_is_rejected(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = SqliteJobQueue(path), SqliteJobQueue(path)
+    first.enqueue("20200001", {"password": "x"})
+
+    job = first.lease("a", lease_seconds=0.2)
+    assert second.lease("b") is None
+    time.sleep(0.3)
+    taken = second.lease("b")
+    assert taken.id == job.id and taken.attempts == 2
+
+    assert not first.renew(job, "a")
+    assert not first.complete(job, "a", {"ok": True})
+    assert second.complete(taken, "b", {"ok": True})
+    assert first.stats() == {"done": 1}
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    job_queue = SqliteJobQueue(str(tmp_path / "jobs.db"), max_attempts=2)
+    job_queue.enqueue("20200001", {"password": "x"})
+    for _ in range(2):
+        assert job_queue.lease("a", lease_seconds=0) is not None
+        time.sleep(0.01)
+    assert job_queue.lease("a") is None
+    assert job_queue.stats() == {"failed": 1}
+
+
+def test_process_job_stops_when_lease_is_taken_over(tmp_path, monkeypatch):
+    import batch_runner
+
+    path = str(tmp_path / "jobs.db")
+    job_queue = SqliteJobQueue(path)
+    job_queue.enqueue("20200001", {"password": "x", "plan": {}})
+    job = job_queue.lease("a", lease_seconds=0.3)
+    seen = {}
+
+    def fake_run_job(plan, stop=None, **kwargs):
+        # 模拟租约过期后被另一个 worker 接管
+        with sqlite3.connect(path) as conn:
+            conn.execute("UPDATE jobs SET lease_owner = 'b' WHERE id = ?", (job.id,))
+        seen["stopped"] = stop.wait(5)
+        return {"ok": True}
+
+    monkeypatch.setattr(batch_runner, "run_job", fake_run_job)
+    args = SimpleNamespace(lease=0.3, workers=1)
+    batch_runner.process_job(job_queue, job, "a", args, captcha_solver=None)
+
+    assert seen["stopped"]
+    # 结果没有被旧的 worker 写回，任务仍属于接管的 worker
+    assert job_queue.stats() == {"leased": 1}
+    assert job_queue.results()[0]["result"] is None
+
+
+def test_empty_queue_url_uses_default_file(tmp_path, monkeypatch):
+    """.env.example 中的 JOB_QUEUE_URL= 为空，不能变成每个连接私有的临时数据库"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("JOB_QUEUE_URL", "")
+    open_queue().enqueue("20200001", {"password": "x"})
+    assert SqliteJobQueue(str(tmp_path / "jobs.db")).stats() == {"queued": 1}
+
+    with pytest.raises(ValueError):
+        open_queue("sqlite:///")
@@ -1,13 +1,202 @@
 # utils/captcha_ocr.py
+import io
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 import ddddocr
+import onnxruntime
+from PIL import Image, ImageFilter
+from utils.logger import log
 
-ocr = ddddocr.DdddOcr(show_ad=False)
+# onnxruntime 会话参数，未设置时使用 onnxruntime 的默认值
+# OCR_INTRA_OP_THREADS: 单次推理内部的并行线程数，多个识别worker并发时建议设为 1
+# OCR_INTER_OP_THREADS: 算子之间的并行线程数
+# OCR_GRAPH_OPT_LEVEL: 图优化级别 disable / basic / extended / all
+# OCR_EXECUTION_MODE: sequential / parallel
+# OCR_SESSION_MODE: shared（所有线程共用一个会话）/ per_thread（每个线程一个会话）
+INTRA_OP_THREADS = int(os.getenv("OCR_INTRA_OP_THREADS", "").strip() or 0)
+INTER_OP_THREADS = int(os.getenv("OCR_INTER_OP_THREADS", "").strip() or 0)
+GRAPH_OPT_LEVEL = os.getenv("OCR_GRAPH_OPT_LEVEL", "all").strip().lower()
+EXECUTION_MODE = os.getenv("OCR_EXECUTION_MODE", "sequential").strip().lower()
+SESSION_MODE = os.getenv("OCR_SESSION_MODE", "shared").strip().lower()
+
+GRAPH_OPT_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+EXECUTION_MODES = {
+    "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def _session_options():
+    """根据环境变量构造 onnxruntime.SessionOptions"""
+    options = onnxruntime.SessionOptions()
+    if INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = INTRA_OP_THREADS
+    if INTER_OP_THREADS > 0:
+        options.inter_op_num_threads = INTER_OP_THREADS
+    options.graph_optimization_level = GRAPH_OPT_LEVELS.get(
+        GRAPH_OPT_LEVEL, onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    )
+    options.execution_mode = EXECUTION_MODES.get(
+        EXECUTION_MODE, onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    )
+    return options
+
+
+def create_ocr():
+    """
+    创建 DdddOcr 实例，并用调优后的 SessionOptions 重建其内部的 onnxruntime 会话
+
+    ddddocr 没有暴露会话参数，这里替换它的私有属性；版本不兼容时保留默认会话
+    """
+    instance = ddddocr.DdddOcr(show_ad=False)
+    graph_path = getattr(instance, "_DdddOcr__graph_path", None)
+    providers = getattr(instance, "_DdddOcr__providers", None)
+    if (
+        graph_path is None
+        or providers is None
+        or not hasattr(instance, "_DdddOcr__ort_session")
+    ):
+        log.warning("当前 ddddocr 版本不支持调整 onnxruntime 会话参数，使用默认设置")
+        return instance
+
+    instance._DdddOcr__ort_session = onnxruntime.InferenceSession(
+        graph_path, sess_options=_session_options(), providers=providers
+    )
+    return instance
+
+
+# 模型在第一次使用时才加载，不在导入时创建：
+# gunicorn 的 master 进程导入应用后 fork 出 worker，onnxruntime 的线程池不能安全地跨 fork 继承，
+# 每个 worker 进程要各自加载（见 ocr_server.py 的 post_worker_init）
+_shared_ocr = None
+_shared_ocr_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def get_ocr():
+    """按 OCR_SESSION_MODE 返回共享的实例或当前线程专属的实例，首次调用时加载模型"""
+    global _shared_ocr
+    if SESSION_MODE != "per_thread":
+        if _shared_ocr is None:
+            with _shared_ocr_lock:
+                if _shared_ocr is None:
+                    _shared_ocr = create_ocr()
+        return _shared_ocr
+    instance = getattr(_thread_local, "ocr", None)
+    if instance is None:
+        instance = _thread_local.ocr = create_ocr()
+        _warm_up_instance(instance)
+    return instance
+
+
+def _warm_up_instance(instance):
+    image = Image.new("L", (100, 40), 255)
+    instance.classification(image)
+
+
+def warm_up():
+    """
+    启动时加载模型并做一次推理预热，让模型的初始化和内存分配不落在第一次登录上
+    返回: 预热耗时（秒）
+    """
+    start = time.perf_counter()
+    _warm_up_instance(get_ocr())
+    elapsed = time.perf_counter() - start
+    log.info(
+        f"OCR预热完成，耗时 {elapsed*1000:.0f}ms "
+        f"(intra_op={INTRA_OP_THREADS or '默认'}, inter_op={INTER_OP_THREADS or '默认'}, "
+        f"graph_opt={GRAPH_OPT_LEVEL}, session={SESSION_MODE})"
+    )
+    return elapsed
+
+
+# 是否在识别前做灰度、降噪、二值化预处理（OCR_PREPROCESS=1 开启）
+# 默认关闭：预处理能否提高 ddddocr 的识别率以 benchmarks 中验证码基准的结果为准
+PREPROCESS = os.getenv("OCR_PREPROCESS", "").strip().lower() in ("1", "true", "yes")
+# 识别结果缓存的条数（OCR_CACHE_SIZE=0 关闭缓存，留空时为 1024）
+CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "").strip() or 1024)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _otsu_threshold(histogram):
+    """根据灰度直方图用大津法计算二值化阈值"""
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_background = 0
+    weight_background = 0
+    best_threshold, best_variance = 127, 0.0
+    for i, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += i * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = (
+            weight_background
+            * weight_foreground
+            * (mean_background - mean_foreground) ** 2
+        )
+        if variance > best_variance:
+            best_threshold, best_variance = i, variance
+    return best_threshold
+
+
+def preprocess_captcha(cap_pic_bytes):
+    """
+    验证码预处理: 灰度化 -> 中值滤波去除噪点 -> 大津法二值化
+
+    返回: 处理后的 PIL.Image（L模式，只有黑白两色）
+    """
+    image = Image.open(io.BytesIO(cap_pic_bytes)).convert("L")
+    image = image.filter(ImageFilter.MedianFilter(3))
+    threshold = _otsu_threshold(image.histogram())
+    return image.point(lambda p: 255 if p > threshold else 0)
+
+
+def clear_cache():
+    """清空识别结果缓存（基准测试多轮运行时使用）"""
+    with _cache_lock:
+        _cache.clear()
 
 
 def get_ocr_res(cap_pic_bytes):  # 识别验证码
-    res = ocr.classification(cap_pic_bytes)
+    """
+    识别验证码，相同图片（按SHA-1哈希）直接返回缓存的结果
+    """
+    key = hashlib.sha1(cap_pic_bytes).hexdigest()
+    if CACHE_SIZE > 0:
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+
+    image = preprocess_captcha(cap_pic_bytes) if PREPROCESS else cap_pic_bytes
+    res = get_ocr().classification(image)
+
+    if CACHE_SIZE > 0:
+        with _cache_lock:
+            _cache[key] = res
+            _cache.move_to_end(key)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
     return res
 
 
 if __name__ == "__main__":
-    get_ocr_res("123")
+    # 识别手动模式下保存的验证码图片
+    with open("captcha.jpg", "rb") as f:
+        print(get_ocr_res(f.read()))
@@ -0,0 +1,190 @@
+# utils/http_cassette.py
+# HTTP 录制与回放：录制模式把每个请求/响应保存到 cassette 目录，回放模式完全离线地按顺序返回
+#
+# 注意：录制时只对登录表单中的账号、密码、加密串、验证码字段以及 Cookie / Authorization 头脱敏，
+# URL 和响应体原样保存。响应体就是教务系统的页面，包含学生姓名、学号、课程和教师等个人信息，
+# 登录后的跳转地址也在其中。cassette 目录只用于本机调试，不要提交到仓库或发给他人。
+#
+# 通过环境变量启用:
+#   HTTP_CASSETTE_MODE=record  HTTP_CASSETTE_DIR=cassettes/run1  python main.py
+#   HTTP_CASSETTE_MODE=replay  HTTP_CASSETTE_DIR=cassettes/run1  python main.py
+import os
+import json
+import base64
+import hashlib
+import threading
+from urllib.parse import parse_qsl, urlencode
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+from utils.logger import log
+
+REDACTED = "REDACTED"
+# 需要脱敏的表单字段（账号、密码、加密串、验证码）
+SENSITIVE_FIELDS = {"userAccount", "userPassword", "encoded", "RANDOMCODE"}
+# 需要脱敏的请求头/响应头
+SENSITIVE_HEADERS = {"cookie", "set-cookie", "authorization"}
+
+
+def _redact_body(body):
+    """脱敏表单请求体，非表单内容原样返回（字符串）"""
+    if body is None:
+        return ""
+    if isinstance(body, bytes):
+        try:
+            body = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return "base64:" + base64.b64encode(body).decode()
+    fields = parse_qsl(body, keep_blank_values=True)
+    if not fields or not any(name in SENSITIVE_FIELDS for name, _ in fields):
+        return body
+    return urlencode(
+        [(name, REDACTED if name in SENSITIVE_FIELDS else value) for name, value in fields]
+    )
+
+
+def _redact_headers(headers):
+    return {
+        name: REDACTED if name.lower() in SENSITIVE_HEADERS else value
+        for name, value in headers.items()
+    }
+
+
+def request_key(method, url, body):
+    """请求的匹配键：方法 + URL + 脱敏后的请求体"""
+    raw = f"{method.upper()} {url}\n{_redact_body(body)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class RecordingAdapter(HTTPAdapter):
+    """正常发送请求，并把请求/响应写入 cassette 目录（只脱敏登录字段和 Cookie 等请求头，响应体原样保存）"""
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self._counts = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        key = request_key(request.method, request.url, request.body)
+        with self._lock:
+            index = self._counts.get(key, 0)
+            self._counts[key] = index + 1
+
+        entry = {
+            "request": {
+                "method": request.method,
+                "url": request.url,
+                "headers": _redact_headers(request.headers),
+                "body": _redact_body(request.body),
+            },
+            "response": {
+                "status_code": response.status_code,
+                "url": response.url,
+                "headers": _redact_headers(response.headers),
+                "encoding": response.encoding,
+                # 读取 content 会消费流式响应，这里重新包装成已读取的响应返回
+                "body": base64.b64encode(response.content).decode(),
+            },
+        }
+        path = os.path.join(self.directory, f"{key}_{index:03d}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    从 cassette 目录回放响应，不访问网络
+
+    同一个请求被录制了多次时按录制顺序依次返回，超出次数后重复最后一次
+    """
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self._entries = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                key = name.rsplit("_", 1)[0]
+                self._entries.setdefault(key, []).append(os.path.join(directory, name))
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        with self._lock:
+            paths = self._entries.get(key)
+            if not paths:
+                raise ConnectionError(
+                    f"回放模式下没有录制的响应: {request.method} {request.url}",
+                    request=request,
+                )
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            path = paths[min(index, len(paths) - 1)]
+
+        with open(path, encoding="utf-8") as f:
+            recorded = json.load(f)["response"]
+        return build_response(request, recorded)
+
+    def close(self):
+        pass
+
+
+def build_response(request, recorded):
+    """把录制的响应字典还原为 requests.Response"""
+    response = Response()
+    response.status_code = recorded["status_code"]
+    response.url = recorded["url"]
+    response.headers = CaseInsensitiveDict(recorded["headers"])
+    response.encoding = recorded["encoding"]
+    response._content = base64.b64decode(recorded["body"])
+    response._content_consumed = True
+    response.reason = ""
+    response.request = request
+    return response
+
+
+def iter_cassette(directory, path_contains=None):
+    """
+    遍历 cassette 中录制的请求/响应，供解析器基准测试和回归测试离线使用
+
+    参数: path_contains - 只返回 URL 中包含该字符串的记录，如 "xspj_list.do"
+    返回: 生成器，每项为 (请求字典, 响应文本)
+    """
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            entry = json.load(f)
+        if path_contains and path_contains not in entry["request"]["url"]:
+            continue
+        recorded = entry["response"]
+        body = base64.b64decode(recorded["body"])
+        yield entry["request"], body.decode(recorded["encoding"] or "utf-8", "replace")
+
+
+def install_cassette(session, mode, directory):
+    """为会话挂载录制或回放适配器"""
+    if mode == "record":
+        adapter = RecordingAdapter(directory)
+    elif mode == "replay":
+        adapter = ReplayAdapter(directory)
+    else:
+        raise ValueError(f"未知的 cassette 模式: {mode}")
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    log.info(f"HTTP {mode} 模式已启用，cassette 目录: {directory}")
+    if mode == "record":
+        log.warning(f"录制的响应包含姓名、课程等个人信息，请勿提交或分享 {directory}")
+
+
+def install_from_env(session):
+    """根据 HTTP_CASSETTE_MODE / HTTP_CASSETTE_DIR 环境变量挂载适配器"""
+    mode = os.getenv("HTTP_CASSETTE_MODE", "").strip().lower()
+    if mode:
+        install_cassette(session, mode, os.getenv("HTTP_CASSETTE_DIR", "cassettes"))
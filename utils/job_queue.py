@@ -0,0 +1,382 @@
+# utils/job_queue.py
+# 批量运行的任务队列：多个 worker 进程（可以在不同机器上）从同一个队列领取账号任务
+#
+# 语义:
+#   - 至少一次投递：worker 领取任务时获得一个租约，定期续约；worker 崩溃、租约过期后任务会重新投递
+#   - 课程完成标记：每门课程打分完成后记录标记，任务重新投递时跳过已完成的课程，重复执行不会重复提交
+#
+# 后端:
+#   sqlite:///jobs.db（默认，只能单机多进程使用：WAL 模式依赖共享内存，不支持网络文件系统）
+#   redis://host:6379/0（可选，需要 pip install redis，多台机器共用）
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class Job:
+    """领取到的任务"""
+
+    id: str
+    account: str
+    payload: dict
+    attempts: int
+
+
+class SqliteJobQueue:
+    """基于 SQLite 的任务队列，同一台机器上的多个进程通过文件锁互斥"""
+
+    def __init__(self, path="jobs.db", max_attempts=3):
+        # 空路径和 :memory: 是每个连接私有的临时数据库，其他进程和线程看不到入队的任务
+        if not path or path == ":memory:":
+            raise ValueError(f"SQLite 任务队列需要数据库文件路径: {path!r}")
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    account TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    result TEXT,
+                    updated_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, lease_expires);
+                CREATE TABLE IF NOT EXISTS course_done (
+                    account TEXT NOT NULL,
+                    course_key TEXT NOT NULL,
+                    done_at REAL,
+                    PRIMARY KEY (account, course_key)
+                );
+                """
+            )
+
+    def _connect(self):
+        # 每个线程一个连接（续约在单独的线程中进行）
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, account, payload):
+        """加入一个任务，返回任务ID"""
+        cursor = self._connect().execute(
+            "INSERT INTO jobs (account, payload, updated_at) VALUES (?, ?, ?)",
+            (account, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        return str(cursor.lastrowid)
+
+    def lease(self, worker_id, lease_seconds=600):
+        """领取一个排队中或租约已过期的任务，没有任务时返回 None"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                """
+                SELECT id, account, payload, attempts FROM jobs
+                WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY id LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job_id, account, payload, attempts = row
+            if attempts >= self.max_attempts:
+                # 多次租约过期（worker 反复崩溃），不再投递
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', result = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps({"error": "超过最大尝试次数"}), now, job_id),
+                )
+                conn.execute("COMMIT")
+                return self.lease(worker_id, lease_seconds)
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'leased', attempts = attempts + 1,
+                    lease_owner = ?, lease_expires = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (worker_id, now + lease_seconds, now, job_id),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return Job(str(job_id), account, json.loads(payload), attempts + 1)
+
+    def renew(self, job, worker_id, lease_seconds=600):
+        """续约，返回 False 表示租约已被其他 worker 接管"""
+        cursor = self._connect().execute(
+            """
+            UPDATE jobs SET lease_expires = ?, updated_at = ?
+            WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """,
+            (time.time() + lease_seconds, time.time(), job.id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job, worker_id, result):
+        """任务完成，返回 False 表示租约已失效（结果以接管的 worker 为准）"""
+        cursor = self._connect().execute(
+            """
+            UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, updated_at = ?
+            WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """,
+            (json.dumps(result, ensure_ascii=False), time.time(), job.id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job, worker_id, error, retry=True, result=None):
+        """任务失败；retry 为 True 且未超过尝试次数时重新排队，result 为本次的部分结果"""
+        status = "queued" if retry and job.attempts < self.max_attempts else "failed"
+        cursor = self._connect().execute(
+            """
+            UPDATE jobs SET status = ?, result = ?, lease_owner = NULL, updated_at = ?
+            WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """,
+            (
+                status,
+                json.dumps({**(result or {}), "error": error}, ensure_ascii=False),
+                time.time(),
+                job.id,
+                worker_id,
+            ),
+        )
+        return cursor.rowcount == 1
+
+    def mark_course_done(self, account, course_key):
+        self._connect().execute(
+            "INSERT OR IGNORE INTO course_done (account, course_key, done_at) VALUES (?, ?, ?)",
+            (account, course_key, time.time()),
+        )
+
+    def completed_courses(self, account):
+        rows = self._connect().execute(
+            "SELECT course_key FROM course_done WHERE account = ?", (account,)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def stats(self):
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ).fetchall()
+        return dict(rows)
+
+    def results(self):
+        rows = self._connect().execute(
+            "SELECT id, account, status, attempts, result FROM jobs ORDER BY id"
+        ).fetchall()
+        return [
+            {
+                "id": str(job_id),
+                "account": account,
+                "status": status,
+                "attempts": attempts,
+                "result": json.loads(result) if result else None,
+            }
+            for job_id, account, status, attempts, result in rows
+        ]
+
+
+# 领取：先把租约过期的任务放回队列，再弹出任务并登记租约，整个过程在一个脚本中原子执行，
+# worker 在弹出之后崩溃也不会丢失任务（任务要么还在队列中，要么已有租约、过期后会被放回）
+# KEYS: 队列, 租约; ARGV: 当前时间, 租约到期时间, worker, 最大尝试次数, 任务键前缀, 超过次数时的结果
+_LEASE_SCRIPT = """
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], 0, ARGV[1])) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('HSET', ARGV[5] .. id, 'status', 'queued', 'lease_owner', '')
+    redis.call('RPUSH', KEYS[1], id)
+end
+while true do
+    local id = redis.call('RPOP', KEYS[1])
+    if not id then
+        return false
+    end
+    local key = ARGV[5] .. id
+    local attempts = redis.call('HINCRBY', key, 'attempts', 1)
+    if attempts > tonumber(ARGV[4]) then
+        redis.call('HSET', key, 'status', 'failed', 'result', ARGV[6])
+    else
+        redis.call('HSET', key, 'status', 'leased', 'lease_owner', ARGV[3])
+        redis.call('ZADD', KEYS[2], ARGV[2], id)
+        return {id, redis.call('HGET', key, 'account'), redis.call('HGET', key, 'payload'), attempts}
+    end
+end
+"""
+
+# 续约：确认租约仍属于该 worker 后更新到期时间
+# KEYS: 任务, 租约; ARGV: 任务ID, worker, 租约到期时间
+_RENEW_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'leased'
+    or redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[2] then
+    return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+# 完成/失败：确认租约仍属于该 worker 后释放租约、写入状态和结果，需要重试时放回队列
+# KEYS: 任务, 租约, 队列; ARGV: 任务ID, worker, 新状态, 结果, 是否放回队列
+_FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'leased'
+    or redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[1], 'status', ARGV[3], 'result', ARGV[4], 'lease_owner', '')
+if ARGV[5] == '1' then
+    redis.call('RPUSH', KEYS[3], ARGV[1])
+end
+return 1
+"""
+
+
+class RedisJobQueue:
+    """
+    基于 Redis 的任务队列，接口与 SqliteJobQueue 相同
+
+    xspj:queue 为待领取的任务ID列表，xspj:leases 为按过期时间排序的租约，
+    任务详情保存在 xspj:job:<id> 哈希中，课程完成标记保存在 xspj:done:<账号> 集合中。
+    领取、续约、完成和失败都用 Lua 脚本原子执行（检查租约归属和写入之间不会被其他 worker 插入）
+    """
+
+    def __init__(self, url, max_attempts=3, prefix="xspj"):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self._lease_script = self.redis.register_script(_LEASE_SCRIPT)
+        self._renew_script = self.redis.register_script(_RENEW_SCRIPT)
+        self._finish_script = self.redis.register_script(_FINISH_SCRIPT)
+
+    def _key(self, *parts):
+        return ":".join((self.prefix, *parts))
+
+    def enqueue(self, account, payload):
+        job_id = str(self.redis.incr(self._key("next_id")))
+        # 任务详情和入队在同一个事务中写入
+        with self.redis.pipeline() as pipe:
+            pipe.hset(
+                self._key("job", job_id),
+                mapping={
+                    "account": account,
+                    "payload": json.dumps(payload, ensure_ascii=False),
+                    "status": "queued",
+                    "attempts": 0,
+                },
+            )
+            pipe.lpush(self._key("queue"), job_id)
+            pipe.execute()
+        return job_id
+
+    def lease(self, worker_id, lease_seconds=600):
+        now = time.time()
+        leased = self._lease_script(
+            keys=[self._key("queue"), self._key("leases")],
+            args=[
+                now,
+                now + lease_seconds,
+                worker_id,
+                self.max_attempts,
+                self._key("job", ""),
+                json.dumps({"error": "超过最大尝试次数"}, ensure_ascii=False),
+            ],
+        )
+        if not leased:
+            return None
+        job_id, account, payload, attempts = leased
+        return Job(job_id, account, json.loads(payload), int(attempts))
+
+    def renew(self, job, worker_id, lease_seconds=600):
+        return bool(
+            self._renew_script(
+                keys=[self._key("job", job.id), self._key("leases")],
+                args=[job.id, worker_id, time.time() + lease_seconds],
+            )
+        )
+
+    def _finish(self, job, worker_id, status, result, requeue=False):
+        return bool(
+            self._finish_script(
+                keys=[self._key("job", job.id), self._key("leases"), self._key("queue")],
+                args=[
+                    job.id,
+                    worker_id,
+                    status,
+                    json.dumps(result, ensure_ascii=False),
+                    "1" if requeue else "0",
+                ],
+            )
+        )
+
+    def complete(self, job, worker_id, result):
+        return self._finish(job, worker_id, "done", result)
+
+    def fail(self, job, worker_id, error, retry=True, result=None):
+        retry = retry and job.attempts < self.max_attempts
+        return self._finish(
+            job,
+            worker_id,
+            "queued" if retry else "failed",
+            {**(result or {}), "error": error},
+            requeue=retry,
+        )
+
+    def mark_course_done(self, account, course_key):
+        self.redis.sadd(self._key("done", account), course_key)
+
+    def completed_courses(self, account):
+        return set(self.redis.smembers(self._key("done", account)))
+
+    def _jobs(self):
+        for key in self.redis.scan_iter(self._key("job", "*")):
+            yield key.rsplit(":", 1)[-1], self.redis.hgetall(key)
+
+    def stats(self):
+        counts = {}
+        for _, data in self._jobs():
+            counts[data["status"]] = counts.get(data["status"], 0) + 1
+        return counts
+
+    def results(self):
+        return sorted(
+            (
+                {
+                    "id": job_id,
+                    "account": data["account"],
+                    "status": data["status"],
+                    "attempts": int(data.get("attempts", 0)),
+                    "result": json.loads(data["result"]) if data.get("result") else None,
+                }
+                for job_id, data in self._jobs()
+            ),
+            key=lambda item: int(item["id"]),
+        )
+
+
+def open_queue(url=None, max_attempts=3):
+    """
+    按地址打开任务队列
+
+    参数: url - sqlite:///路径 或 redis://...，默认读取 JOB_QUEUE_URL，未设置或为空时为 sqlite:///jobs.db
+    """
+    url = url or os.getenv("JOB_QUEUE_URL", "").strip() or "sqlite:///jobs.db"
+    if url.startswith(("redis://", "rediss://")):
+        return RedisJobQueue(url, max_attempts=max_attempts)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///") :]
+    return SqliteJobQueue(url, max_attempts=max_attempts)
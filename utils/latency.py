@@ -0,0 +1,128 @@
+# utils/latency.py
+# 按接口统计请求耗时（直方图）和当前在途请求数，由会话层在每个请求前后更新
+import math
+import threading
+
+# 直方图桶：从 1ms 开始按 10% 递增，到约 2 分钟为止，分位数误差不超过 10%
+BUCKET_START = 0.001
+BUCKET_FACTOR = 1.1
+BUCKET_COUNT = 125
+
+
+class LatencyHistogram:
+    """固定对数分桶的耗时直方图，记录开销固定，不保存每个样本"""
+
+    def __init__(self):
+        self.buckets = [0] * (BUCKET_COUNT + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket_index(seconds):
+        if seconds <= BUCKET_START:
+            return 0
+        index = math.ceil(math.log(seconds / BUCKET_START, BUCKET_FACTOR))
+        return min(index, BUCKET_COUNT)
+
+    def record(self, seconds):
+        index = self._bucket_index(seconds)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """返回分位数（所在桶的上界，秒），没有样本时返回 None"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, math.ceil(self.count * percent / 100))
+            seen = 0
+            for index, bucket in enumerate(self.buckets):
+                seen += bucket
+                if seen >= rank:
+                    return min(BUCKET_START * BUCKET_FACTOR**index, self.max)
+        return self.max
+
+    def snapshot(self):
+        """汇总为可序列化的字典（毫秒）"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 1),
+            "p50_ms": round(self.percentile(50) * 1000, 1),
+            "p95_ms": round(self.percentile(95) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+_histograms = {}
+_lock = threading.Lock()
+_in_flight = 0
+
+
+def get_histogram(name):
+    """获取（不存在时创建）指定名称的直方图，如 xspj_save.do、parse:form"""
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(name, LatencyHistogram())
+    return histogram
+
+
+def find_histogram(name):
+    """只读地获取直方图，不存在时返回 None（不会在汇总中留下空的直方图）"""
+    return _histograms.get(name)
+
+
+def record_latency(name, seconds):
+    """记录一次耗时，本地解析等非请求耗时用 "parse:xxx" 命名，与接口区分"""
+    get_histogram(name).record(seconds)
+
+
+def request_started():
+    global _in_flight
+    with _lock:
+        _in_flight += 1
+
+
+def request_finished():
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+
+
+def in_flight():
+    """当前在途的请求数"""
+    return _in_flight
+
+
+def endpoint_name(url):
+    """取URL路径的最后一段作为接口名，如 /jsxsd/xspj/xspj_save.do → xspj_save.do"""
+    path = url.split("?", 1)[0].rstrip("/")
+    return path.rsplit("/", 1)[-1] or path
+
+
+def snapshot_all():
+    """所有直方图的汇总，按名称排序"""
+    with _lock:
+        names = sorted(_histograms)
+    return {name: _histograms[name].snapshot() for name in names}
+
+
+def format_summary():
+    """把所有直方图格式化为日志行"""
+    lines = []
+    for name, stats in snapshot_all().items():
+        if not stats["count"]:
+            continue
+        lines.append(
+            f"{name:<20} 次数:{stats['count']:5d}  平均:{stats['mean_ms']:8.1f}ms  "
+            f"p50:{stats['p50_ms']:8.1f}ms  p95:{stats['p95_ms']:8.1f}ms  "
+            f"最大:{stats['max_ms']:8.1f}ms"
+        )
+    return lines
@@ -1,15 +1,162 @@
 # utils/logger.py
 import os
+import sys
+import glob
+import json
+import time
+import queue
+import atexit
 import logging
+import logging.handlers
+import multiprocessing
+import threading
 import colorlog
 import datetime
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+
+# 后台写日志的队列和监听线程
+_log_queue = None
+_listener = None
+_console_handler = None
+# 多个线程同时提示时（如后台重新登录需要手动输入验证码），逐个提示，避免同时读取标准输入
+_prompt_lock = threading.RLock()
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    只把日志记录放入队列，格式化和写文件都在后台监听线程中完成
+
+    标准的 QueueHandler.prepare 会在调用线程里先格式化消息；
+    这里队列只在本进程内使用，直接传递原始记录即可
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _HoldableStreamHandler(colorlog.StreamHandler):
+    """
+    控制台处理器：交互提示期间暂存日志，输入结束后再一起输出
+
+    后台线程（如预取打分页面）的日志不会插进用户正在输入的提示行里
+    还可以在最后一行显示一个状态行（如进度），日志输出前先擦掉状态行，输出后再重新画出
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.paused = False
+        self._held = []
+        self._status = None
+
+    def _draw_status(self):
+        # \r 回到行首，\033[K 清除行尾残留的旧内容
+        self.stream.write(f"\r{self._status}\033[K")
+        self.flush()
+
+    def _emit_below_status(self, record):
+        if self._status is not None:
+            self.stream.write("\r\033[K")
+        super().emit(record)
+        if self._status is not None:
+            self._draw_status()
+
+    def emit(self, record):
+        if self.paused:
+            self._held.append(record)
+        else:
+            self._emit_below_status(record)
+
+    def set_status(self, line):
+        """设置状态行；None 表示结束，保留最后显示的内容并换行"""
+        with self.lock:
+            if line is None:
+                if self._status is not None and not self.paused:
+                    self.stream.write("\n")
+                    self.flush()
+                self._status = None
+                return
+            self._status = line
+            # 交互提示期间不刷新，避免覆盖用户正在输入的行
+            if not self.paused:
+                self._draw_status()
+
+    def pause(self):
+        with self.lock:
+            self.paused = True
+            if self._status is not None:
+                self.stream.write("\r\033[K")
+                self.flush()
+
+    def resume(self):
+        with self.lock:
+            self.paused = False
+            held, self._held = self._held, []
+            for record in held:
+                self._emit_below_status(record)
+            if self._status is not None:
+                self._draw_status()
+
+
+class _JsonFormatter(logging.Formatter):
+    """把事件字典序列化为一行JSON（在后台监听线程中执行）"""
+
+    def format(self, record):
+        return json.dumps(record.event, ensure_ascii=False, default=str)
+
+
+def _env_int(name, default):
+    """读取整数类型的环境变量，未设置、为空或不是整数时使用默认值"""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"环境变量 {name}={value!r} 不是整数，使用默认值 {default}", file=sys.stderr)
+        return default
+
+
+def _prune_log_files(log_dir, keep_files):
+    """只保留最近 keep_files 个按运行时间命名的日志文件"""
+    log_files = sorted(glob.glob(os.path.join(log_dir, "QFNU-CAS-TOKEN_*.log")))
+    for path in log_files[:-keep_files]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
 
 # 保持为函数形式通常更简洁
-def setup_logger():
+def setup_logger(level=None, max_bytes=None, backup_count=None, keep_files=None):
     """
     配置并返回一个全局的logger实例
+
+    日志通过队列交给后台线程写入文件和控制台，请求线程不再阻塞在I/O上。
+    未传入的参数从环境变量（.env）读取:
+        LOG_LEVEL: 文件日志级别，默认 DEBUG
+        LOG_MAX_BYTES: 大于0时写入固定文件 QFNU-Auto-XSPJ.log 并按大小轮转
+        LOG_BACKUP_COUNT: 轮转时保留的备份数，默认 5
+        LOG_KEEP_FILES: 不轮转时最多保留的按运行时间命名的日志文件数，0 表示不限制
     """
+    global _log_queue, _listener, _console_handler
+
+    load_dotenv()
+    # .env.example 中的 LOG_LEVEL= 为空字符串，按未设置处理
+    level = level or os.getenv("LOG_LEVEL", "").strip().upper() or "DEBUG"
+    if not isinstance(logging.getLevelName(level), int):
+        print(f"未知的日志级别 LOG_LEVEL={level!r}，使用 DEBUG", file=sys.stderr)
+        level = "DEBUG"
+    max_bytes = max_bytes if max_bytes is not None else _env_int("LOG_MAX_BYTES", 0)
+    backup_count = (
+        backup_count if backup_count is not None else _env_int("LOG_BACKUP_COUNT", 5)
+    )
+    keep_files = keep_files if keep_files is not None else _env_int("LOG_KEEP_FILES", 0)
+
     # 确保logs目录存在
     log_dir = "logs"
     if not os.path.exists(log_dir):
@@ -19,25 +166,38 @@ def setup_logger():
     logger = logging.getLogger("QFNU-Auto-XSPJ")
     if logger.hasHandlers():  # 防止重复添加handler
         logger.handlers.clear()
-
-    logger.setLevel(logging.DEBUG)
+    if _listener is not None:
+        _listener.stop()
 
     # 配置文件处理器
-    file_handler = logging.FileHandler(
-        os.path.join(
-            log_dir,
-            f'QFNU-CAS-TOKEN_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.log',
-        ),
-        encoding="utf-8",
-    )
+    if max_bytes > 0:
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, "QFNU-Auto-XSPJ.log"),
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+    else:
+        file_handler = logging.FileHandler(
+            os.path.join(
+                log_dir,
+                f'QFNU-CAS-TOKEN_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.log',
+            ),
+            encoding="utf-8",
+            # 第一条日志写入时才创建文件，只导入不写日志的进程（如解析子进程）不会留下空文件
+            delay=True,
+        )
+        if keep_files > 0:
+            _prune_log_files(log_dir, keep_files)
     file_formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
-    file_handler.setLevel(logging.DEBUG)
+    file_handler.setLevel(level)
     file_handler.setFormatter(file_formatter)
 
     # 配置控制台处理器
-    console_handler = colorlog.StreamHandler()
+    console_handler = _HoldableStreamHandler()
     console_handler.setLevel(logging.INFO)
     console_formatter = colorlog.ColoredFormatter(
         "%(log_color)s%(asctime)s - %(levelname)s: %(message)s%(reset)s",
@@ -51,11 +211,289 @@ def setup_logger():
     )
     console_handler.setFormatter(console_formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # logger 的级别取两个处理器中较低的一个，低于该级别的日志在调用处就直接丢弃
+    logger.setLevel(min(file_handler.level, console_handler.level))
+
+    # 请求线程只负责入队，后台监听线程负责格式化和写入
+    _log_queue = queue.Queue()
+    _listener = logging.handlers.QueueListener(
+        _log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    logger.addHandler(_DeferredQueueHandler(_log_queue))
+    _console_handler = console_handler
+    _listener.start()
 
     return logger
 
 
+def disable_logging():
+    """停止后台监听线程并移除所有处理器，之后的日志和事件直接丢弃（解析子进程使用）"""
+    global _log_queue, _listener, _console_handler, _event_logger, _event_listener
+    logger = logging.getLogger("QFNU-Auto-XSPJ")
+    logger.handlers.clear()
+    logger.addHandler(logging.NullHandler())
+    if _listener is not None:
+        _listener.stop()
+    _log_queue = _listener = _console_handler = None
+    if _event_listener is not None:
+        _event_listener.stop()
+    _event_logger = _event_listener = None
+
+
+def flush_logs():
+    """
+    等待队列中的日志全部输出
+    在 input() 交互提示之前调用，避免提示语和之前的日志顺序错乱
+    """
+    if _log_queue is not None:
+        _log_queue.join()
+
+
+def prompt(message=""):
+    """
+    先输出完队列中的日志，再显示交互提示并读取输入，输入期间产生的控制台日志在输入后输出
+    其他线程正在提示时等待其输入完成
+    """
+    with _prompt_lock:
+        flush_logs()
+        if _console_handler is None:
+            return input(message)
+        _console_handler.pause()
+        try:
+            return input(message)
+        finally:
+            _console_handler.resume()
+
+
+def set_status_line(line, stream=None):
+    """
+    在控制台最后一行显示状态行（如进度），之后的控制台日志输出在它上方，不会与状态行交错
+    line 为 None 时结束状态行并换行；没有控制台处理器或 stream 不是控制台的输出流时返回 False
+    """
+    if _console_handler is None:
+        return False
+    if stream is not None and stream is not _console_handler.stream:
+        return False
+    _console_handler.set_status(line)
+    return True
+
+
+def _stop_listener():
+    """退出前把队列中剩余的日志写完"""
+    if _listener is not None:
+        _listener.stop()
+
+
+# --- 结构化事件日志 ---
+# 每个阶段、每个请求记录一条事件，字段包括 account、course、teacher、strategy、duration、outcome 等，
+# 启用后逐行写入 logs/events_*.jsonl，运行结束时可汇总为运行报告
+# 内存中只保留最近 EVENT_BUFFER_SIZE 条用于运行报告，完整的事件在文件中，常驻进程不会无限增长
+EVENT_BUFFER_SIZE = 100000
+_events = deque(maxlen=EVENT_BUFFER_SIZE)
+_events_total = 0
+_events_lock = threading.Lock()
+# 进程级的公共字段（单账号运行时的 account），以及按任务隔离的字段（常驻服务中每个任务的 account）
+_event_context = {}
+_job_event_context = contextvars.ContextVar("job_event_context", default={})
+_event_logger = None
+_event_listener = None
+_event_path = None
+
+
+def enable_event_log(log_dir="logs"):
+    """
+    启用结构化事件日志，返回事件文件路径
+    也可以通过环境变量 LOG_EVENTS=1 在导入时启用
+    """
+    global _event_logger, _event_listener, _event_path
+    if _event_logger is not None:
+        return _event_path
+
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    path = os.path.join(
+        log_dir, f'events_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.jsonl'
+    )
+    # 延迟到第一条事件时才创建文件，没有事件的进程不留下空文件
+    file_handler = logging.FileHandler(path, encoding="utf-8", delay=True)
+    file_handler.setFormatter(_JsonFormatter())
+
+    event_queue = queue.Queue()
+    event_listener = logging.handlers.QueueListener(event_queue, file_handler)
+    event_listener.start()
+    atexit.register(_stop_event_listener)
+
+    event_logger = logging.getLogger("QFNU-Auto-XSPJ.events")
+    event_logger.propagate = False
+    event_logger.setLevel(logging.INFO)
+    event_logger.handlers.clear()
+    event_logger.addHandler(_DeferredQueueHandler(event_queue))
+    _event_logger = event_logger
+    _event_listener = event_listener
+    _event_path = path
+    return path
+
+
+def _stop_event_listener():
+    """退出前把剩余的事件写完（disable_logging 之后不再重复停止）"""
+    if _event_listener is not None:
+        _event_listener.stop()
+
+
+def event_log_enabled():
+    return _event_logger is not None
+
+
+def set_event_context(**fields):
+    """设置之后每条事件都会带上的公共字段（如 account），对整个进程生效"""
+    _event_context.update(fields)
+
+
+@contextmanager
+def event_context(**fields):
+    """
+    只对当前任务生效的事件字段，同时执行多个账号的任务时（常驻服务）互不影响
+
+    新线程不会自动继承，任务内创建的线程用 with_event_context 包装目标函数
+    """
+    token = _job_event_context.set({**_job_event_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _job_event_context.reset(token)
+
+
+def with_event_context(func):
+    """返回在调用方当前事件上下文中执行 func 的包装，用于交给其他线程执行的函数"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # 同一个 Context 不能被多个线程同时进入，每次调用使用一份副本
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def log_event(event, **fields):
+    """
+    记录一条结构化事件，未启用事件日志时不做任何事
+
+    参数:
+        event: 事件类型，如 "stage"、"course"、"request"
+        fields: 事件字段
+    """
+    if _event_logger is None:
+        return
+    global _events_total
+    record = {
+        "ts": time.time(),
+        "event": event,
+        **_event_context,
+        **_job_event_context.get(),
+        **fields,
+    }
+    with _events_lock:
+        _events.append(record)
+        _events_total += 1
+    _event_logger.info("", extra={"event": record})
+
+
+@contextmanager
+def stage_event(stage, **fields):
+    """
+    记录一个阶段的耗时和结果，阶段内抛出异常时 outcome 为 error
+
+    用法:
+        with stage_event("list") as event:
+            ...
+            event["courses"] = len(courses)
+    """
+    extra = {}
+    start = time.perf_counter()
+    outcome = "success"
+    try:
+        yield extra
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        fields.update(extra)
+        fields.setdefault("outcome", outcome)
+        log_event(
+            "stage",
+            stage=stage,
+            duration=round(time.perf_counter() - start, 4),
+            **fields,
+        )
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def write_run_report(path=None, **summary):
+    """
+    汇总本次运行的事件，写出机器可读的运行报告（JSON）
+
+    报告中的 events 是扁平的事件列表，可以直接用 pandas.DataFrame(report["events"]) 加载；
+    groups 按事件类型和阶段/接口汇总次数、结果分布和耗时分位数。
+    返回: 报告文件路径，未启用事件日志时返回 None
+    """
+    if _event_logger is None:
+        return None
+
+    with _events_lock:
+        events = list(_events)
+        dropped = _events_total - len(events)
+
+    groups = {}
+    for record in events:
+        # 按 事件类型:阶段/接口 分组，如 stage:list、course:clear、request:/jsxsd/xspj/xspj_save.do
+        key = f"{record['event']}:{record.get('stage') or record.get('endpoint', '')}"
+        stats = groups.setdefault(key, {"count": 0, "outcomes": {}, "durations": []})
+        stats["count"] += 1
+        outcome = record.get("outcome", "unknown")
+        stats["outcomes"][outcome] = stats["outcomes"].get(outcome, 0) + 1
+        if record.get("duration") is not None:
+            stats["durations"].append(record["duration"])
+
+    for stats in groups.values():
+        durations = sorted(stats.pop("durations"))
+        stats["duration_total"] = round(sum(durations), 4)
+        stats["duration_p50"] = _percentile(durations, 50)
+        stats["duration_p95"] = _percentile(durations, 95)
+
+    report = {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        **_event_context,
+        "summary": summary,
+        # 超出内存缓冲区的早期事件没有计入汇总，完整记录见事件文件
+        "events_dropped": dropped,
+        "event_file": _event_path,
+        "groups": groups,
+        "events": events,
+    }
+
+    if path is None:
+        path = os.path.join(
+            "logs",
+            f'run_report_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.json',
+        )
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    return path
+
+
 # 创建一个全局实例，方便在其他模块中直接导入使用
 log = setup_logger()
+atexit.register(_stop_listener)
+# spawn 启动的解析子进程会重新导入本模块，只在主进程中启用事件日志
+if (
+    os.getenv("LOG_EVENTS", "").strip() in ("1", "true", "yes")
+    and multiprocessing.parent_process() is None
+):
+    enable_event_log()
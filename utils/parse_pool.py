@@ -0,0 +1,70 @@
+# utils/parse_pool.py
+# 可选的多进程解析后端：HTML解析是纯Python的CPU工作，多账号在线程中并发时会被GIL串行化
+#
+# 启用后解析函数在子进程中执行，进程之间只传递原始响应字节和解析后的精简结构（元组、字典），
+# 不传递 BeautifulSoup 对象。未启用时直接在调用线程中解析。
+#   PARSE_WORKERS=4 python main.py   或   python main.py --parse-workers 4
+#
+# 子进程用 spawn 方式启动：进程在第一次提交解析任务时才创建，此时流水线线程和日志监听线程都已在运行，
+# fork 会把它们持有的锁原样复制到子进程中，可能导致死锁
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_executor = None
+_lock = threading.Lock()
+
+
+def init_parse_pool(workers=None):
+    """
+    启动解析进程池
+
+    参数: workers - 进程数，未传入时读取 PARSE_WORKERS 环境变量，0 表示不启用
+    返回: 是否已启用
+    """
+    global _executor
+    if workers is None:
+        workers = int(os.getenv("PARSE_WORKERS", "0").strip() or 0)
+    with _lock:
+        if _executor is None and workers > 0:
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+    return _executor is not None
+
+
+def _init_worker():
+    """
+    解析子进程不写日志：spawn 时重新导入主模块会顺带导入 utils.logger，
+    这里停止它的后台线程并移除处理器（文件处理器延迟打开，子进程不会创建自己的日志文件）
+    """
+    from utils.logger import disable_logging
+
+    disable_logging()
+
+
+def shutdown_parse_pool():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def parse_pool_enabled():
+    return _executor is not None
+
+
+def run_parse(func, *args):
+    """
+    执行解析函数，启用进程池时在子进程中执行并等待结果
+
+    func 必须是模块顶层函数，参数和返回值都要能被 pickle
+    """
+    executor = _executor
+    if executor is None:
+        return func(*args)
+    return executor.submit(func, *args).result()
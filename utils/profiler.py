@@ -0,0 +1,289 @@
+# utils/profiler.py
+# 按阶段的性能剖析（--profile）：每个阶段的 cProfile 统计、tracemalloc 分配差异和采样调用栈
+#
+# 输出目录（默认 profiles/<时间>/）:
+#   <阶段>.pstats       cProfile 统计，同一阶段多个线程的结果合并，可用 python -m pstats 或 snakeviz 查看
+#   all.pstats          Python 3.12+ 上 cProfile 基于进程级的 sys.monitoring，同一时刻只能有一个剖析器，
+#                       无法按线程分阶段统计，改为整个运行一份合并的统计（阶段划分看 stacks.collapsed）
+#   <阶段>.alloc.txt    阶段开始到结束之间新增内存最多的代码行
+#   stacks.collapsed    采样得到的折叠调用栈（阶段;文件:函数;... 次数），可直接交给 flamegraph.pl / speedscope
+#   summary.txt         各阶段的耗时、函数调用数和内存增量
+#
+# 阶段的耗时只统计有线程处于该阶段内的时间；流水线各阶段只在处理任务时进入，不含等待队列的时间
+# 未启用时 profile_stage 只是一个空的上下文管理器，没有额外开销
+import cProfile
+import datetime
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+_profiler = None
+# 3.12 起 cProfile 改用 sys.monitoring，剖析器对所有线程生效，且不能同时启用多个
+_PROCESS_WIDE_CPROFILE = sys.version_info >= (3, 12)
+
+
+class _StageProfile:
+    """单个阶段的剖析数据：各线程的 cProfile、进入次数和首尾的内存快照"""
+
+    def __init__(self):
+        self.profiles = []
+        self.active = 0
+        self.entries = 0
+        self.wall = 0.0
+        self.started_at = None
+        self.start_snapshot = None
+        self.end_snapshot = None
+        self.snapshot_at = 0.0
+        # 最近一次离开阶段时因为间隔太短没有拍快照，结束时补拍
+        self.snapshot_pending = False
+
+
+class StageProfiler:
+    def __init__(self, output_dir, interval=0.005, snapshot_interval=1.0):
+        """
+        参数:
+            output_dir: 报告目录
+            interval: 调用栈采样间隔（秒）
+            snapshot_interval: 同一阶段结束时内存快照的最小间隔（秒）；
+                流水线阶段每处理一个任务就进出一次，快照较慢，不能每次都拍
+        """
+        self.output_dir = output_dir
+        self.interval = interval
+        self.snapshot_interval = snapshot_interval
+        self.process_profile = None
+        self.stages = {}
+        self.skipped = Counter()
+        self.samples = Counter()
+        # 线程ID -> 当前所在阶段，采样线程据此给调用栈打上阶段标签
+        self._thread_stages = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._local = threading.local()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if _PROCESS_WIDE_CPROFILE:
+            self.process_profile = cProfile.Profile()
+            try:
+                self.process_profile.enable()
+            except ValueError:
+                # 已有其他剖析器（如外部的 python -m cProfile）
+                self.process_profile = None
+        self._sampler = threading.Thread(
+            target=self._sample, name="profile-sampler", daemon=True
+        )
+        self._sampler.start()
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            thread_stages = dict(self._thread_stages)
+            if not thread_stages:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                stage = thread_stages.get(thread_id)
+                if stage is None or thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(stage)
+                self.samples[";".join(reversed(stack))] += 1
+
+    def _thread_profile(self, name, stage):
+        """当前线程在该阶段复用的 cProfile（3.12+ 或同一线程嵌套阶段时返回 None）"""
+        if _PROCESS_WIDE_CPROFILE or getattr(self._local, "active", None) is not None:
+            return None
+        profiles = self._local.__dict__.setdefault("profiles", {})
+        profile = profiles.get(name)
+        if profile is None:
+            profile = profiles[name] = cProfile.Profile()
+            with self._lock:
+                stage.profiles.append(profile)
+        return profile
+
+    @contextmanager
+    def stage(self, name):
+        thread_id = threading.get_ident()
+        with self._lock:
+            stage = self.stages.setdefault(name, _StageProfile())
+            stage.entries += 1
+            stage.active += 1
+            if stage.active == 1:
+                stage.started_at = time.perf_counter()
+                if stage.start_snapshot is None:
+                    stage.start_snapshot = tracemalloc.take_snapshot()
+                    stage.snapshot_at = time.perf_counter()
+            previous = self._thread_stages.get(thread_id)
+            self._thread_stages[thread_id] = name
+
+        profile = self._thread_profile(name, stage)
+        if profile is None and not _PROCESS_WIDE_CPROFILE:
+            # 同一线程中外层阶段的剖析器还在运行，只记录耗时和内存
+            self.skipped[name] += 1
+        if profile is not None:
+            self._local.active = profile
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._local.active = None
+            with self._lock:
+                stage.active -= 1
+                if stage.active == 0:
+                    now = time.perf_counter()
+                    stage.wall += now - stage.started_at
+                    if now - stage.snapshot_at >= self.snapshot_interval:
+                        stage.end_snapshot = tracemalloc.take_snapshot()
+                        stage.snapshot_at = now
+                        stage.snapshot_pending = False
+                    else:
+                        stage.snapshot_pending = True
+                if previous is None:
+                    self._thread_stages.pop(thread_id, None)
+                else:
+                    self._thread_stages[thread_id] = previous
+
+    def finish(self, top=20):
+        """停止采样，写出所有报告，返回输出目录"""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        total_calls = None
+        if self.process_profile is not None:
+            self.process_profile.disable()
+            try:
+                stats = pstats.Stats(self.process_profile)
+                stats.dump_stats(os.path.join(self.output_dir, "all.pstats"))
+                total_calls = stats.total_calls
+            except TypeError:
+                pass
+
+        pending = [stage for stage in self.stages.values() if stage.snapshot_pending]
+        if pending:
+            # 最后一次离开阶段后没有拍快照的，用现在的快照近似
+            snapshot = tracemalloc.take_snapshot()
+            for stage in pending:
+                stage.end_snapshot = snapshot
+
+        summary = [
+            f"{'阶段':<16}{'进入':>6}{'耗时(s)':>10}{'函数调用':>12}{'内存增量(KiB)':>16}"
+        ]
+        for name, stage in self.stages.items():
+            stats = None
+            for profile in stage.profiles:
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(profile)
+                    else:
+                        stats.add(profile)
+                except TypeError:
+                    # 该线程在剖析期间没有执行任何函数
+                    continue
+            calls = "-" if _PROCESS_WIDE_CPROFILE else 0
+            if stats is not None:
+                stats.dump_stats(os.path.join(self.output_dir, f"{name}.pstats"))
+                calls = stats.total_calls
+
+            growth = 0
+            if stage.start_snapshot is not None and stage.end_snapshot is not None:
+                diff = stage.end_snapshot.compare_to(stage.start_snapshot, "lineno")
+                growth = sum(item.size_diff for item in diff)
+                with open(
+                    os.path.join(self.output_dir, f"{name}.alloc.txt"), "w", encoding="utf-8"
+                ) as f:
+                    f.write(f"阶段 {name} 新增内存最多的 {top} 行（开始 → 结束）\n")
+                    for item in diff[:top]:
+                        f.write(f"{item}\n")
+
+            summary.append(
+                f"{name:<16}{stage.entries:>6}{stage.wall:>10.3f}{calls:>12}{growth / 1024:>16.1f}"
+            )
+
+        with open(os.path.join(self.output_dir, "stacks.collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.output_dir, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(summary) + "\n")
+            if _PROCESS_WIDE_CPROFILE:
+                f.write(
+                    "Python 3.12+ 上 cProfile 是进程级的，无法按阶段拆分函数统计，"
+                    f"整个运行的统计见 all.pstats（函数调用 {total_calls if total_calls is not None else '-'}）\n"
+                )
+            for name, count in self.skipped.items():
+                f.write(f"阶段 {name} 有 {count} 次嵌套在其他阶段中进入，函数统计计入外层阶段\n")
+        tracemalloc.stop()
+        return self.output_dir
+
+
+def enable_profiling(output_dir=None, interval=0.005):
+    """
+    开启按阶段剖析
+
+    参数:
+        output_dir: 报告目录，默认 profiles/<时间>
+        interval: 调用栈采样间隔（秒）
+    返回: 报告目录
+    """
+    global _profiler
+    if output_dir is None:
+        output_dir = os.path.join(
+            "profiles", datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        )
+    _profiler = StageProfiler(output_dir, interval)
+    _profiler.start()
+    return output_dir
+
+
+def profiling_enabled():
+    return _profiler is not None
+
+
+@contextmanager
+def profile_stage(name):
+    """
+    在当前线程中剖析一个阶段，同名阶段在多个线程或多次进入时合并
+
+    用法:
+        with profile_stage("list"):
+            ...
+    """
+    if _profiler is None:
+        yield
+        return
+    with _profiler.stage(name):
+        yield
+
+
+def profiled(name, func):
+    """包装函数，每次调用都在 profile_stage(name) 中执行，用于交给线程池的任务"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_stage(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def finish_profiling(top=20):
+    """写出报告并关闭剖析，未启用时返回 None"""
+    global _profiler
+    if _profiler is None:
+        return None
+    profiler, _profiler = _profiler, None
+    return profiler.finish(top)
@@ -0,0 +1,104 @@
+# utils/progress.py
+# 运行中的进度显示：在同一行刷新完成速度、在途请求数、各接口 p50/p95 耗时和预计剩余时间
+import sys
+import threading
+import time
+from utils import latency
+from utils.logger import set_status_line
+
+# 进度行中显示的接口：写接口和列表/打分页面的读取
+DEFAULT_ENDPOINTS = ("xspj_save.do", "xspj_list.do", "xspj_edit.do")
+
+
+def _format_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+
+class ProgressReporter:
+    """
+    后台线程定时刷新进度行
+
+    progress_fn 返回 (已完成数, 总数)；输出不是终端时不刷新，避免日志文件里出现大量进度行
+    输出到控制台日志所在的流时由日志处理器显示，控制台日志输出在进度行上方，不会把进度行冲掉一半
+    """
+
+    def __init__(
+        self, progress_fn, endpoints=DEFAULT_ENDPOINTS, interval=0.5, stream=None
+    ):
+        self.progress_fn = progress_fn
+        self.endpoints = endpoints
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_time = None
+
+    @property
+    def enabled(self):
+        return hasattr(self.stream, "isatty") and self.stream.isatty()
+
+    def render(self):
+        """生成当前的进度行"""
+        done, total = self.progress_fn()
+        elapsed = max(time.perf_counter() - self._start_time, 1e-6)
+        rate = done / elapsed
+        if done >= total:
+            eta = "0s"
+        elif rate > 0:
+            eta = f"{(total - done) / rate:.0f}s"
+        else:
+            eta = "-"
+
+        parts = [
+            f"进度 {done}/{total}",
+            f"{rate:.2f} 门/秒",
+            f"在途请求 {latency.in_flight()}",
+        ]
+        for endpoint in self.endpoints:
+            histogram = latency.find_histogram(endpoint)
+            if histogram is not None and histogram.count:
+                parts.append(
+                    f"{endpoint} p50/p95 {_format_ms(histogram.percentile(50))}/"
+                    f"{_format_ms(histogram.percentile(95))}ms"
+                )
+        parts.append(f"剩余 {eta}")
+        return " | ".join(parts)
+
+    def _write(self, line):
+        if set_status_line(line, self.stream):
+            return
+        # \r 回到行首，\033[K 清除行尾残留的旧内容
+        self.stream.write(f"\r{line}\033[K")
+        self.stream.flush()
+
+    def _finish_line(self):
+        if not set_status_line(None, self.stream):
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._write(self.render())
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        if self.enabled:
+            self._thread = threading.Thread(
+                target=self._run, name="progress", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止刷新，并输出最后一次进度后换行"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._write(self.render())
+            self._finish_line()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,200 @@
+# utils/rate_limiter.py
+# 写接口的自适应限流：令牌桶控制速率，AIMD（加性增、乘性减）控制速率和并发上限
+import threading
+import time
+import requests
+from contextlib import contextmanager
+from utils.logger import log
+from utils.response_parser import SaveOutcome, SaveResult, classify_response
+from utils.session_manager import relogin_seconds
+
+
+class TokenBucket:
+    """
+    令牌桶：按 rate 个/秒补充令牌，最多积攒 capacity 个
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    def set_capacity(self, capacity):
+        """调整最多积攒的令牌数，多出的令牌丢弃"""
+        with self._lock:
+            self._refill()
+            self.capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+    def set_rate(self, rate):
+        """调整补充速率，先按旧速率结算已经过去的时间"""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def acquire(self):
+        """取走一个令牌，不足时阻塞等待"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    单个接口（按账号区分）的自适应限流器
+
+    - 请求成功且延迟低于目标时，速率加性增加，每连续成功 increase_every 次并发上限加一
+    - 遇到服务器错误、超时或被重定向到登录页时，速率和并发上限减半，并按连续失败次数指数退避
+    - 业务校验错误（如比例超限）说明服务器是健康的，不调整
+    """
+
+    def __init__(
+        self,
+        name,
+        initial_rate=2.0,
+        min_rate=0.5,
+        max_rate=20.0,
+        initial_concurrency=1,
+        max_concurrency=8,
+        latency_target=2.0,
+        rate_step=0.5,
+        decrease_factor=0.5,
+        increase_every=5,
+        backoff_base=1.0,
+        backoff_max=30.0,
+    ):
+        self.name = name
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.rate_step = rate_step
+        self.decrease_factor = decrease_factor
+        self.increase_every = increase_every
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.bucket = TokenBucket(initial_rate, capacity=max(1, initial_concurrency))
+        self.concurrency = initial_concurrency
+        self._in_flight = 0
+        self._successes = 0
+        self._failures = 0
+        self._backoff_until = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """占用一个并发名额和一个令牌，退避期间阻塞"""
+        with self._cond:
+            while self._in_flight >= self.concurrency:
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            delay = self._backoff_until - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.bucket.acquire()
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify()
+
+    def record(self, outcome, latency):
+        """
+        根据一次请求的结果和延迟调整速率与并发上限
+
+        参数:
+            outcome: SaveOutcome
+            latency: 请求耗时（秒）
+        """
+        with self._cond:
+            if outcome in (SaveOutcome.SERVER_ERROR, SaveOutcome.SESSION_EXPIRED):
+                self._decrease(f"{outcome.value}")
+            elif latency > self.latency_target * 2:
+                self._decrease(f"延迟过高 {latency:.2f}s")
+            elif outcome is SaveOutcome.SUCCESS and latency <= self.latency_target:
+                self._increase()
+            self._cond.notify_all()
+
+    def _increase(self):
+        self._failures = 0
+        self._successes += 1
+        self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.rate_step))
+        if (
+            self._successes % self.increase_every == 0
+            and self.concurrency < self.max_concurrency
+        ):
+            self.concurrency += 1
+            self.bucket.set_capacity(self.concurrency)
+            log.debug(
+                "[%s] 提高并发上限至 %d，速率 %.2f/s",
+                self.name,
+                self.concurrency,
+                self.bucket.rate,
+            )
+
+    def _decrease(self, reason):
+        self._successes = 0
+        self._failures += 1
+        self.bucket.set_rate(max(self.min_rate, self.bucket.rate * self.decrease_factor))
+        self.concurrency = max(1, int(self.concurrency * self.decrease_factor))
+        self.bucket.set_capacity(self.concurrency)
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1))
+        self._backoff_until = time.monotonic() + backoff
+        log.warning(
+            f"[{self.name}] {reason}，降低速率至 {self.bucket.rate:.2f}/s、并发至 {self.concurrency}，退避 {backoff:.1f}s"
+        )
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint, account=None):
+    """获取（或创建）指定接口和账号的限流器"""
+    key = (endpoint, account)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = AdaptiveLimiter(
+                f"{endpoint}@{account}" if account else endpoint
+            )
+        return _limiters[key]
+
+
+def submit_with_limiter(limiter, send):
+    """
+    在限流器的名额内发送一次写请求，并把结果反馈给限流器
+
+    参数:
+        limiter: AdaptiveLimiter
+        send: 无参函数，发送请求并返回 requests.Response
+    返回: SaveResult
+    """
+    with limiter.slot():
+        start = time.monotonic()
+        relogin_start = relogin_seconds()
+        try:
+            result = classify_response(send())
+        except requests.Timeout as e:
+            result = SaveResult(SaveOutcome.SERVER_ERROR, f"请求超时: {e}")
+        except requests.RequestException as e:
+            result = SaveResult(SaveOutcome.SERVER_ERROR, f"请求失败: {e}")
+        # 会话失效时的重新登录（可能要手动输入验证码）不是服务器的响应时间，不计入延迟
+        relogin = relogin_seconds() - relogin_start
+        limiter.record(result.outcome, time.monotonic() - start - relogin)
+    return result
@@ -0,0 +1,105 @@
+# utils/response_parser.py
+# 统一解析写接口（打分保存、文字评价保存）的返回结果
+import re
+from dataclasses import dataclass
+from enum import Enum
+
+# 写接口的结果都在页面开头的 alert 里，只解码和匹配前几KB
+HEAD_BYTES = 4096
+
+ALERT_PATTERN = re.compile(r"alert\('(.*)'\)")
+
+# 登录页特征：跳转到登录入口，或页面内容包含登录表单
+LOGIN_URL_MARKERS = ("/jsxsd/xk/LoginToXk", "/jsxsd/framework/login", "/Logon.do")
+LOGIN_TEXT_MARKERS = ("用户登录", 'id="RANDOMCODE"', 'name="RANDOMCODE"')
+
+
+class SaveOutcome(Enum):
+    """写接口的结果类型"""
+
+    SUCCESS = "success"
+    VALIDATION_ERROR = "validation_error"
+    SESSION_EXPIRED = "session_expired"
+    SERVER_ERROR = "server_error"
+
+
+@dataclass(frozen=True)
+class SaveResult:
+    """写接口的解析结果"""
+
+    outcome: SaveOutcome
+    message: str
+    status_code: int | None = None
+
+    @property
+    def ok(self):
+        return self.outcome is SaveOutcome.SUCCESS
+
+
+def _read_head(response):
+    """
+    只解码响应体的前 HEAD_BYTES 字节
+
+    response.content 会读取并保留整个响应体，不能用于流式响应（流式响应用 is_login_page(inspect_body=False)）
+    """
+    encoding = response.encoding or "utf-8"
+    return response.content[:HEAD_BYTES].decode(encoding, errors="ignore")
+
+
+def is_login_page(response, inspect_body=True):
+    """
+    判断响应是否是被重定向到了登录页（会话失效）
+
+    参数: inspect_body - 是否检查响应内容；流式响应传 False，只根据跳转判断，避免提前读取响应体
+    """
+    if response.status_code in (301, 302, 303, 307, 308):
+        location = response.headers.get("Location", "")
+        return any(marker in location for marker in LOGIN_URL_MARKERS) or (
+            location.rstrip("/").endswith("/jsxsd")
+        )
+
+    urls = [r.url for r in response.history] + [response.url or ""]
+    if response.history and any(
+        marker in url for url in urls for marker in LOGIN_URL_MARKERS
+    ):
+        return True
+
+    if not inspect_body:
+        return False
+    head = _read_head(response)
+    return any(marker in head for marker in LOGIN_TEXT_MARKERS)
+
+
+def classify_response(response):
+    """
+    将写接口的响应解析为 SaveResult
+
+    参数: response - requests.Response
+    返回: SaveResult
+    """
+    status_code = response.status_code
+
+    if status_code >= 500:
+        return SaveResult(
+            SaveOutcome.SERVER_ERROR, f"服务器错误: HTTP {status_code}", status_code
+        )
+
+    if is_login_page(response):
+        return SaveResult(SaveOutcome.SESSION_EXPIRED, "会话已失效，需要重新登录", status_code)
+
+    if status_code != 200:
+        return SaveResult(
+            SaveOutcome.SERVER_ERROR, f"请求异常: HTTP {status_code}", status_code
+        )
+
+    alert_content = ALERT_PATTERN.search(_read_head(response))
+    if alert_content is None and len(response.content) > HEAD_BYTES:
+        # 前几KB没有找到时再扫描全文，避免页面结构变化导致误判
+        alert_content = ALERT_PATTERN.search(response.text)
+    if alert_content is None:
+        return SaveResult(SaveOutcome.SERVER_ERROR, "未找到alert内容", status_code)
+
+    message = alert_content.group(1)
+    if "保存成功" in message:
+        return SaveResult(SaveOutcome.SUCCESS, message, status_code)
+    return SaveResult(SaveOutcome.VALIDATION_ERROR, message, status_code)
@@ -1,26 +1,181 @@
 # utils/session_manager.py
+from contextlib import contextmanager
+from urllib.parse import urlsplit
 from requests import Session
 import threading
+import time
+from utils import latency
+from utils.http_cassette import install_from_env
+from utils.logger import event_log_enabled, log, log_event
+from utils.response_parser import is_login_page
 
 # 全局session变量
 _session = None
 _session_lock = threading.Lock()
 
+# 每个线程累计花在重新登录上的时间（包括等待其他线程登录、手动输入验证码），
+# 写接口的限流器计算请求延迟时扣除，避免把登录耗时当成服务器变慢
+_relogin_time = threading.local()
+
+
+def relogin_seconds():
+    """当前线程累计的重新登录耗时（秒），取两次的差值即为期间的重新登录耗时"""
+    return getattr(_relogin_time, "total", 0.0)
+
+
+class GuardedSession(Session):
+    """
+    带会话守护的Session：任何响应被重定向到登录页时，自动重新登录一次并重放该请求
+
+    重新登录由 relogin_handler 完成（通常是 LoginManager.simulate_login），
+    并发的多个请求同时发现掉线时，只有一个线程去登录，其余线程等待后直接重放。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.relogin_handler = None
+        self._relogin_lock = threading.Lock()
+        self._login_generation = 0
+        self._failed_generation = None
+        self._local = threading.local()
+
+    def set_relogin_handler(self, handler):
+        """设置重新登录的回调，回调返回是否登录成功"""
+        self.relogin_handler = handler
+
+    @contextmanager
+    def unguarded(self):
+        """在当前线程内临时关闭会话守护（登录流程、登录状态检查使用）"""
+        previous = getattr(self._local, "unguarded", False)
+        self._local.unguarded = True
+        try:
+            yield
+        finally:
+            self._local.unguarded = previous
+
+    def request(self, method, url, *args, **kwargs):
+        if self.relogin_handler is None or getattr(self._local, "unguarded", False):
+            return self._timed_request(method, url, *args, **kwargs)
+
+        generation = self._login_generation
+        response = self._timed_request(method, url, *args, **kwargs)
+        if not is_login_page(response, inspect_body=not kwargs.get("stream")):
+            return response
+
+        log.warning(f"检测到会话已失效: {method} {url}")
+        if not self._relogin(generation):
+            return response
+
+        log.info(f"重新登录成功，重放请求: {method} {url}")
+        return self._timed_request(method, url, *args, **kwargs)
+
+    def _timed_request(self, method, url, *args, **kwargs):
+        """
+        发送请求，按接口记录耗时和在途请求数；启用事件日志时为每个请求记录一条 request 事件
+
+        流式请求在收到响应头时就返回，这里只能记录到响应头的耗时，记为 "接口:headers"；
+        读完响应体的耗时由读取方自己记录到接口名下（见 XspjList._stream_page）
+        """
+        start = time.perf_counter()
+        status = None
+        stream = bool(kwargs.get("stream"))
+        latency.request_started()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            duration = time.perf_counter() - start
+            latency.request_finished()
+            name = latency.endpoint_name(url)
+            latency.record_latency(f"{name}:headers" if stream else name, duration)
+            if event_log_enabled():
+                log_event(
+                    "request",
+                    method=method,
+                    endpoint=urlsplit(url).path,
+                    status=status,
+                    duration=round(duration, 4),
+                    outcome="error" if status is None or status >= 500 else "success",
+                    **({"until": "headers"} if stream else {}),
+                )
+
+    @property
+    def login_generation(self):
+        """当前的登录代数，每次重新登录成功后加一"""
+        return self._login_generation
+
+    def relogin(self, generation):
+        """
+        调用方自己发现响应是登录页时调用（如流式响应读完之后才能判断），重新登录
+
+        参数: generation - 发出请求前读取的 login_generation
+        返回: 是否可以重放请求；没有设置 relogin_handler 时返回 False
+        """
+        if self.relogin_handler is None:
+            return False
+        return self._relogin(generation)
+
+    def _relogin(self, generation):
+        """
+        重新登录，同一次掉线只登录一次
+
+        参数: generation - 发出请求时的登录代数
+        返回: 是否可以重放请求
+        """
+        start = time.perf_counter()
+        try:
+            return self._relogin_once(generation)
+        finally:
+            _relogin_time.total = relogin_seconds() + time.perf_counter() - start
+
+    def _relogin_once(self, generation):
+        with self._relogin_lock:
+            if self._login_generation != generation:
+                # 其他线程已经完成了重新登录
+                return True
+            if self._failed_generation == generation:
+                # 其他线程已经尝试过且失败了，不再重复请求验证码
+                return False
+
+            log.warning("正在重新登录...")
+            with self.unguarded():
+                try:
+                    success = self.relogin_handler()
+                except Exception as e:
+                    log.error(f"重新登录时发生异常: {e}")
+                    success = False
+
+            if success:
+                self._login_generation += 1
+            else:
+                self._failed_generation = generation
+                log.error("重新登录失败，后续请求将不再重试")
+            return success
+
+
+def create_session():
+    """创建一个新的带会话守护的会话（常驻模式下每个账号各用一个）"""
+    session = GuardedSession()
+    session.headers.update(
+        {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36 Edg/132.0.0.0",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+            "Connection": "keep-alive",
+        }
+    )
+    # HTTP_CASSETTE_MODE=record/replay 时录制或离线回放所有请求
+    install_from_env(session)
+    return session
+
 
 def init_session():
     """初始化全局会话"""
     global _session
     with _session_lock:
         if _session is None:
-            _session = Session()
-            _session.headers.update(
-                {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36 Edg/132.0.0.0",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-                    "Connection": "keep-alive",
-                }
-            )
+            _session = create_session()
         return _session
 
 